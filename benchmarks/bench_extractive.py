@@ -0,0 +1,143 @@
+"""
+抽取式预压缩基准测试
+在内置样例语料上测量不同token预算下的输入token减少量、压缩耗时、
+内容保留度（相对参考摘要的ROUGE-1召回）以及端到端延迟
+
+用法:
+    python benchmarks/bench_extractive.py
+    python benchmarks/bench_extractive.py --budgets 200 400 800 --output bench_output.json
+    python benchmarks/bench_extractive.py --live   # 通过AIService真实调用总结接口
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.extractive_summarizer import compress_text, tokenize_sentence  # noqa: E402
+from utils.text_processor import preprocess_text  # noqa: E402
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+
+def rouge1_recall(candidate: str, reference: str) -> float:
+    """参考摘要中的词项被候选文本覆盖的比例"""
+    ref_counts = Counter(tokenize_sentence(reference))
+    if not ref_counts:
+        return 0.0
+    cand_counts = Counter(tokenize_sentence(candidate))
+    overlap = sum(min(count, cand_counts[term]) for term, count in ref_counts.items())
+    return overlap / sum(ref_counts.values())
+
+
+def load_corpus():
+    """加载样例语料和参考摘要"""
+    references = json.loads((CORPUS_DIR / "references.json").read_text(encoding="utf-8"))
+    documents = []
+    for name, reference in references.items():
+        text = preprocess_text((CORPUS_DIR / name).read_text(encoding="utf-8"))
+        documents.append((name, text, reference))
+    return documents
+
+
+def run_offline(documents, budgets, repeat, prefill_ms_per_token, generation_ms):
+    """离线测量：压缩耗时 + 按token数模拟的上游延迟"""
+    rows = []
+    for name, text, reference in documents:
+        baseline = compress_text(text, token_budget=10 ** 9)
+        baseline_latency = baseline.original_tokens * prefill_ms_per_token + generation_ms
+        for budget in budgets:
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                extraction = compress_text(text, token_budget=budget)
+                durations.append((time.perf_counter() - start) * 1000)
+            durations.sort()
+            extract_ms = durations[len(durations) // 2]
+            latency = extract_ms + extraction.compressed_tokens * prefill_ms_per_token + generation_ms
+            rows.append({
+                "document": name,
+                "budget": budget,
+                "original_tokens": extraction.original_tokens,
+                "compressed_tokens": extraction.compressed_tokens,
+                "token_reduction": round(extraction.reduction_ratio, 4),
+                "extract_ms_p50": round(extract_ms, 3),
+                "rouge1_recall_full": round(rouge1_recall(text, reference), 4),
+                "rouge1_recall_compressed": round(rouge1_recall(extraction.text, reference), 4),
+                "simulated_latency_ms": round(latency, 1),
+                "simulated_baseline_latency_ms": round(baseline_latency, 1),
+            })
+    return rows
+
+
+async def run_live(documents, budgets):
+    """在线测量：通过AIService调用真实的上游总结接口"""
+    from services.ai_service import ai_service
+
+    rows = []
+    for name, text, reference in documents:
+        start = time.perf_counter()
+        summary = await ai_service.summarize_text(text)
+        baseline_ms = (time.perf_counter() - start) * 1000
+        rows.append({
+            "document": name,
+            "budget": None,
+            "latency_ms": round(baseline_ms, 1),
+            "rouge1_recall_summary": round(rouge1_recall(summary, reference), 4),
+        })
+        for budget in budgets:
+            start = time.perf_counter()
+            summary = await ai_service.summarize_text(text, compress=True, token_budget=budget)
+            latency_ms = (time.perf_counter() - start) * 1000
+            rows.append({
+                "document": name,
+                "budget": budget,
+                "latency_ms": round(latency_ms, 1),
+                "rouge1_recall_summary": round(rouge1_recall(summary, reference), 4),
+            })
+    return rows
+
+
+def print_table(rows):
+    """以对齐的表格打印结果"""
+    if not rows:
+        return
+    headers = list(rows[0].keys())
+    widths = [max(len(str(h)), *(len(str(r[h])) for r in rows)) for h in headers]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抽取式预压缩基准测试")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[150, 300, 600])
+    parser.add_argument("--repeat", type=int, default=20, help="每个配置重复次数，取中位数")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.4,
+                        help="离线模式下模拟的上游每输入token耗时")
+    parser.add_argument("--generation-ms", type=float, default=800.0,
+                        help="离线模式下模拟的上游生成耗时")
+    parser.add_argument("--live", action="store_true", help="调用真实AI服务测量端到端延迟")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    documents = load_corpus()
+    if args.live:
+        rows = asyncio.run(run_live(documents, args.budgets))
+    else:
+        rows = run_offline(documents, args.budgets, args.repeat,
+                           args.prefill_ms_per_token, args.generation_ms)
+
+    print_table(rows)
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+日志开销基准测试
+流式输出中每个片段一条日志时，调用线程（即事件循环）上的额外耗时
+
+对比以下写法和日志管道在每个片段上的开销（纳秒/片段）：
+    - 不记录日志（基线）
+    - DEBUG未启用时的 f-string 与 %s 占位符
+    - DEBUG启用时同步写入与队列写入（text / json）
+    - DEBUG启用、debug_sampled 按比例采样
+    - 输出缓慢时（模拟stdout被日志收集器阻塞）的同步写入与队列写入
+输出写到 /dev/null，只测量调用线程（即事件循环）上的开销，队列写入时格式化和输出在后台线程中进行
+
+用法:
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --chunks 200000 --sample-rate 0.01 --slow-write-ms 0.5
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config.settings import config  # noqa: E402
+from utils.logger import create_handler, debug_sampled  # noqa: E402
+
+CHUNK = "这是一个流式片段"
+
+
+class SlowStream(io.StringIO):
+    """每次写入等待固定时间，模拟输出管道被阻塞"""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+
+def _make_logger(name: str, level: int, stream=None, **handler_options):
+    """创建独立的日志器，返回 (日志器, 监听器)"""
+    stream = stream or open(os.devnull, "w", encoding="utf-8")
+    handler, listener = create_handler(stream, **handler_options)
+    logger = logging.getLogger(f"benchmark.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger, listener
+
+
+def _run(chunks: int, log_chunk) -> float:
+    """模拟流式输出循环，返回每个片段的平均耗时（纳秒）"""
+    start = time.perf_counter_ns()
+    count = 0
+    for _ in range(chunks):
+        count += 1
+        log_chunk(count)
+    return (time.perf_counter_ns() - start) / chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式片段日志开销基准测试")
+    parser.add_argument("--chunks", type=int, default=200000, help="模拟的片段数")
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="采样场景的DEBUG采样比例")
+    parser.add_argument("--slow-write-ms", type=float, default=0.2, help="输出缓慢场景中每次写入的等待时间")
+    args = parser.parse_args()
+
+    results = []
+    baseline = _run(args.chunks, lambda count: None)
+    results.append(("不记录日志", baseline))
+
+    logger, _ = _make_logger("disabled", logging.INFO)
+    results.append(("DEBUG未启用 f-string", _run(args.chunks, lambda count: logger.debug(f"片段 #{count}: {CHUNK}"))))
+    results.append(("DEBUG未启用 %s 占位符", _run(args.chunks, lambda count: logger.debug("片段 #%d: %s", count, CHUNK))))
+
+    scenarios = [
+        ("DEBUG启用 同步写入 text", None, dict(use_queue=False)),
+        ("DEBUG启用 队列写入 text", None, dict(use_queue=True)),
+        ("DEBUG启用 队列写入 json", None, dict(use_queue=True, log_format="json")),
+    ]
+    for index, (label, stream, options) in enumerate(scenarios):
+        logger, listener = _make_logger(f"enabled{index}", logging.DEBUG, stream, **options)
+        results.append((label, _run(args.chunks, lambda count: logger.debug("片段 #%d: %s", count, CHUNK))))
+        if listener is not None:
+            listener.stop()
+
+    config.LOG_DEBUG_SAMPLE_RATE = args.sample_rate
+    logger, listener = _make_logger("sampled", logging.DEBUG)
+    results.append((f"DEBUG启用 采样{args.sample_rate:g}",
+                    _run(args.chunks, lambda count: debug_sampled(logger, "片段 #%d: %s", count, CHUNK))))
+    listener.stop()
+
+    # 输出缓慢时同步写入的每个片段都要等待输出，片段数减少以控制运行时间
+    slow_chunks = min(args.chunks, 2000)
+    delay = args.slow_write_ms / 1000
+    for label, use_queue in (("输出缓慢 同步写入", False), ("输出缓慢 队列写入", True)):
+        logger, listener = _make_logger(label, logging.DEBUG, SlowStream(delay), use_queue=use_queue)
+        results.append((label, _run(slow_chunks, lambda count: logger.debug("片段 #%d: %s", count, CHUNK))))
+        if listener is not None:
+            listener.stop()
+
+    print(f"片段数: {args.chunks}（输出缓慢场景 {slow_chunks}，每次写入等待 {args.slow_write_ms}ms）")
+    print(f"{'场景':<28}{'纳秒/片段':>12}{'相对基线':>12}")
+    for label, ns in results:
+        print(f"{label:<28}{ns:>12.0f}{ns - baseline:>+12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+服务商适配器基准测试
+直接调用 OpenAIProvider / ClaudeProvider / QianwenProvider 的翻译、总结和流式接口，
+统计每次调用的墙钟时间和CPU时间（NumPy计算分位数）。配合录制与回放（services/cassette.py）使用：
+先对真实上游或 benchmarks/stub_upstream.py 录制一次，之后离线回放；回放时间缩放为0时不等待，
+测得的时间只包括SDK请求构造、响应/SSE解析和适配器代码本身的开销
+
+用法:
+    # 录制（服务商地址和密钥按 .env 配置，每个操作调用一次）
+    python benchmarks/bench_providers.py --mode record --cassette-dir cassettes --repeat 1
+    # 离线回放，按原始时间
+    python benchmarks/bench_providers.py --mode replay --cassette-dir cassettes --repeat 20
+    # 离线回放，不等待，只测量CPU开销
+    python benchmarks/bench_providers.py --mode replay --timing-scale 0 --repeat 200 --output bench_providers.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.load_generator import git_commit, percentiles  # noqa: E402
+
+PROVIDERS = ("openai", "claude", "qianwen")
+OPERATIONS = ("translate", "summarize", "translate_stream", "summarize_stream")
+CORPUS = ROOT / "benchmarks" / "corpus" / "zh_city_report.txt"
+
+
+async def call(provider, operation: str, text: str) -> str:
+    """调用一次服务商接口，流式接口读取到结束"""
+    if operation == "translate":
+        return await provider.translate(text, "中文", "英文")
+    if operation == "summarize":
+        return await provider.summarize(text)
+    if operation == "translate_stream":
+        stream = provider.translate_stream(text, "中文", "英文")
+    else:
+        stream = provider.summarize_stream(text)
+    return "".join([chunk async for chunk in stream])
+
+
+async def run(providers, operations, text: str, repeat: int):
+    """每个 (服务商, 操作) 依次调用 repeat 次，记录墙钟和CPU时间（秒）"""
+    rows = {}
+    for name, provider in providers.items():
+        for operation in operations:
+            wall, cpu, outputs, errors = [], [], set(), 0
+            for _ in range(repeat):
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                try:
+                    outputs.add(await call(provider, operation, text))
+                except Exception as e:
+                    errors += 1
+                    print(f"{name}.{operation} 调用失败: {type(e).__name__}: {e}")
+                    continue
+                wall.append(time.perf_counter() - wall_start)
+                cpu.append(time.process_time() - cpu_start)
+            rows[f"{name}.{operation}"] = {
+                "calls": len(wall),
+                "errors": errors,
+                "distinct_outputs": len(outputs),
+                "wall_ms": percentiles(wall),
+                "cpu_ms": percentiles(cpu),
+            }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务商适配器基准测试（录制/回放）")
+    parser.add_argument("--mode", choices=("off", "record", "replay"), default=None,
+                        help="录制与回放模式，默认使用 CASSETTE_MODE")
+    parser.add_argument("--cassette-dir", default=None, help="录制文件目录，默认使用 CASSETTE_DIR")
+    parser.add_argument("--timing-scale", type=float, default=None,
+                        help="回放时间缩放比例，默认使用 CASSETTE_TIMING_SCALE")
+    parser.add_argument("--providers", nargs="+", choices=PROVIDERS, default=list(PROVIDERS))
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=10, help="每个操作的调用次数")
+    parser.add_argument("--text-file", type=str, default=str(CORPUS), help="请求文本文件")
+    parser.add_argument("--text-chars", type=int, default=600, help="取文本文件的前N个字符")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    # 配置在导入时读取环境变量，命令行参数需要在导入前写入
+    for name, value in (("CASSETTE_MODE", args.mode), ("CASSETTE_DIR", args.cassette_dir),
+                        ("CASSETTE_TIMING_SCALE", args.timing_scale)):
+        if value is not None:
+            os.environ[name] = str(value)
+
+    from config.settings import config
+    from services.ai_providers import AIProviderFactory
+    from services.cassette import cassette_status
+
+    providers = {}
+    for name in args.providers:
+        try:
+            providers[name] = AIProviderFactory._providers[name]()
+        except ValueError as e:
+            print(f"跳过 {name}: {e}")
+    if not providers:
+        print("没有可用的服务商")
+        return
+
+    text = Path(args.text_file).read_text(encoding="utf-8")[:args.text_chars]
+    print(f"模式 {config.CASSETTE_MODE}，时间缩放 {config.CASSETTE_TIMING_SCALE:g}，每个操作 {args.repeat} 次")
+    rows = asyncio.run(run(providers, args.operations, text, args.repeat))
+    for name, row in rows.items():
+        wall, cpu = row["wall_ms"] or {}, row["cpu_ms"] or {}
+        print(f"{name:28} {row['calls']:5} 次  wall p50 {wall.get('p50')}ms p99 {wall.get('p99')}ms  "
+              f"cpu p50 {cpu.get('p50')}ms p99 {cpu.get('p99')}ms")
+
+    if args.output:
+        report = {
+            "git_commit": git_commit(),
+            "cassette": cassette_status(),
+            "repeat": args.repeat,
+            "text_chars": len(text),
+            "results": rows,
+        }
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
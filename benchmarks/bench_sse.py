@@ -0,0 +1,165 @@
+"""
+SSE编码基准测试
+用模拟的上游片段流（固定的片段间隔）比较逐片段编码（旧实现）与 SSEEncoder 合并编码，
+每个事件写入本地socket（与服务器每个事件一次写操作相当），
+测量每个流发送的事件数、字节数、每秒事件数以及每个流消耗的CPU时间
+
+用法:
+    python benchmarks/bench_sse.py
+    python benchmarks/bench_sse.py --streams 200 --tokens 400 --interval-ms 5 --output bench_sse.json
+    python benchmarks/bench_sse.py --flush-intervals 0 0.02 0.05 0.1
+    python benchmarks/bench_sse.py --sink none   # 只测量编码，不写socket
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.sse import SSEEncoder  # noqa: E402
+
+# 模拟的上游片段（中英文混合，长度与真实模型的token片段相当）
+TOKENS = ["The", " quick", " brown", " fox", " jumps", "，", "敏捷的", "棕色", "狐狸", "跳过", "了", "懒狗", "。", "\n"]
+
+
+async def upstream(count: int, interval: float):
+    """按固定间隔产生片段的模拟上游"""
+    for index in range(count):
+        if interval:
+            await asyncio.sleep(interval)
+        yield TOKENS[index % len(TOKENS)]
+
+
+class Sink:
+    """事件的接收端：写入本地socket并由另一端读取，或只统计字节数"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.size = 0
+        self.writer = None
+        self.peer = None
+        self.drainer = None
+
+    async def open(self):
+        if self.kind == "socket":
+            left, right = socket.socketpair()
+            _, self.writer = await asyncio.open_connection(sock=left)
+            reader, self.peer = await asyncio.open_connection(sock=right)
+            self.drainer = asyncio.ensure_future(self._drain(reader))
+
+    @staticmethod
+    async def _drain(reader):
+        while await reader.read(65536):
+            pass
+
+    async def send(self, frame: str):
+        data = frame.encode("utf-8")
+        self.size += len(data)
+        if self.writer is not None:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.drainer
+            self.peer.close()
+
+
+async def legacy_stream(count: int, interval: float, sink: Sink):
+    """旧实现：每个片段单独编码为一个事件，字符串拼接完整结果"""
+    frames = 0
+    full_result = ""
+    async for chunk in upstream(count, interval):
+        if chunk and chunk.strip():
+            full_result += chunk.strip()
+            clean_chunk = chunk.strip().replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+            frames += 1
+            await sink.send(f"data: {json.dumps({'type': 'chunk', 'content': clean_chunk}, ensure_ascii=False)}\n\n")
+    return frames
+
+
+async def encoder_stream(count: int, interval: float, sink: Sink, flush_interval: float, flush_bytes: int):
+    """SSEEncoder：合并窗口内的片段合并为一个事件"""
+    encoder = SSEEncoder(lambda text: {"type": "chunk", "content": text},
+                         flush_interval=flush_interval, flush_bytes=flush_bytes, heartbeat_interval=15)
+    async for frame in encoder.stream(upstream(count, interval)):
+        await sink.send(frame)
+    encoder.full_result
+    return encoder.frames
+
+
+async def run_case(name, factory, streams, sink_kind):
+    """并发运行一组流并汇总"""
+    sinks = [Sink(sink_kind) for _ in range(streams)]
+    for sink in sinks:
+        await sink.open()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    results = await asyncio.gather(*(factory(sink) for sink in sinks))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    for sink in sinks:
+        await sink.close()
+    frames = sum(results)
+    size = sum(sink.size for sink in sinks)
+    return {
+        "encoder": name,
+        "streams": streams,
+        "frames_per_stream": round(frames / streams, 1),
+        "bytes_per_stream": round(size / streams),
+        "frames_per_sec": round(frames / wall),
+        "cpu_ms_per_stream": round(cpu * 1000 / streams, 3),
+        "wall_seconds": round(wall, 3),
+    }
+
+
+async def run(args):
+    interval = args.interval_ms / 1000.0
+    rows = [await run_case("legacy", lambda sink: legacy_stream(args.tokens, interval, sink),
+                           args.streams, args.sink)]
+    for flush_interval in args.flush_intervals:
+        rows.append(await run_case(
+            f"sse(window={flush_interval:g}s)",
+            lambda sink: encoder_stream(args.tokens, interval, sink, flush_interval, args.flush_bytes),
+            args.streams, args.sink
+        ))
+    return rows
+
+
+def print_table(rows):
+    """以对齐的表格打印结果"""
+    headers = list(rows[0])
+    widths = [max(len(h), *(len(str(r[h])) for r in rows)) for h in headers]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE编码基准测试")
+    parser.add_argument("--streams", type=int, default=100, help="并发流数")
+    parser.add_argument("--tokens", type=int, default=300, help="每个流的上游片段数")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="上游片段间隔（毫秒），0表示不等待")
+    parser.add_argument("--flush-intervals", type=float, nargs="+", default=[0.0, 0.05, 0.1],
+                        help="要比较的合并窗口（秒）")
+    parser.add_argument("--flush-bytes", type=int, default=256, help="合并字节阈值")
+    parser.add_argument("--sink", choices=["socket", "none"], default="socket",
+                        help="socket: 每个事件写入本地socket；none: 只测量编码")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(rows)
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
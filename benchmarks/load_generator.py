@@ -0,0 +1,258 @@
+"""
+负载生成器
+以固定并发（闭环：每个并发连接收到响应后立即发下一个请求）依次压测各个场景，
+统计吞吐量、成功率和延迟分位数（NumPy计算），结果写入JSON文件，可与之前提交的结果对比。
+配合 benchmarks/stub_upstream.py 使用时，请求经过真实的服务商适配器而不产生API费用
+
+场景:
+    translate          POST /api/translate，延迟为完整响应时间
+    translate_stream   POST /api/translate/stream，另统计首个片段时间（ttfb）
+    summarize_stream   POST /api/summarize/stream，同上
+    translate_async    POST /api/translate/async 后轮询 /api/task/{task_id}，延迟为提交到完成的时间
+    summarize_async    POST /api/summarize/async 后轮询，同上
+
+用法:
+    python benchmarks/load_generator.py --base-url http://127.0.0.1:8000 --concurrency 20 --duration 30
+    python benchmarks/load_generator.py --scenarios translate_stream --requests 500 --output results.json
+    python benchmarks/load_generator.py --output after.json --compare before.json   # 与之前的结果对比
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+SCENARIOS = ("translate", "translate_stream", "summarize_stream", "translate_async", "summarize_async")
+
+# 默认请求文本（样例语料的开头）
+DEFAULT_TEXT_CHARS = 600
+CORPUS = ROOT / "benchmarks" / "corpus" / "zh_city_report.txt"
+
+
+class Result:
+    """单个请求的结果"""
+    __slots__ = ("ok", "status", "latency", "ttfb", "polls")
+
+    def __init__(self, ok: bool, status: str, latency: float, ttfb: Optional[float] = None, polls: int = 0):
+        self.ok = ok
+        self.status = status
+        self.latency = latency
+        self.ttfb = ttfb
+        self.polls = polls
+
+
+async def run_sync(client: httpx.AsyncClient, path: str, payload: dict, args) -> Result:
+    start = time.perf_counter()
+    response = await client.post(path, json=payload)
+    return Result(response.status_code == 200, str(response.status_code), time.perf_counter() - start)
+
+
+async def run_stream(client: httpx.AsyncClient, path: str, payload: dict, args) -> Result:
+    """读取SSE事件直到结束事件或 [DONE]，首个片段事件的时间为 ttfb"""
+    start = time.perf_counter()
+    ttfb = None
+    status = "no_done"
+    async with client.stream("POST", path, json=payload) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return Result(False, str(response.status_code), time.perf_counter() - start)
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            # 翻译流的事件为 {"type": ...}，总结流的事件为 {"chunk": ...} / {"status": ...}
+            event_type = event.get("type") or ("chunk" if "chunk" in event else event.get("status"))
+            if event_type == "chunk" and ttfb is None:
+                ttfb = time.perf_counter() - start
+            elif event_type in ("done", "completed", "error", "cancelled"):
+                status = event_type
+                break
+    ok = status in ("done", "completed")
+    return Result(ok, "200" if ok else status, time.perf_counter() - start, ttfb)
+
+
+async def run_async(client: httpx.AsyncClient, path: str, payload: dict, args) -> Result:
+    """提交任务后按间隔轮询，直到任务完成、失败或超时"""
+    start = time.perf_counter()
+    response = await client.post(path, json=payload)
+    if response.status_code != 200:
+        return Result(False, str(response.status_code), time.perf_counter() - start)
+    task_id = response.json()["task_id"]
+    polls = 0
+    while time.perf_counter() - start < args.timeout:
+        await asyncio.sleep(args.poll_interval)
+        polls += 1
+        response = await client.get(f"/api/task/{task_id}")
+        if response.status_code != 200:
+            return Result(False, f"poll_{response.status_code}", time.perf_counter() - start, polls=polls)
+        status = response.json()["data"]["status"]
+        if status in ("completed", "failed"):
+            return Result(status == "completed", "200" if status == "completed" else status,
+                          time.perf_counter() - start, polls=polls)
+    return Result(False, "poll_timeout", time.perf_counter() - start, polls=polls)
+
+
+def scenario_request(name: str, text: str):
+    """场景对应的 (执行函数, 路径, 请求体)"""
+    operation, _, mode = name.partition("_")
+    payload = {"text": text} if operation == "summarize" else {"text": text, "target_lang": "英文"}
+    if mode == "stream":
+        return run_stream, f"/api/{operation}/stream", payload
+    if mode == "async":
+        return run_async, f"/api/{operation}/async", payload
+    return run_sync, f"/api/{operation}", payload
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """延迟分位数（毫秒）"""
+    if not values:
+        return None
+    data = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(data, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(data.mean()), 2),
+        "max": round(float(data.max()), 2),
+    }
+
+
+async def run_scenario(name: str, text: str, args) -> Dict[str, Any]:
+    """以固定并发运行一个场景，直到达到请求数或持续时间"""
+    runner, path, payload = scenario_request(name, text)
+    results: List[Result] = []
+    issued = 0
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    headers = {"X-Client-ID": args.client_id}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits,
+                                 headers=headers) as client:
+        # 预热：建立连接、初始化服务端的服务商客户端和Redis连接，不计入结果
+        for _ in range(args.warmup):
+            try:
+                await runner(client, path, payload, args)
+            except httpx.HTTPError:
+                pass
+        deadline = time.perf_counter() + args.duration
+
+        async def worker():
+            nonlocal issued
+            while time.perf_counter() < deadline and (args.requests is None or issued < args.requests):
+                issued += 1
+                request_start = time.perf_counter()
+                try:
+                    results.append(await runner(client, path, payload, args))
+                except httpx.HTTPError as e:
+                    results.append(Result(False, type(e).__name__, time.perf_counter() - request_start))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = [result for result in results if result.ok]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "statuses": dict(Counter(result.status for result in results)),
+        "duration_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_ms": percentiles([result.latency for result in ok]),
+        "ttfb_ms": percentiles([result.ttfb for result in ok if result.ttfb is not None]),
+        "polls_mean": round(float(np.mean([result.polls for result in ok])), 2) if name.endswith("_async") and ok else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """打印与之前结果的吞吐量和延迟分位数变化"""
+    print(f"\n与 {baseline.get('label') or baseline.get('git_commit')} 对比:")
+    for name, row in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        old, new = before.get("throughput_rps"), row.get("throughput_rps")
+        if old and new:
+            changes.append(f"throughput {old} -> {new} req/s ({(new / old - 1) * 100:+.1f}%)")
+        for group in ("latency_ms", "ttfb_ms"):
+            for key in ("p50", "p95", "p99"):
+                old, new = (before.get(group) or {}).get(key), (row.get(group) or {}).get(key)
+                if old and new:
+                    changes.append(f"{group[:-3]}.{key} {old} -> {new} ({(new / old - 1) * 100:+.1f}%)")
+        print(f"  {name}: " + "; ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="负载生成器（吞吐量与延迟分位数）")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10, help="并发数（每个场景）")
+    parser.add_argument("--duration", type=float, default=20, help="每个场景的最长持续时间（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="每个场景的请求数上限")
+    parser.add_argument("--warmup", type=int, default=3, help="每个场景开始前不计入结果的预热请求数")
+    parser.add_argument("--text-file", type=str, default=str(CORPUS), help="请求文本文件")
+    parser.add_argument("--text-chars", type=int, default=DEFAULT_TEXT_CHARS, help="取文本文件的前N个字符")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="异步任务的轮询间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求（或异步任务）的超时（秒）")
+    parser.add_argument("--client-id", default="loadgen", help="X-Client-ID 请求头")
+    parser.add_argument("--label", default=None, help="结果标签，默认使用当前git提交")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    parser.add_argument("--compare", type=str, default=None, help="与之前的结果JSON对比")
+    args = parser.parse_args()
+
+    text = Path(args.text_file).read_text(encoding="utf-8")[:args.text_chars]
+    commit = git_commit()
+    report = {
+        "label": args.label or commit,
+        "git_commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "text_chars": len(text),
+            "poll_interval": args.poll_interval,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        row = asyncio.run(run_scenario(name, text, args))
+        report["scenarios"][name] = row
+        latency = row["latency_ms"] or {}
+        print(f"{name:18} {row['ok']}/{row['requests']} ok  {row['throughput_rps']} req/s  "
+              f"p50 {latency.get('p50')}ms  p95 {latency.get('p95')}ms  p99 {latency.get('p99')}ms"
+              + (f"  ttfb p50 {row['ttfb_ms']['p50']}ms" if row["ttfb_ms"] else ""))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+流量回放
+读取 TrafficCaptureMiddleware 采集的JSONL文件，按原始到达间隔（除以 --speed 倍速）向目标实例重新发出请求，
+流式响应读取到结束；按路由比较回放与采集时的延迟分位数（NumPy计算）和状态码，结果可写入JSON文件。
+异步任务的轮询和流式续传请求中的原任务ID/流ID会替换为回放时新返回的ID（等待对应的提交请求返回后再发出）；
+请求体被截断的记录不发出（状态记为 truncated），依赖它的轮询和续传请求随之跳过
+
+用法:
+    python benchmarks/replay_traffic.py captures/ --target http://127.0.0.1:8000
+    python benchmarks/replay_traffic.py captures/capture-20261018-*.jsonl --speed 4 --limit 2000 --output replay.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+
+from benchmarks.load_generator import git_commit, percentiles  # noqa: E402
+
+# 等待提交请求返回新ID的最长时间（秒）
+ID_WAIT_SECONDS = 60
+
+
+def load_records(inputs: List[str], limit: Optional[int]) -> List[Dict[str, Any]]:
+    """读取采集文件（目录或通配符），按到达时间排序"""
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths.extend(sorted(path.glob("capture-*.jsonl")))
+        else:
+            paths.extend(Path(p) for p in sorted(glob.glob(item)))
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+class Replayer:
+    """按原始间隔发出请求并记录结果"""
+
+    def __init__(self, client: httpx.AsyncClient, timeout: float):
+        self.client = client
+        self.timeout = timeout
+        self.id_map: Dict[str, asyncio.Future] = {}
+        self.results: List[Dict[str, Any]] = []
+
+    def expect_ids(self, record: Dict[str, Any]):
+        """记录中的原ID在提交请求发出前登记，依赖它的后续请求等待新ID"""
+        loop = asyncio.get_running_loop()
+        for old_id in (record.get("ids") or {}).values():
+            self.id_map.setdefault(old_id, loop.create_future())
+
+    async def resolve_path(self, path: str) -> Optional[str]:
+        """把路径中的原ID替换为回放时的新ID，提交失败时返回None"""
+        segments = path.split("/")
+        for index, segment in enumerate(segments):
+            future = self.id_map.get(segment)
+            if future is None:
+                continue
+            try:
+                new_id = await asyncio.wait_for(asyncio.shield(future), ID_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                return None
+            if new_id is None:
+                return None
+            segments[index] = new_id
+        return "/".join(segments)
+
+    def publish_ids(self, record: Dict[str, Any], response: Optional[httpx.Response], body: Optional[bytes]):
+        """提交请求返回后登记新ID（失败时登记None，使依赖的请求直接跳过）"""
+        ids = record.get("ids") or {}
+        new_ids: Dict[str, Any] = {}
+        if response is not None and response.status_code == 200:
+            if "stream_id" in ids:
+                new_ids["stream_id"] = response.headers.get("x-stream-id")
+            if "task_id" in ids and body:
+                try:
+                    new_ids["task_id"] = json.loads(body).get("task_id")
+                except ValueError:
+                    pass
+        for field, old_id in ids.items():
+            future = self.id_map.get(old_id)
+            if future is not None and not future.done():
+                future.set_result(new_ids.get(field))
+
+    async def send(self, record: Dict[str, Any], lag: float):
+        route = record.get("route") or record["path"]
+        result = {"route": f"{record['method']} {route}", "recorded_status": record.get("status"),
+                  "recorded_ms": record.get("duration_ms"), "recorded_ttfb_ms": record.get("ttfb_ms"),
+                  "lag_ms": lag * 1000, "status": None, "latency_ms": None, "ttfb_ms": None}
+        response = None
+        body = None
+        try:
+            if record.get("body_truncated"):
+                # 截断的请求体不是有效的JSON，发出只会得到422
+                result["status"] = "truncated"
+                return
+            path = await self.resolve_path(record["path"])
+            if path is None:
+                result["status"] = "skipped"
+                return
+            url = path + (f"?{record['query']}" if record.get("query") else "")
+            headers = {**(record.get("headers") or {}), "X-Client-ID": record["client"]}
+            start = time.perf_counter()
+            async with self.client.stream(record["method"], url, content=record.get("body") or None,
+                                          headers=headers, timeout=self.timeout) as response:
+                chunks = []
+                async for chunk in response.aiter_bytes():
+                    if result["ttfb_ms"] is None:
+                        result["ttfb_ms"] = (time.perf_counter() - start) * 1000
+                    if record.get("ids"):
+                        chunks.append(chunk)
+                result["latency_ms"] = (time.perf_counter() - start) * 1000
+                result["status"] = response.status_code
+                body = b"".join(chunks)
+        except httpx.HTTPError as e:
+            result["status"] = type(e).__name__
+        finally:
+            self.publish_ids(record, response, body)
+            self.results.append(result)
+
+    async def run(self, records: List[Dict[str, Any]], speed: float):
+        """按原始到达间隔发出请求，lag 为实际发出时间比计划晚的时间"""
+        tasks = []
+        origin = records[0]["ts"]
+        started = time.perf_counter()
+        for record in records:
+            planned = (record["ts"] - origin) / speed
+            delay = planned - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.expect_ids(record)
+            lag = max(time.perf_counter() - started - planned, 0.0)
+            tasks.append(asyncio.create_task(self.send(record, lag)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+
+def delta(recorded: Optional[Dict[str, float]], replayed: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """回放相对采集时的分位数变化（毫秒）"""
+    if not recorded or not replayed:
+        return None
+    return {key: round(replayed[key] - recorded[key], 2) for key in ("p50", "p95", "p99")}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按路由汇总：只比较采集时和回放时都成功（2xx）的请求的延迟"""
+    by_route: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for result in results:
+        by_route[result["route"]].append(result)
+    rows = {}
+    for route, items in sorted(by_route.items(), key=lambda item: -len(item[1])):
+        both_ok = [r for r in items if isinstance(r["status"], int) and r["status"] < 300
+                   and (r["recorded_status"] or 0) < 300]
+        recorded = percentiles([r["recorded_ms"] / 1000 for r in both_ok if r["recorded_ms"] is not None])
+        replayed = percentiles([r["latency_ms"] / 1000 for r in both_ok])
+        recorded_ttfb = percentiles([r["recorded_ttfb_ms"] / 1000 for r in both_ok if r["recorded_ttfb_ms"] is not None])
+        replayed_ttfb = percentiles([r["ttfb_ms"] / 1000 for r in both_ok if r["ttfb_ms"] is not None])
+        rows[route] = {
+            "requests": len(items),
+            "compared": len(both_ok),
+            "status_match_rate": round(sum(r["status"] == r["recorded_status"] for r in items) / len(items), 4),
+            "statuses": dict(Counter(str(r["status"]) for r in items)),
+            "recorded_ms": recorded,
+            "replayed_ms": replayed,
+            "delta_ms": delta(recorded, replayed),
+            "ttfb_delta_ms": delta(recorded_ttfb, replayed_ttfb),
+        }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按原始到达间隔回放采集的流量")
+    parser.add_argument("inputs", nargs="+", help="采集目录、文件或通配符")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="目标实例地址")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，2表示到达间隔缩短一半")
+    parser.add_argument("--limit", type=int, default=None, help="最多回放的请求数（按到达时间）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求的超时（秒）")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed 必须大于0")
+
+    records = load_records(args.inputs, args.limit)
+    if not records:
+        print("没有可回放的记录")
+        return
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"回放 {len(records)} 个请求，原始时长 {span:.1f}s，倍速 {args.speed:g}")
+    truncated = sum(1 for record in records if record.get("body_truncated"))
+    if truncated:
+        print(f"其中 {truncated} 个请求的请求体在采集时被截断，回放时跳过")
+
+    async def run():
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+        async with httpx.AsyncClient(base_url=args.target, limits=limits) as client:
+            replayer = Replayer(client, args.timeout)
+            elapsed = await replayer.run(records, args.speed)
+            return replayer.results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    routes = summarize(results)
+    report = {
+        "git_commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "target": args.target,
+        "speed": args.speed,
+        "requests": len(results),
+        "recorded_seconds": round(span, 2),
+        "replay_seconds": round(elapsed, 2),
+        "schedule_lag_ms": percentiles([r["lag_ms"] / 1000 for r in results]),
+        "routes": routes,
+    }
+    for route, row in routes.items():
+        print(f"{route:45} {row['requests']:6}  状态一致 {row['status_match_rate']:.1%}  "
+              f"p50/p95/p99 变化(ms) {row['delta_ms']}")
+    lag = report["schedule_lag_ms"] or {}
+    print(f"回放用时 {elapsed:.1f}s，发出时间偏差 p99 {lag.get('p99')}ms")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+路由策略模拟
+把一段流量（合成或从JSONL回放）分别交给不同的路由策略，用模拟的服务商延迟、错误率和成本
+比较各策略的延迟分位数、总成本、失败率以及各路由目标被选中的比例；
+路由决策使用 services.routing 中的真实策略，EWMA统计随模拟结果实时更新
+
+用法:
+    python benchmarks/sim_routing.py
+    python benchmarks/sim_routing.py --requests 5000 --cost-weights 0.2 1 5 --output sim_output.json
+    python benchmarks/sim_routing.py --traffic traffic.jsonl   # 每行 {"task": "translate", "input_tokens": 120}
+    python benchmarks/sim_routing.py --degrade qianwen:qwen-turbo:0.5:4   # 一半流量之后该目标延迟变为4倍
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.provider_pool import EwmaStats  # noqa: E402
+from services.routing import CostLatencyPolicy, OrderedPolicy, ProviderRouter, RouteTarget  # noqa: E402
+
+# 默认的模拟目标：小模型快且便宜但上下文短，大模型慢、贵、上下文长
+DEFAULT_TARGETS = [
+    {"target": "qianwen:qwen-turbo", "cost_weight": 1.0, "max_input_tokens": 6000,
+     "base_latency": 0.25, "latency_per_ktok": 0.35, "error_rate": 0.01},
+    {"target": "qianwen:qwen-plus", "cost_weight": 4.0, "max_input_tokens": 30000,
+     "base_latency": 0.5, "latency_per_ktok": 0.7, "error_rate": 0.01},
+    {"target": "openai:gpt-4o-mini", "cost_weight": 3.0, "max_input_tokens": 120000,
+     "base_latency": 0.6, "latency_per_ktok": 0.5, "error_rate": 0.02},
+]
+
+# 失败调用在故障转移前耗费的时间（秒）
+FAILURE_LATENCY = 1.0
+
+
+def synthetic_traffic(count: int, rng: np.random.Generator):
+    """合成流量：以短的界面文案为主，混合中等长度段落和少量长文档"""
+    kinds = rng.choice(3, size=count, p=[0.7, 0.25, 0.05])
+    tokens = np.where(
+        kinds == 0, rng.integers(5, 60, size=count),
+        np.where(kinds == 1, rng.integers(200, 2000, size=count), rng.integers(5000, 40000, size=count))
+    )
+    tasks = np.where((kinds == 0) | (rng.random(count) < 0.3), "translate", "summarize")
+    return [{"task": str(task), "input_tokens": int(n)} for task, n in zip(tasks, tokens)]
+
+
+def load_traffic(path: str):
+    """回放JSONL流量，每行包含 task 和 input_tokens（或 text）"""
+    from utils.text_processor import estimate_tokens
+
+    requests = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        input_tokens = item.get("input_tokens")
+        if input_tokens is None:
+            input_tokens = estimate_tokens(item.get("text", ""))
+        requests.append({"task": item.get("task", "translate"), "input_tokens": int(input_tokens)})
+    return requests
+
+
+def simulate(policy, profiles, traffic, seed, degrade=None):
+    """
+    用指定策略模拟一遍流量
+
+    Returns:
+        该策略的汇总结果
+    """
+    rng = np.random.default_rng(seed)
+    targets = [RouteTarget.parse(f"{p['target']}:{p['cost_weight']}:{p['max_input_tokens']}") for p in profiles]
+    profile_by_key = {t.key: p for t, p in zip(targets, profiles)}
+    stats = {t.key: EwmaStats() for t in targets}
+    router = ProviderRouter(targets, stats, policy)
+
+    latencies = np.empty(len(traffic))
+    cost = 0.0
+    failures = 0
+    served = {t.key: 0 for t in targets}
+    degrade_at = int(len(traffic) * degrade[1]) if degrade else None
+
+    for index, request in enumerate(traffic):
+        decision = router.decide(request["task"], request["input_tokens"])
+        ktokens = decision.tokens / 1000.0
+        elapsed = 0.0
+        for key in decision.order:
+            profile = profile_by_key[key]
+            multiplier = degrade[2] if degrade and key == degrade[0] and index >= degrade_at else 1.0
+            if rng.random() < profile["error_rate"]:
+                elapsed += FAILURE_LATENCY
+                stats[key].record(None, failed=True)
+                continue
+            latency = (profile["base_latency"] + profile["latency_per_ktok"] * ktokens) \
+                * multiplier * rng.lognormal(0.0, 0.25)
+            elapsed += latency
+            stats[key].record(latency, decision.tokens)
+            cost += profile["cost_weight"] * ktokens
+            served[key] += 1
+            break
+        else:
+            failures += 1
+        latencies[index] = elapsed
+
+    total = len(traffic)
+    name = policy.name if not isinstance(policy, CostLatencyPolicy) else f"{policy.name}(cost={policy.cost_weight:g})"
+    return {
+        "policy": name,
+        "requests": total,
+        "latency_mean": round(float(latencies.mean()), 3),
+        "latency_p50": round(float(np.percentile(latencies, 50)), 3),
+        "latency_p95": round(float(np.percentile(latencies, 95)), 3),
+        "latency_p99": round(float(np.percentile(latencies, 99)), 3),
+        "total_cost": round(cost, 1),
+        "failure_rate": round(failures / total, 4) if total else 0.0,
+        "share": {key: round(count / total, 3) for key, count in served.items()},
+    }
+
+
+def print_table(rows):
+    """以对齐的表格打印结果"""
+    headers = [h for h in rows[0] if h != "share"]
+    widths = [max(len(h), *(len(str(r[h])) for r in rows)) for h in headers]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+    print()
+    for row in rows:
+        share = ", ".join(f"{key}={value:.1%}" for key, value in row["share"].items())
+        print(f"{row['policy']}: {share}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路由策略模拟")
+    parser.add_argument("--requests", type=int, default=2000, help="合成流量的请求数")
+    parser.add_argument("--traffic", type=str, default=None, help="回放的JSONL流量文件")
+    parser.add_argument("--targets", type=str, default=None, help="模拟目标配置JSON文件，格式同 DEFAULT_TARGETS")
+    parser.add_argument("--cost-weights", type=float, nargs="+", default=[0.2, 1.0, 5.0],
+                        help="cost_latency 策略要比较的成本权重")
+    parser.add_argument("--degrade", type=str, default=None,
+                        help="target:流量比例:延迟倍数，在该比例的流量之后让目标变慢，观察EWMA的适应")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=str, default=None, help="结果JSON输出路径")
+    args = parser.parse_args()
+
+    profiles = json.loads(Path(args.targets).read_text(encoding="utf-8")) if args.targets else DEFAULT_TARGETS
+    if args.traffic:
+        traffic = load_traffic(args.traffic)
+    else:
+        traffic = synthetic_traffic(args.requests, np.random.default_rng(args.seed))
+
+    degrade = None
+    if args.degrade:
+        target, fraction, multiplier = args.degrade.rsplit(":", 2)
+        degrade = (target, float(fraction), float(multiplier))
+
+    policies = [OrderedPolicy()] + [CostLatencyPolicy(cost_weight=weight) for weight in args.cost_weights]
+    rows = [simulate(policy, profiles, traffic, args.seed, degrade) for policy in policies]
+
+    print_table(rows)
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+本地模拟上游服务
+实现 OpenAI Chat Completions（含流式，通义千问的兼容模式共用）和 Anthropic Messages（含流式），
+服务端把 OPENAI_BASE_URL / CLAUDE_BASE_URL / QIANWEN_COMPATIBLE_BASE_URL 指向本服务后，
+请求会经过真实的服务商适配器、SDK解析、重试、熔断和并发限制，不产生API费用。
+
+首个token延迟按配置的分布抽样，之后按 token 速率逐个输出；可按比例注入500错误、429限流（带 Retry-After）
+和流式输出中途断开。参数可在启动时指定，也可在运行中通过 PUT /_stub/config 修改
+
+用法:
+    python benchmarks/stub_upstream.py --port 9100 --latency lognormal --latency-ms 300 --tokens-per-second 50
+    python benchmarks/stub_upstream.py --error-rate 0.05 --rate-limit-rate 0.1 --retry-after 1
+
+服务端配置:
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    CLAUDE_API_KEY=stub CLAUDE_BASE_URL=http://127.0.0.1:9100
+    QIANWEN_API_KEY=stub QIANWEN_COMPATIBLE_BASE_URL=http://127.0.0.1:9100/compatible-mode/v1
+
+运行中修改参数 / 查看统计:
+    curl -X PUT localhost:9100/_stub/config -H 'Content-Type: application/json' -d '{"rate_limit_rate": 0.2}'
+    curl localhost:9100/_stub/stats
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import AsyncIterator, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from utils.text_processor import estimate_tokens  # noqa: E402
+
+# 输出的token（中英文混合，长度与真实模型的token片段相当）
+VOCABULARY = ["The", " quick", " brown", " fox", " jumps", " over", " the", " lazy", " dog", ".",
+              "敏捷的", "棕色", "狐狸", "跳过", "了", "懒狗", "，", "。"]
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class StubConfig:
+    """模拟上游的行为参数"""
+    latency: str = "lognormal"        # 首个token延迟分布：fixed、uniform、exponential、lognormal
+    latency_ms: float = 300.0         # 分布的中位数（fixed 为固定值，uniform 为均值）
+    latency_spread: float = 0.5       # uniform 为相对均值的半宽比例，lognormal 为 sigma
+    tokens_per_second: float = 50.0   # 首个token之后的输出速率，0表示不等待
+    output_tokens: int = 80           # 每次输出的token数（output_ratio 为0时）
+    output_ratio: float = 0.0         # 按输入的估算token数的比例输出（翻译约1.0）
+    max_output_tokens: int = 2000
+    error_rate: float = 0.0           # 返回500的比例
+    rate_limit_rate: float = 0.0      # 返回429的比例
+    retry_after: float = 1.0          # 429 的 Retry-After（秒）
+    stream_abort_rate: float = 0.0    # 流式输出中途断开连接的比例
+
+    def update(self, values: dict):
+        names = {field.name for field in fields(self)}
+        for key, value in values.items():
+            if key not in names:
+                raise ValueError(f"未知参数: {key}")
+            setattr(self, key, type(getattr(self, key))(value))
+        if self.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {self.latency}")
+
+
+settings = StubConfig()
+stats: Counter = Counter()
+rng = random.Random()
+
+app = FastAPI(title="模拟上游服务")
+
+
+class StreamAborted(Exception):
+    """注入的流式输出中途断开"""
+
+
+def sample_latency() -> float:
+    """按配置的分布抽样首个token延迟（秒）"""
+    median = settings.latency_ms / 1000.0
+    if settings.latency == "fixed":
+        value = median
+    elif settings.latency == "uniform":
+        value = rng.uniform(median * (1 - settings.latency_spread), median * (1 + settings.latency_spread))
+    elif settings.latency == "exponential":
+        value = rng.expovariate(1 / median) if median > 0 else 0.0
+    else:
+        value = rng.lognormvariate(0, settings.latency_spread) * median
+    return max(value, 0.0)
+
+
+def output_tokens(prompt: str) -> List[str]:
+    """生成本次输出的token"""
+    count = settings.output_tokens
+    if settings.output_ratio > 0:
+        count = round(estimate_tokens(prompt) * settings.output_ratio)
+    count = max(1, min(count, settings.max_output_tokens))
+    start = rng.randrange(len(VOCABULARY))
+    return [VOCABULARY[(start + index) % len(VOCABULARY)] for index in range(count)]
+
+
+def prompt_text(messages) -> str:
+    """拼接请求消息的文本内容"""
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+        elif content:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def injected_error(api: str):
+    """按比例注入错误，返回错误响应或None"""
+    roll = rng.random()
+    if roll < settings.rate_limit_rate:
+        stats[f"{api}:429"] += 1
+        status, kind, message = 429, "rate_limit", "模拟限流"
+    elif roll < settings.rate_limit_rate + settings.error_rate:
+        stats[f"{api}:500"] += 1
+        status, kind, message = 500, "server_error", "模拟服务端错误"
+    else:
+        return None
+    if api == "anthropic":
+        body = {"type": "error", "error": {"type": f"{kind}_error" if kind == "rate_limit" else "api_error",
+                                           "message": message}}
+    else:
+        body = {"error": {"message": message, "type": kind, "code": kind}}
+    headers = {"Retry-After": f"{settings.retry_after:g}"} if status == 429 else None
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def paced(tokens: List[str], stream: bool) -> AsyncIterator[str]:
+    """按 token 速率逐个产生token，按比例在中途断开"""
+    abort_at = rng.randrange(1, len(tokens) + 1) if stream and rng.random() < settings.stream_abort_rate else None
+    interval = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+    for index, token in enumerate(tokens):
+        if index and interval:
+            await asyncio.sleep(interval)
+        if index == abort_at:
+            stats["stream_aborted"] += 1
+            raise StreamAborted()
+        yield token
+
+
+def sse(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/v1/chat/completions")
+@app.post("/compatible-mode/v1/chat/completions")
+async def chat_completions(request: Request):
+    """OpenAI Chat Completions（通义千问OpenAI兼容模式相同）"""
+    body = await request.json()
+    error = injected_error("openai")
+    if error is not None:
+        return error
+    prompt = prompt_text(body.get("messages"))
+    tokens = output_tokens(prompt)
+    model = body.get("model", "stub")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    stats["openai"] += 1
+    await asyncio.sleep(sample_latency())
+
+    if not body.get("stream"):
+        text = "".join([token async for token in paced(tokens, stream=False)])
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": len(tokens),
+                      "total_tokens": estimate_tokens(prompt) + len(tokens)},
+        }
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        async for token in paced(tokens, stream=True):
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return sse(events())
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    """Anthropic Messages"""
+    body = await request.json()
+    error = injected_error("anthropic")
+    if error is not None:
+        return error
+    prompt = prompt_text(body.get("messages"))
+    tokens = output_tokens(prompt)[:body.get("max_tokens", settings.max_output_tokens)]
+    message = {
+        "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+        "model": body.get("model", "stub"), "content": [], "stop_reason": None, "stop_sequence": None,
+        "usage": {"input_tokens": estimate_tokens(prompt), "output_tokens": 1},
+    }
+    stats["anthropic"] += 1
+    await asyncio.sleep(sample_latency())
+
+    if not body.get("stream"):
+        text = "".join([token async for token in paced(tokens, stream=False)])
+        return {**message, "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+                "usage": {"input_tokens": estimate_tokens(prompt), "output_tokens": len(tokens)}}
+
+    def event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps({'type': name, **data}, ensure_ascii=False)}\n\n"
+
+    async def events():
+        yield event("message_start", {"message": message})
+        yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        async for token in paced(tokens, stream=True):
+            yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": token}})
+        yield event("content_block_stop", {"index": 0})
+        yield event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": len(tokens)}})
+        yield event("message_stop", {})
+
+    return sse(events())
+
+
+@app.get("/_stub/config")
+async def get_config():
+    return asdict(settings)
+
+
+@app.put("/_stub/config")
+async def put_config(request: Request):
+    try:
+        settings.update(await request.json())
+    except (ValueError, TypeError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return asdict(settings)
+
+
+@app.get("/_stub/stats")
+async def get_stats():
+    return dict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟上游服务（OpenAI / Anthropic）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS,
+                        default=settings.latency, help="首个token延迟分布")
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms, help="首个token延迟的中位数（毫秒）")
+    parser.add_argument("--latency-spread", type=float, default=settings.latency_spread,
+                        help="uniform 的相对半宽 / lognormal 的 sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--output-tokens", type=int, default=settings.output_tokens)
+    parser.add_argument("--output-ratio", type=float, default=settings.output_ratio,
+                        help="按输入token数的比例输出，0表示固定 --output-tokens")
+    parser.add_argument("--max-output-tokens", type=int, default=settings.max_output_tokens)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="返回500的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate, help="返回429的比例")
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after, help="429 的 Retry-After（秒）")
+    parser.add_argument("--stream-abort-rate", type=float, default=settings.stream_abort_rate,
+                        help="流式输出中途断开的比例")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    settings.update({field.name: getattr(args, field.name) for field in fields(settings)})
+    if args.seed is not None:
+        rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
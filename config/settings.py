@@ -1,12 +1,31 @@
 """配置文件"""
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 # 加载.env文件
 load_dotenv()
 
 
+def _parse_tenant_weights(value: str) -> Dict[str, float]:
+    """
+    解析租户权重配置，格式 tenant_a:4,tenant_b:2
+
+    Raises:
+        ValueError: 权重不是正数（调度器按 成本/权重 计算完成标签）
+    """
+    weights = {}
+    for item in value.split(","):
+        if ":" not in item:
+            continue
+        name, _, weight = item.partition(":")
+        name, weight = name.strip(), float(weight)
+        if not weight > 0:
+            raise ValueError(f"SCHEDULER_TENANT_WEIGHTS 中租户 {name} 的权重必须大于0: {weight}")
+        weights[name] = weight
+    return weights
+
+
 class Config:
     """应用配置类"""
     
@@ -18,9 +37,35 @@ class Config:
     
     # 任务配置
     TASK_EXPIRE_SECONDS: int = int(os.getenv("TASK_EXPIRE_SECONDS", "3600"))  # 默认1小时
+    TASK_PARTIAL_UPDATE_SECONDS: float = float(os.getenv("TASK_PARTIAL_UPDATE_SECONDS", "1.0"))  # 部分结果写入间隔
     
     # AI API配置
     AI_PROVIDER: str = os.getenv("AI_PROVIDER", "qianwen")  # openai, claude, qianwen
+    # 备用服务提供商（逗号分隔，按顺序故障转移），为空时使用全部已配置的服务商
+    AI_FALLBACK_PROVIDERS: List[str] = [
+        name.strip() for name in os.getenv("AI_FALLBACK_PROVIDERS", "").split(",") if name.strip()
+    ]
+    
+    # 路由配置（按请求选择服务商+模型）
+    ROUTING_POLICY: str = os.getenv("ROUTING_POLICY", "ordered")  # ordered（按故障转移顺序）, cost_latency
+    # 路由目标，格式 provider:model[:cost_weight[:max_input_tokens]]，逗号分隔；为空时每个服务商使用其默认模型
+    ROUTING_TARGETS: List[str] = [
+        item.strip() for item in os.getenv("ROUTING_TARGETS", "").split(",") if item.strip()
+    ]
+    ROUTING_LATENCY_WEIGHT: float = float(os.getenv("ROUTING_LATENCY_WEIGHT", "1.0"))  # 每秒预估延迟的分数
+    ROUTING_COST_WEIGHT: float = float(os.getenv("ROUTING_COST_WEIGHT", "1.0"))  # 每单位成本的分数
+    ROUTING_ERROR_PENALTY: float = float(os.getenv("ROUTING_ERROR_PENALTY", "10.0"))  # 错误率为1时的惩罚分数
+    ROUTING_DEFAULT_LATENCY_SECONDS: float = float(os.getenv("ROUTING_DEFAULT_LATENCY_SECONDS", "1.0"))  # 无样本时的每千token延迟
+    ROUTING_EWMA_ALPHA: float = float(os.getenv("ROUTING_EWMA_ALPHA", "0.2"))
+    
+    # 熔断器配置
+    CIRCUIT_WINDOW_SECONDS: float = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))  # 统计窗口
+    CIRCUIT_MIN_REQUESTS: int = int(os.getenv("CIRCUIT_MIN_REQUESTS", "5"))  # 窗口内最少请求数才评估
+    CIRCUIT_ERROR_RATE_THRESHOLD: float = float(os.getenv("CIRCUIT_ERROR_RATE_THRESHOLD", "0.5"))
+    CIRCUIT_SLOW_CALL_SECONDS: float = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "15"))  # 慢调用判定
+    CIRCUIT_SLOW_CALL_RATE_THRESHOLD: float = float(os.getenv("CIRCUIT_SLOW_CALL_RATE_THRESHOLD", "0.8"))
+    CIRCUIT_OPEN_SECONDS: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "20"))  # 熔断后多久进入半开
+    CIRCUIT_HALF_OPEN_PROBES: int = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))  # 半开状态允许的探测请求数
     
     # OpenAI配置
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -35,8 +80,160 @@ class Config:
     # 通义千问配置
     QIANWEN_API_KEY: Optional[str] = os.getenv("QIANWEN_API_KEY")
     QIANWEN_BASE_URL: str = os.getenv("QIANWEN_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")
+    QIANWEN_COMPATIBLE_BASE_URL: str = os.getenv("QIANWEN_COMPATIBLE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")  # OpenAI兼容模式
     QIANWEN_MODEL: str = os.getenv("QIANWEN_MODEL", "qwen-turbo")
+
+    # 上游HTTP录制与回放配置（off：直接访问上游；record：访问上游并录制响应；replay：离线回放录制的响应）
+    CASSETTE_MODE: str = os.getenv("CASSETTE_MODE", "off").lower()
+    CASSETTE_DIR: str = os.getenv("CASSETTE_DIR", "cassettes")  # 每个服务商一个JSONL录制文件
+    CASSETTE_TIMING_SCALE: float = float(os.getenv("CASSETTE_TIMING_SCALE", "1.0"))  # 回放等待时间的缩放比例，0表示不等待
+    
+    # 自适应并发限制配置（每个服务商独立的AIMD限制器）
+    LIMITER_INITIAL_CONCURRENCY: int = int(os.getenv("LIMITER_INITIAL_CONCURRENCY", "8"))
+    LIMITER_MIN_CONCURRENCY: int = int(os.getenv("LIMITER_MIN_CONCURRENCY", "1"))
+    LIMITER_MAX_CONCURRENCY: int = int(os.getenv("LIMITER_MAX_CONCURRENCY", "64"))
+    LIMITER_BACKOFF_RATIO: float = float(os.getenv("LIMITER_BACKOFF_RATIO", "0.7"))  # 限流时上限乘以该系数
+    LIMITER_LATENCY_THRESHOLD_SECONDS: float = float(os.getenv("LIMITER_LATENCY_THRESHOLD_SECONDS", "10"))
+    LIMITER_BACKOFF_COOLDOWN_SECONDS: float = float(os.getenv("LIMITER_BACKOFF_COOLDOWN_SECONDS", "10"))  # 两次降低上限的最小间隔
+    LIMITER_MAX_QUEUE: int = int(os.getenv("LIMITER_MAX_QUEUE", "100"))  # 排队调用数上限
+    LIMITER_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LIMITER_QUEUE_TIMEOUT_SECONDS", "5"))
+    
+    # 上游调用重试配置（指数退避 + 完全抖动，重试流量受预算限制）
+    RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))  # 单个服务商的最大尝试次数（含首次）
+    RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.2"))
+    RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "5"))  # Retry-After超过该值时不重试
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))  # 重试流量上限占基础流量的比例
+    RETRY_BUDGET_MAX_TOKENS: float = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))  # 允许的突发重试次数
+    
+    # 上游调用调度配置（交互 > 流式 > 异步，租户间加权公平）
+    SCHEDULER_MAX_CONCURRENCY: int = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "32"))  # 上游总并发容量
+    SCHEDULER_STARVATION_SECONDS: float = float(os.getenv("SCHEDULER_STARVATION_SECONDS", "10"))
+    # 租户权重，格式 tenant_a:4,tenant_b:2，未列出的租户权重为1
+    SCHEDULER_TENANT_WEIGHTS: Dict[str, float] = _parse_tenant_weights(os.getenv("SCHEDULER_TENANT_WEIGHTS", ""))
+    
+    # 准入控制配置（负载过高时返回 503 + Retry-After）
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_PATHS: List[str] = [
+        path.strip() for path in os.getenv(
+            "ADMISSION_PATHS",
+            "/api/translate,/api/summarize,/api/translate/stream,/api/summarize/stream"
+        ).split(",") if path.strip()
+    ]
+    ADMISSION_SLO_SECONDS: float = float(os.getenv("ADMISSION_SLO_SECONDS", "20"))  # 接口排队时延SLO
+    # 按接口覆盖SLO，格式 /api/translate:10,/api/translate/stream:30
+    ADMISSION_ENDPOINT_SLOS: Dict[str, float] = {
+        path.strip(): float(slo)
+        for path, _, slo in (
+            item.rpartition(":") for item in os.getenv("ADMISSION_ENDPOINT_SLOS", "").split(",") if ":" in item
+        )
+    }
+    ADMISSION_QUEUE_DELAY_RATIO: float = float(os.getenv("ADMISSION_QUEUE_DELAY_RATIO", "0.5"))  # 排队时延占SLO比例上限
+    ADMISSION_MIN_IN_FLIGHT: int = int(os.getenv("ADMISSION_MIN_IN_FLIGHT", "8"))  # 在途请求少于该值时不卸载
+    ADMISSION_EWMA_ALPHA: float = float(os.getenv("ADMISSION_EWMA_ALPHA", "0.3"))
+    ADMISSION_MAX_RETRY_AFTER: int = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "60"))
+    ADMISSION_MAX_TASK_BACKLOG: int = int(os.getenv("ADMISSION_MAX_TASK_BACKLOG", "200"))  # 异步任务积压上限
+    
+    # 请求截止时间配置（请求头 X-Request-Timeout 可覆盖，单位秒）
+    REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+    REQUEST_TIMEOUT_MAX_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "3600"))
+    # 按接口覆盖默认超时，异步任务接口的超时为任务整体的截止时间
+    REQUEST_TIMEOUT_ENDPOINT_DEFAULTS: Dict[str, float] = {
+        path.strip(): float(timeout)
+        for path, _, timeout in (
+            item.rpartition(":") for item in os.getenv(
+                "REQUEST_TIMEOUT_ENDPOINT_DEFAULTS",
+                "/api/translate:30,/api/summarize:60,/api/translate/stream:120,/api/summarize/stream:120,"
+                "/api/translate/async:600,/api/summarize/async:600"
+            ).split(",") if ":" in item
+        )
+    }
+    AI_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "600"))  # 没有截止时间时的上游超时
+    
+    # 管理接口令牌（请求头 X-Admin-Token），为空时管理接口不可用
+    ADMIN_TOKEN: Optional[str] = os.getenv("ADMIN_TOKEN") or None
+    
+    # 对冲请求配置（同步翻译/总结，默认关闭）
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))  # 超过该延迟分位数后发起对冲
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # 延迟样本不足时不对冲
+    HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
+    HEDGE_BUDGET_RATIO: float = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))  # 对冲流量上限占比
+    HEDGE_ALTERNATE_PROVIDER: bool = os.getenv("HEDGE_ALTERNATE_PROVIDER", "true").lower() == "true"
+    
+    # 流式响应配置
+    STREAM_DISCONNECT_POLL_SECONDS: float = float(os.getenv("STREAM_DISCONNECT_POLL_SECONDS", "0.5"))  # 客户端断开检测间隔
+    SSE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("SSE_FLUSH_INTERVAL_SECONDS", "0.05"))  # 片段合并窗口
+    SSE_FLUSH_BYTES: int = int(os.getenv("SSE_FLUSH_BYTES", "256"))  # 合并的片段达到该长度时立即发送
+    SSE_HEARTBEAT_SECONDS: float = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))  # 空闲心跳间隔
+    
+    # 可续传流配置（流式翻译的事件缓冲，客户端断线后用 Last-Event-ID 续传）
+    STREAM_RESUME_GRACE_SECONDS: float = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "30"))  # 无客户端时继续生成的时间
+    STREAM_RESUME_TTL_SECONDS: int = int(os.getenv("STREAM_RESUME_TTL_SECONDS", "600"))  # 生成期间缓冲的过期时间
+    STREAM_RESUME_COMPLETED_TTL_SECONDS: int = int(os.getenv("STREAM_RESUME_COMPLETED_TTL_SECONDS", "60"))  # 生成结束后缓冲的保留时间
+    STREAM_RESUME_POLL_SECONDS: float = float(os.getenv("STREAM_RESUME_POLL_SECONDS", "0.2"))  # 读取其他进程生成的流的轮询间隔
+    
+    # WebSocket多路复用配置（/ws）
+    WS_MAX_CONCURRENT_JOBS: int = int(os.getenv("WS_MAX_CONCURRENT_JOBS", "8"))  # 每个连接的并发任务数上限
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))  # 发送队列长度，满时暂停读取上游
+
+    # 请求耗时分解配置（Server-Timing 响应头与慢请求日志）
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    SLOW_REQUEST_THRESHOLD_SECONDS: float = float(os.getenv("SLOW_REQUEST_THRESHOLD_SECONDS", "5"))  # 0表示不记录
+
+    # 日志配置（后台线程写入，热路径按比例采样DEBUG日志）
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text 或 json（带trace ID和客户端标识）
+    LOG_QUEUE_ENABLED: bool = os.getenv("LOG_QUEUE_ENABLED", "true").lower() == "true"  # 由后台线程写入stdout
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 日志队列长度，满时丢弃
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))  # 每个流式片段一条的高频DEBUG日志的采样比例
+    LOG_MAX_BODY_CHARS: int = int(os.getenv("LOG_MAX_BODY_CHARS", "2000"))  # 请求体等长文本写入日志的最大字符数
+
+    # 事件循环延迟监控配置（调度延迟直方图，阻塞时记录调用栈）
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_LAG_INTERVAL_SECONDS: float = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.1"))  # 探测间隔
+    LOOP_LAG_THRESHOLD_SECONDS: float = float(os.getenv("LOOP_LAG_THRESHOLD_SECONDS", "0.2"))  # 超过该延迟时记录阻塞和调用栈
+
+    # 按需性能分析配置（/api/admin/profile/*）
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))  # 单次CPU分析的最长采样时间
+    TRACEMALLOC_FRAMES: int = int(os.getenv("TRACEMALLOC_FRAMES", "10"))  # tracemalloc 默认记录的调用栈层数
+
+    # 使用量统计配置（进程内累加，定期批量写入Redis，/api/stats 查询）
+    STATS_ENABLED: bool = os.getenv("STATS_ENABLED", "true").lower() == "true"
+    STATS_FLUSH_SECONDS: float = float(os.getenv("STATS_FLUSH_SECONDS", "5"))  # 批量写入间隔
+    STATS_RETENTION_DAYS: int = int(os.getenv("STATS_RETENTION_DAYS", "90"))  # 按天统计的保留天数
+    STATS_MAX_RANGE_DAYS: int = int(os.getenv("STATS_MAX_RANGE_DAYS", "90"))  # 单次查询的最大日期范围
+
+    # 流量采集配置（采样、脱敏后写入轮转的JSONL文件，benchmarks/replay_traffic.py 回放）
+    CAPTURE_ENABLED: bool = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+    CAPTURE_SAMPLE_RATE: float = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.1"))
+    CAPTURE_SAMPLE_BY: str = os.getenv("CAPTURE_SAMPLE_BY", "client")  # client（按客户端采样，保留请求序列）或 request
+    CAPTURE_DIR: str = os.getenv("CAPTURE_DIR", "captures")
+    CAPTURE_HASH_KEY: Optional[str] = os.getenv("CAPTURE_HASH_KEY") or None  # 客户端标识哈希的密钥，为空时每个进程随机生成
+    CAPTURE_MAX_FILE_MB: float = float(os.getenv("CAPTURE_MAX_FILE_MB", "50"))  # 单个文件超过该大小时新建文件
+    CAPTURE_MAX_FILES: int = int(os.getenv("CAPTURE_MAX_FILES", "20"))  # 保留的文件数
+    CAPTURE_MAX_BODY_BYTES: int = int(os.getenv("CAPTURE_MAX_BODY_BYTES", "65536"))  # 每个请求保存的请求体上限
+    CAPTURE_QUEUE_SIZE: int = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))  # 等待写入的记录上限，满时丢弃
+    CAPTURE_KEEP_FIELDS: frozenset = frozenset(
+        name.strip() for name in os.getenv("CAPTURE_KEEP_FIELDS", "source_lang,target_lang").split(",") if name.strip()
+    )  # 不脱敏、原样保存的请求字段和查询参数
+
+    # 链路追踪配置（OTLP/JSON格式，保存在进程内缓冲，/debug/traces 查看）
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_SAMPLE_RATIO: float = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))  # 新链路的采样比例，带traceparent的请求沿用调用方的决定
+    TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))  # 环形缓冲保存的span数
+    TRACE_FILE_PATH: Optional[str] = os.getenv("TRACE_FILE_PATH") or None  # 同时追加写入的JSONL文件，为空时不写文件
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "ai-backend")
+
+    # 实时翻译配置（流式输入，逐句翻译）
+    LIVE_CONTEXT_SENTENCES: int = int(os.getenv("LIVE_CONTEXT_SENTENCES", "3"))  # 作为前文传给模型的最近句子数
+    LIVE_MAX_PARALLEL: int = int(os.getenv("LIVE_MAX_PARALLEL", "3"))  # 每个会话同时翻译的句子数
+    LIVE_MAX_SENTENCE_CHARS: int = int(os.getenv("LIVE_MAX_SENTENCE_CHARS", "200"))  # 没有句末标点时强制断句的长度
+    LIVE_MAX_PENDING_SENTENCES: int = int(os.getenv("LIVE_MAX_PENDING_SENTENCES", "50"))  # 等待翻译的句子上限，超出时暂停读取输入
     
+    # 抽取式预压缩配置（总结前按token预算挑选重要句子）
+    EXTRACTIVE_TOKEN_BUDGET: int = int(os.getenv("EXTRACTIVE_TOKEN_BUDGET", "1500"))
+    EXTRACTIVE_TOP_K: int = int(os.getenv("EXTRACTIVE_TOP_K", "10"))
+    EXTRACTIVE_MAX_INPUT_CHARS: int = int(os.getenv("EXTRACTIVE_MAX_INPUT_CHARS", "200000"))  # 开启预压缩时输入文本的字符数上限
     
     # API配置
     API_TITLE: str = "AI应用后端接口"
@@ -7,6 +7,9 @@ class RedisKeys:
     TASK_PREFIX = "ai_task:"
     TASK_COUNTER = "ai_task_counter"
     
+    # 可续传流相关键
+    STREAM_PREFIX = "ai_stream:"
+    
     # 统计相关键
     STATS_PREFIX = "ai_stats:"
     DAILY_REQUESTS = "daily_requests"
@@ -17,7 +20,27 @@ class RedisKeys:
         """生成任务键名"""
         return f"{cls.TASK_PREFIX}{task_id}"
     
+    @classmethod
+    def stream_key(cls, stream_id: str) -> str:
+        """生成可续传流的事件缓冲键名"""
+        return f"{cls.STREAM_PREFIX}{stream_id}"
+    
     @classmethod
     def stats_key(cls, date: str) -> str:
-        """生成统计键名"""
+        """生成统计键名（某天的计数哈希）"""
         return f"{cls.STATS_PREFIX}{date}"
+    
+    @classmethod
+    def stats_clients_key(cls, date: str) -> str:
+        """生成某天独立客户端数的HyperLogLog键名"""
+        return f"{cls.STATS_PREFIX}{date}:clients"
+    
+    @classmethod
+    def daily_requests_key(cls) -> str:
+        """生成每日请求数哈希的键名（字段为日期）"""
+        return f"{cls.STATS_PREFIX}{cls.DAILY_REQUESTS}"
+    
+    @classmethod
+    def total_requests_key(cls) -> str:
+        """生成累计请求数的键名"""
+        return f"{cls.STATS_PREFIX}{cls.TOTAL_REQUESTS}"
@@ -1,18 +1,36 @@
 """AI应用后端接口主入口"""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from routers import functions, translation, summary, tasks
+from routers import functions, translation, summary, tasks, health, admin, websocket, metrics, debug, stats
+from config.settings import config
 from utils.logger import logger
+from utils.loop_monitor import loop_monitor
+from utils.usage_stats import usage_stats
 import traceback
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动时开启事件循环延迟监控和使用量统计的定期写入，关闭时停止并写入剩余的统计"""
+    if config.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if config.STATS_ENABLED:
+        usage_stats.start()
+    yield
+    await usage_stats.stop()
+    await loop_monitor.stop()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="AI应用后端接口",
     description="提供中译英、英译中、总结等AI功能",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 添加自定义JSON解析中间件
@@ -20,6 +38,26 @@ from utils.json_middleware import JSONCleanupMiddleware
 
 app.add_middleware(JSONCleanupMiddleware)
 
+# 添加使用量统计中间件（在请求上下文中间件内层，读取客户端标识）
+from utils.usage_stats import UsageStatsMiddleware
+
+app.add_middleware(UsageStatsMiddleware)
+
+# 添加请求上下文中间件（客户端标识等）
+from utils.request_context import RequestContextMiddleware
+
+app.add_middleware(RequestContextMiddleware)
+
+# 添加准入控制中间件（负载过高时返回503 + Retry-After）
+from utils.admission import AdmissionControlMiddleware
+
+app.add_middleware(AdmissionControlMiddleware)
+
+# 添加流量采集中间件（在准入控制外层，负载卸载的响应也会被采集）
+from utils.traffic_capture import TrafficCaptureMiddleware
+
+app.add_middleware(TrafficCaptureMiddleware)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +67,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 添加指标中间件（最外层，统计包括负载卸载在内的所有响应）
+from utils.metrics import MetricsMiddleware
+
+app.add_middleware(MetricsMiddleware)
+
+# 添加请求耗时分解中间件（Server-Timing 响应头与慢请求日志）
+from utils.timing import ServerTimingMiddleware
+
+app.add_middleware(ServerTimingMiddleware)
+
+# 添加链路追踪中间件（最外层，请求根span覆盖所有中间件）
+from utils.tracing import TracingMiddleware
+
+app.add_middleware(TracingMiddleware)
+
 # 添加错误处理器
 from utils.error_handlers import register_error_handlers
 
@@ -39,6 +92,12 @@ app.include_router(functions.router)
 app.include_router(translation.router)
 app.include_router(summary.router)
 app.include_router(tasks.router)
+app.include_router(health.router)
+app.include_router(admin.router)
+app.include_router(websocket.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+app.include_router(stats.router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,130 @@
+"""管理相关路由"""
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from config.settings import config
+from schemas.requests import SchedulerConfigRequest
+from services.cassette import cassette_status
+from services.scheduler import scheduler
+from utils.auth import require_admin_token
+from utils.profiler import cpu_profiler, memory_profiler
+from utils.traffic_capture import capture_writer
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/scheduler", summary="查看调度器配置与状态")
+async def get_scheduler():
+    """调度器当前配置、在途调用数和各通道排队时间"""
+    return {
+        "success": True,
+        "data": scheduler.status(),
+        "message": "获取调度器状态成功"
+    }
+
+
+@router.put("/scheduler", summary="运行时调整调度器配置")
+async def update_scheduler(request: SchedulerConfigRequest):
+    """调整上游总并发容量、饥饿保护时间和租户权重，未提供的字段保持不变"""
+    scheduler.configure(
+        max_concurrency=request.max_concurrency,
+        starvation_seconds=request.starvation_seconds,
+        tenant_weights=request.tenant_weights
+    )
+    return {
+        "success": True,
+        "data": scheduler.status(),
+        "message": "调度器配置已更新"
+    }
+
+
+@router.get("/profile/cpu", summary="CPU采样分析")
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=config.PROFILE_MAX_SECONDS),
+    interval: float = Query(0.01, ge=0.001, le=1),
+    include_idle: bool = False,
+    format: str = Query("json", pattern="^(json|collapsed)$")
+):
+    """
+    在独立线程中按间隔采样所有线程的调用栈，采样期间服务正常处理请求
+
+    format=collapsed 直接返回折叠栈文本（可交给 flamegraph.pl 或 speedscope 生成火焰图），
+    format=json 同时返回按函数汇总的热点
+    """
+    try:
+        result = await asyncio.to_thread(cpu_profiler.profile, seconds, interval, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"] + "\n")
+    return {
+        "success": True,
+        "data": result,
+        "message": "CPU分析完成"
+    }
+
+
+@router.post("/profile/memory/start", summary="开始内存分配追踪")
+async def start_memory_profile(frames: int = Query(config.TRACEMALLOC_FRAMES, ge=1, le=100)):
+    """开始 tracemalloc 追踪并保存基线快照；已在追踪时重新保存基线"""
+    data = await asyncio.to_thread(memory_profiler.start, frames)
+    return {
+        "success": True,
+        "data": data,
+        "message": "内存分配追踪已开始"
+    }
+
+
+@router.get("/profile/memory/diff", summary="内存分配增长")
+async def memory_profile_diff(
+    top: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    rebase: bool = False
+):
+    """与基线快照比较，返回内存增长最多的分配位置；rebase=true 时把当前快照作为新的基线"""
+    try:
+        data = await asyncio.to_thread(memory_profiler.diff, top, group_by, rebase)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "success": True,
+        "data": data,
+        "message": "获取内存分配增长成功"
+    }
+
+
+@router.post("/profile/memory/stop", summary="停止内存分配追踪")
+async def stop_memory_profile():
+    """停止 tracemalloc 追踪并释放快照"""
+    return {
+        "success": True,
+        "data": memory_profiler.stop(),
+        "message": "内存分配追踪已停止"
+    }
+
+
+@router.get("/capture", summary="查看流量采集状态")
+async def get_capture():
+    """流量采集的开关、采样比例和写入状态（已写入、排队、丢弃的记录数和当前文件）"""
+    return {
+        "success": True,
+        "data": {
+            "enabled": config.CAPTURE_ENABLED,
+            "sample_rate": config.CAPTURE_SAMPLE_RATE,
+            "sample_by": config.CAPTURE_SAMPLE_BY,
+            **capture_writer.status(),
+        },
+        "message": "获取流量采集状态成功"
+    }
+
+
+@router.get("/cassette", summary="查看上游录制与回放状态")
+async def get_cassette():
+    """录制与回放模式、时间缩放比例和各服务商录制文件的录制、回放、未匹配次数"""
+    return {
+        "success": True,
+        "data": cassette_status(),
+        "message": "获取录制与回放状态成功"
+    }
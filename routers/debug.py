@@ -0,0 +1,76 @@
+"""调试相关路由"""
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from utils.auth import require_admin_token
+from utils.tracing import STATUS_ERROR, Span, otlp_request, span_exporter
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/traces", summary="最近的链路")
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0, ge=0),
+    errors_only: bool = False
+):
+    """环形缓冲中最近的链路汇总（根span、总时长、span数、失败span数）"""
+    return {
+        "success": True,
+        "data": {
+            "exporter": span_exporter.status(),
+            "traces": span_exporter.traces(limit, min_duration_ms, errors_only),
+        },
+        "message": "获取链路列表成功"
+    }
+
+
+@router.get("/traces/{trace_id}", summary="查看一条链路")
+async def get_trace(trace_id: str, format: str = Query("tree", pattern="^(tree|otlp)$")):
+    """
+    一条链路的所有span
+
+    format=tree 按父子关系排列，给出相对链路开始的偏移和层级；format=otlp 返回OTLP/JSON导出请求，
+    可直接导入支持OTLP的工具
+    """
+    spans = span_exporter.trace(trace_id.lower())
+    if not spans:
+        raise HTTPException(status_code=404, detail="链路不存在或已移出缓冲")
+    data = otlp_request(spans) if format == "otlp" else _span_tree(spans)
+    return {
+        "success": True,
+        "data": data,
+        "message": "获取链路成功"
+    }
+
+
+def _span_tree(spans: List[Span]) -> List[Dict[str, Any]]:
+    """按父子关系深度优先排列span，父span不在缓冲中的span作为根"""
+    start = spans[0].start_ns
+    ids = {span.span_id for span in spans}
+    children: Dict[str, List[Span]] = {}
+    roots = []
+    for span in spans:
+        if span.parent_id in ids:
+            children.setdefault(span.parent_id, []).append(span)
+        else:
+            roots.append(span)
+
+    rows = []
+    stack = [(span, 0) for span in reversed(roots)]
+    while stack:
+        span, depth = stack.pop()
+        rows.append({
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_id,
+            "name": span.name,
+            "depth": depth,
+            "offset_ms": round((span.start_ns - start) / 1e6, 1),
+            "duration_ms": round(span.duration_ms, 1),
+            "error": span.status_code == STATUS_ERROR,
+            "status_message": span.status_message or None,
+            "attributes": span.attributes,
+        })
+        stack.extend((child, depth + 1) for child in reversed(children.get(span.span_id, [])))
+    return rows
@@ -0,0 +1,130 @@
+"""健康检查相关路由"""
+from fastapi import APIRouter
+
+from schemas.responses import HealthResponse
+from services.ai_providers import retry_policy
+from services.ai_service import ai_service
+from services.scheduler import scheduler
+from services.live_translation import live_stats
+from services.stream_buffer import stream_buffer
+from services.ws_multiplexer import ws_stats
+from utils.admission import admission_controller
+from utils.loop_monitor import loop_monitor
+from utils.redis_client import redis_client
+from utils.streaming import stream_stats
+
+router = APIRouter(prefix="/api", tags=["health"])
+
+
+@router.get("/health", summary="健康检查", response_model=HealthResponse)
+async def health_check():
+    """服务健康状态，包括Redis连接和AI服务提供商熔断状态"""
+    redis_status = "connected" if redis_client.is_connected() else "memory"
+
+    if not ai_service.pool:
+        ai_status = "mock"
+    else:
+        states = [item["state"] for item in ai_service.pool.status()]
+        if all(state == "open" for state in states):
+            ai_status = "unavailable"
+        elif any(state != "closed" for state in states):
+            ai_status = "degraded"
+        else:
+            ai_status = "healthy"
+
+    return HealthResponse(
+        status="ok" if ai_status != "unavailable" else "degraded",
+        message="服务运行中",
+        redis_status=redis_status,
+        ai_status=ai_status
+    )
+
+
+@router.get("/health/providers", summary="AI服务提供商状态")
+async def providers_status():
+    """各AI服务提供商的熔断器状态，按故障转移顺序排列"""
+    return {
+        "success": True,
+        "data": ai_service.pool.status(),
+        "message": "获取服务提供商状态成功"
+    }
+
+
+@router.get("/health/routing", summary="路由统计")
+async def routing_status():
+    """路由策略、各路由目标的成本权重、EWMA延迟和错误率以及被选中的次数"""
+    return {
+        "success": True,
+        "data": ai_service.router.status(),
+        "message": "获取路由统计成功"
+    }
+
+
+@router.get("/health/hedging", summary="对冲请求统计")
+async def hedging_status():
+    """对冲请求的发起、胜出和被预算抑制的次数"""
+    return {
+        "success": True,
+        "data": ai_service.hedging.status(),
+        "message": "获取对冲统计成功"
+    }
+
+
+@router.get("/health/retries", summary="重试统计")
+async def retries_status():
+    """上游调用的重试次数，以及因不可重试、本地拒绝、次数用尽、预算不足、截止时间或 Retry-After 过长放弃的重试次数"""
+    return {
+        "success": True,
+        "data": retry_policy.status(),
+        "message": "获取重试统计成功"
+    }
+
+
+@router.get("/health/scheduler", summary="调度器排队统计")
+async def scheduler_status():
+    """各优先级通道的排队深度和排队等待时间"""
+    return {
+        "success": True,
+        "data": scheduler.status(),
+        "message": "获取调度器状态成功"
+    }
+
+
+@router.get("/health/admission", summary="准入控制统计")
+async def admission_status():
+    """各接口在途请求数、处理速率、排队时延以及异步任务积压"""
+    return {
+        "success": True,
+        "data": admission_controller.status(),
+        "message": "获取准入控制状态成功"
+    }
+
+
+@router.get("/health/streams", summary="流式请求统计")
+async def streams_status():
+    """流式请求的完成、失败和客户端断开取消次数，取消后预计节省的输出token数，可续传流的缓冲统计以及实时翻译统计"""
+    return {
+        "success": True,
+        "data": {**stream_stats.status(), "resumable": stream_buffer.status(), "live": live_stats.status()},
+        "message": "获取流式请求统计成功"
+    }
+
+
+@router.get("/health/websocket", summary="WebSocket多路复用统计")
+async def websocket_status():
+    """WebSocket连接数、各状态的任务数以及发送队列背压次数"""
+    return {
+        "success": True,
+        "data": ws_stats.status(),
+        "message": "获取WebSocket统计成功"
+    }
+
+
+@router.get("/health/loop", summary="事件循环延迟统计")
+async def loop_status():
+    """事件循环阻塞次数、最大调度延迟以及最近几次阻塞时事件循环线程的调用栈"""
+    return {
+        "success": True,
+        "data": loop_monitor.status(),
+        "message": "获取事件循环延迟统计成功"
+    }
@@ -0,0 +1,16 @@
+"""指标导出路由"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import metrics_registry
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus文本格式的Content-Type
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", summary="Prometheus指标", response_class=PlainTextResponse)
+async def metrics():
+    """接口请求数与耗时、上游调用耗时与首个片段时间、流式片段数、任务积压、Redis命令耗时等指标"""
+    return PlainTextResponse(metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,40 @@
+"""使用量统计路由"""
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from config.settings import config
+from utils.auth import require_admin_token
+from utils.usage_stats import usage_stats
+
+router = APIRouter(prefix="/api", tags=["stats"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/stats", summary="使用量统计")
+async def get_stats(
+    start: Optional[date] = Query(None, description="开始日期（YYYY-MM-DD），默认结束日期前6天"),
+    end: Optional[date] = Query(None, description="结束日期（YYYY-MM-DD），默认今天"),
+    top_clients: int = Query(20, ge=1, le=500)
+):
+    """
+    日期范围内（含首尾）按天、接口、服务商、调用类型和客户端汇总的请求数、输入输出字符数、估算token数和缓存命中数
+
+    unique_clients 为HyperLogLog估算的独立客户端数（约0.81%标准误差）；
+    包含客户端标识，需要管理令牌
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    if (end - start).days + 1 > config.STATS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"日期范围不能超过 {config.STATS_MAX_RANGE_DAYS} 天")
+
+    return {
+        "success": True,
+        "data": {
+            **await usage_stats.query(start, end, top_clients),
+            "recorder": usage_stats.status(),
+        },
+        "message": "获取使用量统计成功"
+    }
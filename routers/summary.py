@@ -1,17 +1,26 @@
 """总结相关路由"""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
-import json
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 import uuid
 from datetime import datetime
+from typing import Optional
 import logging
+import math
 
 from schemas.requests import SummaryRequest
 from schemas.responses import TaskResponse, TaskResult
 from services.ai_service import ai_service
+from services.provider_pool import ProviderUnavailableError
+from services.routing import capture_routes
+from services.task_service import PartialResultWriter
 from utils.logger import logger
 from data.redis_keys import RedisKeys
 from utils.redis_client import redis_client
+from utils.request_context import LANE_ASYNC, DeadlineExceededError, check_deadline, format_deadline, get_deadline, set_deadline, set_lane
+from utils.admission import admission_controller
+from utils.sse import SSEEncoder, SSEResponse
+from utils.streaming import cancel_on_disconnect, expected_output_tokens
+from utils.timing import timing_breakdown
+from utils.tracing import KIND_CONSUMER, current_traceparent, reset_current_span, set_current_span, start_span
 
 router = APIRouter(prefix="/api", tags=["summary"])
 
@@ -20,17 +29,21 @@ router = APIRouter(prefix="/api", tags=["summary"])
 async def summarize_sync(request: SummaryRequest):
     """同步总结接口"""
     try:
-        result = await ai_service.summarize_text(request.text)
+        routes = capture_routes()
+        result = await ai_service.summarize_text(request.text, request.compress, request.token_budget)
         
         return {
             "success": True,
             "data": {
                 "original_text": request.text,
                 "summary": result,
-                "max_length": request.max_length
+                "max_length": request.max_length,
+                "routing": routes.metadata()
             },
             "message": "总结成功"
         }
+    except (ProviderUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         logger.error(f"总结失败: {e}")
         raise HTTPException(status_code=500, detail=f"总结失败: {str(e)}")
@@ -39,13 +52,19 @@ async def summarize_sync(request: SummaryRequest):
 @router.post("/summarize/async", summary="异步总结任务提交")
 async def summarize_async(request: SummaryRequest, background_tasks: BackgroundTasks):
     """提交异步总结任务"""
+    admission_controller.check_task_backlog()
     task_id = str(uuid.uuid4())
+    deadline = get_deadline()
+    # 提交请求的链路，后台处理任务在同一条链路中继续
+    traceparent = current_traceparent()
     
     # 创建任务记录
     task_result = TaskResult(
         task_id=task_id,
         status="pending",
-        created_at=datetime.now().isoformat()
+        created_at=datetime.now().isoformat(),
+        deadline_at=format_deadline(deadline),
+        traceparent=traceparent
     )
     # 将任务存储到Redis
     await redis_client.set(
@@ -55,10 +74,15 @@ async def summarize_async(request: SummaryRequest, background_tasks: BackgroundT
     )
     
     # 添加后台任务
+    admission_controller.task_submitted()
     background_tasks.add_task(
         _process_summary_task,
         task_id,
-        request.text
+        request.text,
+        request.compress,
+        request.token_budget,
+        deadline,
+        traceparent
     )
     
     return TaskResponse(
@@ -69,44 +93,69 @@ async def summarize_async(request: SummaryRequest, background_tasks: BackgroundT
 
 
 @router.post("/summarize/stream", summary="流式总结接口")
-async def summarize_stream(request: SummaryRequest):
-    """流式总结接口"""
+async def summarize_stream(request: SummaryRequest, http_request: Request):
+    """流式总结接口，客户端断开后立即取消上游调用"""
     try:
         async def generate():
-            yield "data: " + json.dumps({"status": "started", "message": "开始总结"}, ensure_ascii=False) + "\n\n"
+            encoder = SSEEncoder(lambda text: {"chunk": text})
+            yield encoder.event({"status": "started", "message": "开始总结"})
             
-            async for chunk in ai_service.summarize_stream(request.text):
-                if chunk.strip():  # 只输出非空内容
-                    clean_chunk = chunk.strip().replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                    yield "data: " + json.dumps({"chunk": clean_chunk}, ensure_ascii=False) + "\n\n"
-            
-            yield "data: " + json.dumps({"status": "completed", "message": "总结完成"}, ensure_ascii=False) + "\n\n"
+            try:
+                routes = capture_routes()
+                chunks = cancel_on_disconnect(
+                    http_request,
+                    ai_service.summarize_stream(request.text, request.compress, request.token_budget),
+                    expected_output_tokens("summarize", request.text)
+                )
+                async for frame in encoder.stream(chunks):
+                    yield frame
+                
+                if await http_request.is_disconnected():
+                    return
+                
+                yield encoder.event({"status": "completed", "message": "总结完成", "routing": routes.metadata(),
+                                     "timing": timing_breakdown()})
+                logger.info("流式总结完成，共处理 %d 个片段，发送 %d 个事件", encoder.chunks, encoder.frames)
+            except ProviderUnavailableError as e:
+                # 响应头已发送，熔断/无可用服务商只能通过事件告知客户端，retry_after 对应503的Retry-After
+                logger.error(f"流式总结过程中AI服务提供商不可用: {e}")
+                yield encoder.event({"status": "error", "message": "AI服务暂时不可用，请稍后重试", "error": str(e),
+                                     "retry_after": max(1, math.ceil(e.retry_after or 0))})
+            except DeadlineExceededError as e:
+                logger.warning(f"流式总结超过截止时间: {e}")
+                yield encoder.event({"status": "error", "message": "请求处理超时", "error": str(e)})
+            except Exception as e:
+                logger.error(f"流式总结过程中出错: {e}")
+                yield encoder.event({"status": "error", "message": "总结失败", "error": str(e)})
             yield "data: [DONE]\n\n"
         
-        return StreamingResponse(
-            generate(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Methods": "*",
-            }
-        )
+        return SSEResponse(generate())
     except Exception as e:
         logger.error(f"流式总结失败: {e}")
         raise HTTPException(status_code=500, detail=f"流式总结失败: {str(e)}")
 
 
-async def _process_summary_task(task_id: str, text: str):
-    """处理总结任务的后台函数"""
+async def _process_summary_task(task_id: str, text: str, compress: bool = False, token_budget: Optional[int] = None,
+                                deadline: Optional[float] = None, traceparent: Optional[str] = None):
+    """处理总结任务的后台函数，超过截止时间仍未开始的任务直接放弃，处理中写入部分结果"""
+    set_lane(LANE_ASYNC)
+    set_deadline(deadline)
+    deadline_at = format_deadline(deadline)
+    # 以任务记录中的 traceparent 为父span，上游调用和Redis命令记录在任务span下
+    task_span = start_span("task.summarize", KIND_CONSUMER, parent=traceparent, attributes={"task.id": task_id})
+    span_token = set_current_span(task_span)
+    writer = None
     try:
+        check_deadline()
+        
         # 更新任务状态为处理中
         task_result = TaskResult(
             task_id=task_id,
             status="processing",
-            created_at=datetime.now().isoformat()
+            progress=0.0,
+            created_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
@@ -114,16 +163,23 @@ async def _process_summary_task(task_id: str, text: str):
             ex=3600
         )
         
-        # 执行总结
-        result = await ai_service.summarize_text(text)
+        # 流式执行总结，处理中按节流间隔写入部分结果和进度
+        writer = PartialResultWriter(task_result, expected_output_tokens("summarize", text))
+        result = await writer.consume(
+            ai_service.summarize_stream(text, compress, token_budget),
+            restart=lambda: ai_service.summarize_text(text, compress, token_budget)
+        )
         
         # 更新任务状态为完成
         task_result = TaskResult(
             task_id=task_id,
             status="completed",
             result=result,
+            progress=100.0,
             created_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat()
+            completed_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
@@ -132,17 +188,25 @@ async def _process_summary_task(task_id: str, text: str):
         )
         
     except Exception as e:
+        task_span.record_error(e)
         logger.error(f"处理总结任务失败: {e}")
         # 更新任务状态为失败
         task_result = TaskResult(
             task_id=task_id,
             status="failed",
             error=str(e),
+            partial_result=writer.text if writer else None,
             created_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat()
+            completed_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
             task_result.model_dump_json(),
             ex=3600
         )
+    finally:
+        admission_controller.task_finished()
+        task_span.end()
+        reset_current_span(span_token)
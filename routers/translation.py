@@ -1,16 +1,31 @@
 """翻译相关路由"""
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
+import codecs
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from starlette.requests import ClientDisconnect
 from pydantic import ValidationError
 from schemas.requests import TranslationRequest
 from schemas.responses import TranslationResponse, AsyncTaskResponse, TaskResponse, TaskResult
 from services.ai_service import ai_service
+from services.live_translation import LiveTranslationSession
+from services.provider_pool import ProviderUnavailableError
+from services.routing import capture_routes
+from services.task_service import PartialResultWriter
+from services.stream_buffer import stream_buffer
+from config.settings import config
 from utils.logger import logger
 from data.redis_keys import RedisKeys
 from utils.redis_client import redis_client
-import json
+from utils.request_context import LANE_ASYNC, DeadlineExceededError, check_deadline, format_deadline, get_deadline, set_deadline, set_lane
+from utils.admission import admission_controller
+from utils.sse import SSEEncoder, SSEResponse, parse_last_event_id
+from utils.streaming import cancel_on_disconnect, expected_output_tokens
+from utils.timing import timing_breakdown
+from utils.tracing import KIND_CONSUMER, current_traceparent, reset_current_span, set_current_span, start_span
+from utils.usage_stats import usage_stats
 import uuid
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter(prefix="/api", tags=["translation"])
 
@@ -21,6 +36,7 @@ router = APIRouter(prefix="/api", tags=["translation"])
 async def translate_sync(request: TranslationRequest):
     """同步翻译接口"""
     try:
+        routes = capture_routes()
         result = await ai_service.translate_text(request.text, request.source_lang, request.target_lang)
         
         return {
@@ -29,10 +45,13 @@ async def translate_sync(request: TranslationRequest):
                 "original_text": request.text,
                 "translated_text": result,
                 "source_lang": request.source_lang,
-                "target_lang": request.target_lang
+                "target_lang": request.target_lang,
+                "routing": routes.metadata()
             },
             "message": "翻译成功"
         }
+    except (ProviderUnavailableError, DeadlineExceededError):
+        raise
     except Exception as e:
         logger.error(f"翻译失败: {e}")
         raise HTTPException(status_code=500, detail=f"翻译失败: {str(e)}")
@@ -41,13 +60,19 @@ async def translate_sync(request: TranslationRequest):
 @router.post("/translate/async", summary="异步翻译任务提交")
 async def translate_async(request: TranslationRequest, background_tasks: BackgroundTasks):
     """提交异步翻译任务"""
+    admission_controller.check_task_backlog()
     task_id = str(uuid.uuid4())
+    deadline = get_deadline()
+    # 提交请求的链路，后台处理任务在同一条链路中继续
+    traceparent = current_traceparent()
     
     # 创建任务记录
     task_result = TaskResult(
         task_id=task_id,
         status="pending",
-        created_at=datetime.now().isoformat()
+        created_at=datetime.now().isoformat(),
+        deadline_at=format_deadline(deadline),
+        traceparent=traceparent
     )
     # 将任务存储到Redis
     await redis_client.set(
@@ -57,12 +82,15 @@ async def translate_async(request: TranslationRequest, background_tasks: Backgro
     )
     
     # 添加后台任务
+    admission_controller.task_submitted()
     background_tasks.add_task(
         _process_translation_task, 
         task_id, 
         request.text, 
         request.source_lang, 
-        request.target_lang
+        request.target_lang,
+        deadline,
+        traceparent
     )
     
     return TaskResponse(
@@ -74,62 +102,141 @@ async def translate_async(request: TranslationRequest, background_tasks: Backgro
 
 @router.post("/translate/stream", summary="流式翻译接口")
 async def translate_stream(request: TranslationRequest):
-    """流式翻译接口 - 使用Server-Sent Events"""
+    """
+    流式翻译接口 - 使用Server-Sent Events
+    
+    开始事件中返回 stream_id，连接中断后可通过 GET /api/translate/stream/{stream_id} 续传；
+    所有客户端断开超过 STREAM_RESUME_GRACE_SECONDS 后取消上游调用
+    """
     try:
-        logger.info(f"收到流式翻译请求: {request.source_lang} -> {request.target_lang}")
+        logger.info("收到流式翻译请求: %s -> %s", request.source_lang, request.target_lang)
+        stream = stream_buffer.create()
+        encoder = SSEEncoder(lambda text: {"type": "chunk", "content": text})
         
         async def event_stream():
             try:
                 # 发送开始事件
-                yield f"data: {json.dumps({'type': 'start', 'message': '开始翻译'}, ensure_ascii=False)}\n\n"
+                yield encoder.event({"type": "start", "message": "开始翻译", "stream_id": stream.stream_id})
                 
-                # 获取流式翻译结果
-                chunk_count = 0
-                full_result = ""
+                # 获取流式翻译结果，片段在合并窗口内合并后发送
+                routes = capture_routes()
+                chunks = cancel_on_disconnect(
+                    stream,
+                    ai_service.translate_stream(request.text, request.source_lang, request.target_lang),
+                    expected_output_tokens("translate", request.text)
+                )
+                async for frame in encoder.stream(chunks):
+                    yield frame
                 
-                async for chunk in ai_service.translate_stream(request.text, request.source_lang, request.target_lang):
-                    if chunk and chunk.strip():
-                        chunk_count += 1
-                        full_result += chunk.strip()
-                        logger.debug(f"流式数据 #{chunk_count}: '{chunk.strip()}'")
-                        
-                        # 发送数据块，清理控制字符
-                        clean_chunk = chunk.strip().replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                        yield f"data: {json.dumps({'type': 'chunk', 'content': clean_chunk}, ensure_ascii=False)}\n\n"
+                if await stream.is_disconnected():
+                    # 客户端断开超过宽限时间，上游已取消；之后续传的客户端会收到该事件
+                    yield encoder.event({"type": "cancelled", "message": "客户端断开，已取消翻译"})
+                    return
                 
                 # 发送完成事件
-                yield f"data: {json.dumps({'type': 'done', 'message': '翻译完成', 'full_result': full_result}, ensure_ascii=False)}\n\n"
-                logger.info(f"流式翻译完成，共处理 {chunk_count} 个片段")
+                yield encoder.event({"type": "done", "message": "翻译完成", "full_result": encoder.full_result,
+                                     "routing": routes.metadata(), "timing": timing_breakdown()})
+                logger.info("流式翻译完成，共处理 %d 个片段，发送 %d 个事件", encoder.chunks, encoder.frames)
                 
             except Exception as e:
                 logger.error(f"流式翻译过程中出错: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+                yield encoder.event({"type": "error", "message": str(e)})
         
-        return StreamingResponse(
-            event_stream(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Methods": "*",
-            }
-        )
+        # 生成在后台进行，响应只读取事件缓冲，客户端断开不会中断生成
+        stream_buffer.start(stream, encoder, event_stream())
+        return SSEResponse(stream_buffer.subscribe(stream.stream_id), headers={"X-Stream-ID": stream.stream_id})
         
     except Exception as e:
         logger.error(f"流式翻译初始化失败: {e}")
         raise HTTPException(status_code=500, detail=f"流式翻译失败: {str(e)}")
 
 
-async def _process_translation_task(task_id: str, text: str, source_lang: str, target_lang: str):
-    """处理翻译任务的后台函数"""
+@router.get("/translate/stream/{stream_id}", summary="续传流式翻译")
+async def resume_translate_stream(stream_id: str, http_request: Request, last_event_id: Optional[int] = None):
+    """
+    续传流式翻译
+    
+    从 Last-Event-ID 请求头（或 last_event_id 查询参数）之后的事件开始继续读取；
+    原始生成仍在进行时会继续推送后续事件，生成结束且缓冲过期后返回404
+    """
+    if not await stream_buffer.exists(stream_id):
+        raise HTTPException(status_code=404, detail="流不存在或已过期")
+    
+    header_id = parse_last_event_id(http_request.headers.get("last-event-id"))
+    start_after = header_id if header_id is not None else max(last_event_id or 0, 0)
+    logger.info("续传流式翻译: %s，从事件 %s 之后开始", stream_id, start_after)
+    if config.STATS_ENABLED:
+        usage_stats.record_cache_hit("/api/translate/stream/{stream_id}")
+    return SSEResponse(stream_buffer.subscribe(stream_id, start_after), headers={"X-Stream-ID": stream_id})
+
+
+@router.post("/translate/live", summary="实时翻译接口（流式输入）")
+async def translate_live(http_request: Request, source_lang: str = "auto", target_lang: str = "英文"):
+    """
+    实时翻译接口 - 请求体为分块上传的UTF-8文本，响应为Server-Sent Events
+    
+    请求体边到达边断句，每个完整的句子立即带上前文翻译，译文按句子顺序推送
+    sentence / chunk / sentence_done / sentence_error 事件；请求体结束且所有句子返回后发送 done 事件，
+    客户端断开时取消所有未完成的句子翻译
+    """
+    logger.info("收到实时翻译请求: %s -> %s", source_lang, target_lang)
+    session = LiveTranslationSession(source_lang, target_lang, http_request.headers.get("x-request-timeout"))
+    encoder = SSEEncoder(lambda text: {"type": "chunk", "content": text})
+    
+    async def read_input():
+        """读取请求体并送入会话，请求体结束后继续等待断开消息"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            async for data in http_request.stream():
+                await session.feed(decoder.decode(data))
+            await session.feed(decoder.decode(b"", final=True))
+            await session.end()
+            while (await http_request.receive())["type"] != "http.disconnect":
+                pass
+        except ClientDisconnect:
+            logger.info("实时翻译客户端断开，取消未完成的句子")
+        finally:
+            await session.close()
+    
+    async def event_stream():
+        reader = asyncio.create_task(read_input())
+        try:
+            yield encoder.event({"type": "start", "message": "开始实时翻译"})
+            async for event in session.events(idle_timeout=encoder.heartbeat_interval):
+                if event is None:
+                    yield encoder.heartbeat()
+                    continue
+                if event["type"] == "done":
+                    event["timing"] = timing_breakdown()
+                yield encoder.event(event)
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+    
+    return SSEResponse(event_stream(), reads_request_body=True)
+
+
+async def _process_translation_task(task_id: str, text: str, source_lang: str, target_lang: str,
+                                    deadline: Optional[float] = None, traceparent: Optional[str] = None):
+    """处理翻译任务的后台函数，超过截止时间仍未开始的任务直接放弃，处理中写入部分结果"""
+    set_lane(LANE_ASYNC)
+    set_deadline(deadline)
+    deadline_at = format_deadline(deadline)
+    # 以任务记录中的 traceparent 为父span，上游调用和Redis命令记录在任务span下
+    task_span = start_span("task.translate", KIND_CONSUMER, parent=traceparent, attributes={"task.id": task_id})
+    span_token = set_current_span(task_span)
+    writer = None
     try:
+        check_deadline()
+        
         # 更新任务状态为处理中
         task_result = TaskResult(
             task_id=task_id,
             status="processing",
-            created_at=datetime.now().isoformat()
+            progress=0.0,
+            created_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
@@ -137,16 +244,23 @@ async def _process_translation_task(task_id: str, text: str, source_lang: str, t
             ex=3600
         )
         
-        # 执行翻译
-        result = await ai_service.translate_text(text, source_lang, target_lang)
+        # 流式执行翻译，处理中按节流间隔写入部分结果和进度
+        writer = PartialResultWriter(task_result, expected_output_tokens("translate", text))
+        result = await writer.consume(
+            ai_service.translate_stream(text, source_lang, target_lang),
+            restart=lambda: ai_service.translate_text(text, source_lang, target_lang)
+        )
         
         # 更新任务状态为完成
         task_result = TaskResult(
             task_id=task_id,
             status="completed",
             result=result,
+            progress=100.0,
             created_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat()
+            completed_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
@@ -155,17 +269,25 @@ async def _process_translation_task(task_id: str, text: str, source_lang: str, t
         )
         
     except Exception as e:
+        task_span.record_error(e)
         logger.error(f"处理翻译任务失败: {e}")
         # 更新任务状态为失败
         task_result = TaskResult(
             task_id=task_id,
             status="failed",
             error=str(e),
+            partial_result=writer.text if writer else None,
             created_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat()
+            completed_at=datetime.now().isoformat(),
+            deadline_at=deadline_at,
+            traceparent=traceparent
         )
         await redis_client.set(
             RedisKeys.task_key(task_id),
             task_result.model_dump_json(),
             ex=3600
         )
+    finally:
+        admission_controller.task_finished()
+        task_span.end()
+        reset_current_span(span_token)
@@ -0,0 +1,13 @@
+"""WebSocket相关路由"""
+from fastapi import APIRouter, WebSocket
+
+from services.ws_multiplexer import MultiplexSession
+
+router = APIRouter(tags=["websocket"])
+
+
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """在一个连接上并发执行多个翻译/总结任务，片段按任务ID交错返回"""
+    await websocket.accept()
+    await MultiplexSession(websocket).run()
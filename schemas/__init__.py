@@ -1,10 +1,11 @@
 """数据模型包"""
-from .requests import TranslationRequest, SummaryRequest
+from .requests import TranslationRequest, SummaryRequest, SchedulerConfigRequest
 from .responses import TaskResponse, TaskResult
 
 __all__ = [
     "TranslationRequest",
     "SummaryRequest", 
+    "SchedulerConfigRequest",
     "TaskResponse",
     "TaskResult"
 ]
@@ -1,6 +1,8 @@
 """请求数据模型"""
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, PositiveFloat, model_validator
+from typing import Dict, Optional
+
+from config.settings import config
 
 
 class TranslationRequest(BaseModel):
@@ -10,7 +12,29 @@ class TranslationRequest(BaseModel):
     target_lang: str = "英文"
 
 
+class LiveTranslationRequest(BaseModel):
+    """实时翻译会话参数（文本随后分段到达）"""
+    source_lang: str = "auto"
+    target_lang: str = "英文"
+
+
 class SummaryRequest(BaseModel):
     """总结请求模型"""
     text: str
     max_length: Optional[int] = 200
+    compress: bool = False  # 是否在总结前进行抽取式预压缩
+    token_budget: Optional[int] = Field(default=None, gt=0)  # 预压缩的token预算，为空时使用配置默认值
+
+    @model_validator(mode="after")
+    def check_compress_input(self):
+        """预压缩在工作线程中同步执行，耗时随文本长度增长，超出上限的文本不做抽取"""
+        if self.compress and len(self.text) > config.EXTRACTIVE_MAX_INPUT_CHARS:
+            raise ValueError(f"开启预压缩时文本长度不能超过 {config.EXTRACTIVE_MAX_INPUT_CHARS} 个字符")
+        return self
+
+
+class SchedulerConfigRequest(BaseModel):
+    """调度器配置更新请求模型"""
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    starvation_seconds: Optional[float] = Field(default=None, gt=0)
+    tenant_weights: Optional[Dict[str, PositiveFloat]] = None  # 权重必须大于0
@@ -15,9 +15,13 @@ class TaskResult(BaseModel):
     task_id: str
     status: str
     result: Optional[str] = None
+    partial_result: Optional[str] = None  # 处理中已生成的部分结果
+    progress: Optional[float] = None  # 进度百分比（按预估输出token数计算）
     error: Optional[str] = None
     created_at: str
     completed_at: Optional[str] = None
+    deadline_at: Optional[str] = None  # 任务截止时间，超过后未开始的任务不再执行
+    traceparent: Optional[str] = None  # 提交请求的链路（W3C traceparent），后台处理在同一条链路中继续
 
 
 class TranslationResponse(BaseModel):
@@ -4,22 +4,550 @@ AI服务提供商适配器
 """
 
 import asyncio
+import email.utils
 import json
+import random
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import aclosing
 from typing import AsyncGenerator, Dict, Any, Optional
+import anthropic
 import httpx
+import openai
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
 
 from config.settings import config
 from utils.logger import logger
+from utils.metrics import CallbackMetric, upstream_metrics
+from utils.request_context import DeadlineExceededError, check_deadline, deadline_scope, remaining_time
+from utils.timing import record_span, span
+from utils.tracing import KIND_CLIENT, Span, start_span
+from utils.usage_stats import usage_stats
+from utils.streaming import close_quietly
+from services.cassette import provider_transport
+from services.routing import configured_targets
+
+
+def is_api_key_configured(api_key: Optional[str]) -> bool:
+    """判断API密钥是否已配置（排除.env示例中的占位符）"""
+    return bool(api_key) and not (api_key.startswith("your_") and api_key.endswith("_here"))
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """判断是否为上游限流错误（429）"""
+    if isinstance(error, (openai.RateLimitError, anthropic.RateLimitError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429
+    return False
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """判断是否为上游超时错误"""
+    return isinstance(error, (
+        openai.APITimeoutError,
+        anthropic.APITimeoutError,
+        httpx.TimeoutException,
+        asyncio.TimeoutError,
+    ))
+
+
+# 可重试的HTTP状态码：请求超时、冲突、限流、服务端错误（529 为Anthropic过载）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def _error_response(error: BaseException) -> Optional[httpx.Response]:
+    """取出上游错误对应的HTTP响应"""
+    if isinstance(error, (openai.APIStatusError, anthropic.APIStatusError, httpx.HTTPStatusError)):
+        return error.response
+    return None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """判断上游错误是否值得重试：连接错误、超时、限流和服务端错误可以重试，其余4xx错误重试也不会成功"""
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError, httpx.TransportError)):
+        return True
+    response = _error_response(error)
+    return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+
+
+def is_client_error(error: BaseException) -> bool:
+    """
+    判断上游错误是否由请求本身引起（如400参数错误、422、内容过滤、超出上下文长度）
+
+    这类错误换一个服务商或重试也不会成功，不代表服务商故障；401/403 取决于各服务商自身的
+    密钥和权限配置，仍按服务商故障处理
+    """
+    response = _error_response(error)
+    if response is None or is_retryable_error(error):
+        return False
+    return 400 <= response.status_code < 500 and response.status_code not in (401, 403)
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """
+    解析上游返回的 Retry-After（秒数或HTTP日期）/ retry-after-ms 响应头
+    
+    Returns:
+        建议等待的秒数，没有该响应头时返回None
+    """
+    response = _error_response(error)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    重试预算（令牌桶）
+    
+    每个基础调用按 ratio 存入令牌，每次重试消耗一个令牌，
+    保证上游故障时重试流量不超过基础流量的 ratio 比例，避免重试放大过载
+    """
+    
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+    
+    def on_request(self):
+        """记录一个基础调用"""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_acquire(self) -> bool:
+        """尝试消耗一个令牌用于重试"""
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RetryPolicy:
+    """
+    上游调用重试策略
+    
+    只重试可重试的错误；退避时间为指数退避加完全抖动，上游返回 Retry-After 时以其为准；
+    重试受全局预算和请求截止时间限制
+    """
+    
+    def __init__(self):
+        self.max_attempts = config.RETRY_MAX_ATTEMPTS
+        self.base_delay = config.RETRY_BASE_DELAY_SECONDS
+        self.max_delay = config.RETRY_MAX_DELAY_SECONDS
+        self.budget = RetryBudget(config.RETRY_BUDGET_RATIO, config.RETRY_BUDGET_MAX_TOKENS)
+        self.requests = 0
+        self.retries = 0
+        self.retries_by_provider: Dict[str, int] = {}
+        self.non_retryable = 0
+        self.local_rejections = 0
+        self.exhausted = 0
+        self.suppressed_budget = 0
+        self.suppressed_deadline = 0
+        self.suppressed_retry_after = 0
+    
+    def on_request(self):
+        """记录一个基础调用（不含重试）"""
+        self.requests += 1
+        self.budget.on_request()
+    
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的退避时间（完全抖动）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+    
+    def next_delay(self, provider: str, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        判断失败的调用是否重试
+        
+        Args:
+            provider: 服务商名称
+            error: 本次调用的异常
+            attempt: 已经尝试的次数（从1开始）
+            
+        Returns:
+            重试前等待的秒数，不重试时返回None
+        """
+        if isinstance(error, (DeadlineExceededError, ConcurrencyLimitExceeded)):
+            # 本地的截止时间和并发排队拒绝，调用没有到达上游
+            self.local_rejections += 1
+            return None
+        if not is_retryable_error(error):
+            self.non_retryable += 1
+            return None
+        if attempt >= self.max_attempts:
+            self.exhausted += 1
+            return None
+        
+        retry_after = get_retry_after(error)
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        if delay > self.max_delay:
+            # 只有上游的 Retry-After 会超过退避上限：要求的等待时间过长
+            self.suppressed_retry_after += 1
+            return None
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            # 等待后已来不及在截止时间前完成
+            self.suppressed_deadline += 1
+            return None
+        if not self.budget.try_acquire():
+            self.suppressed_budget += 1
+            logger.warning(f"{provider} 重试预算不足，放弃重试: {error}")
+            return None
+        
+        self.retries += 1
+        self.retries_by_provider[provider] = self.retries_by_provider.get(provider, 0) + 1
+        logger.info("%s 第 %d 次调用失败，%.2fs 后重试: %s", provider, attempt, delay, error)
+        return delay
+    
+    def status(self) -> Dict[str, Any]:
+        """重试统计"""
+        return {
+            "max_attempts": self.max_attempts,
+            "requests": self.requests,
+            "retries": self.retries,
+            "retry_rate": round(self.retries / self.requests, 4) if self.requests else 0.0,
+            "retries_by_provider": dict(self.retries_by_provider),
+            "non_retryable": self.non_retryable,
+            "local_rejections": self.local_rejections,
+            "exhausted": self.exhausted,
+            "suppressed_budget": self.suppressed_budget,
+            "suppressed_deadline": self.suppressed_deadline,
+            "suppressed_retry_after": self.suppressed_retry_after,
+            "budget_tokens": round(self.budget.tokens, 2),
+        }
+
+
+# 全局重试策略实例，所有服务商共享同一个重试预算
+retry_policy = RetryPolicy()
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """并发限制器排队已满或排队等待超时"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD自适应并发限制器
+    
+    调用延迟正常时按加性方式提高并发上限（每个上限周期+1），
+    遇到限流或超时按乘性方式降低上限；超出上限的调用在有界队列中等待
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.min_limit = config.LIMITER_MIN_CONCURRENCY
+        self.max_limit = config.LIMITER_MAX_CONCURRENCY
+        self.backoff_ratio = config.LIMITER_BACKOFF_RATIO
+        self.latency_threshold = config.LIMITER_LATENCY_THRESHOLD_SECONDS
+        self.backoff_cooldown = config.LIMITER_BACKOFF_COOLDOWN_SECONDS
+        self.max_queue = config.LIMITER_MAX_QUEUE
+        self.queue_timeout = config.LIMITER_QUEUE_TIMEOUT_SECONDS
+        
+        self.limit = float(config.LIMITER_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_backoff = 0.0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.backoffs = 0
+    
+    async def acquire(self):
+        """获取一个并发名额，必要时排队等待"""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded(f"{self.name} 并发排队已满 ({self.max_queue})")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # 超时的同时恰好获得名额，直接使用
+                return
+            waiter.cancel()
+            self.queue_timeouts += 1
+            raise ConcurrencyLimitExceeded(f"{self.name} 并发排队超时 ({self.queue_timeout}s)")
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake_waiters()
+            else:
+                waiter.cancel()
+            raise
+    
+    def release(self, latency: float, error: Optional[BaseException] = None):
+        """
+        释放名额并根据调用结果调整并发上限
+        
+        Args:
+            latency: 调用耗时（流式调用为首个片段耗时）
+            error: 调用异常，为空表示成功
+        """
+        saturated = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        if error is not None and (is_rate_limit_error(error) or is_timeout_error(error)):
+            now = time.monotonic()
+            # 同一波限流只降一次，避免并发中的请求连续触发多次乘性降低
+            if now - self._last_backoff >= self.backoff_cooldown:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                self._last_backoff = now
+                self.backoffs += 1
+                logger.warning(f"{self.name} 触发限流或超时，并发上限降为 {int(self.limit)}")
+        elif error is None and latency <= self.latency_threshold and saturated:
+            # 只有实际用到一半以上名额时才提高上限，避免低负载下上限无限增长
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake_waiters()
+    
+    def _wake_waiters(self):
+        """在名额允许的范围内唤醒排队的调用"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+    
+    @property
+    def queue_depth(self) -> int:
+        """正在排队等待名额的调用数（不含已超时或已取消的）"""
+        return sum(1 for waiter in self._waiters if not waiter.done())
+    
+    def metrics(self) -> Dict[str, Any]:
+        """限制器指标"""
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "limiter_rejected": self.rejected,
+            "limiter_queue_timeouts": self.queue_timeouts,
+            "limiter_backoffs": self.backoffs,
+        }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+CallbackMetric(
+    "ai_upstream_concurrency_limit", "各服务商自适应并发限制器的当前限额", ("provider",),
+    lambda: [((name,), limiter.limit) for name, limiter in _limiters.items()]
+)
+CallbackMetric(
+    "ai_upstream_in_flight", "各服务商正在进行的上游调用数", ("provider",),
+    lambda: [((name,), limiter.in_flight) for name, limiter in _limiters.items()]
+)
+CallbackMetric(
+    "ai_upstream_queue_depth", "各服务商在并发限制器中排队的上游调用数", ("provider",),
+    lambda: [((name,), limiter.queue_depth) for name, limiter in _limiters.items()]
+)
+
+
+def get_concurrency_limiter(name: str) -> AdaptiveConcurrencyLimiter:
+    """获取服务商的并发限制器，同一服务商的所有实例共享同一个上游限额"""
+    if name not in _limiters:
+        _limiters[name] = AdaptiveConcurrencyLimiter(name)
+    return _limiters[name]
 
 
 class AIProviderBase(ABC):
     """AI服务提供商基类"""
     
+    name: str = ""
+    
+    @property
+    def limiter(self) -> AdaptiveConcurrencyLimiter:
+        """该服务商的并发限制器"""
+        return get_concurrency_limiter(self.name)
+    
+    def request_timeout(self) -> float:
+        """本次上游调用的超时时间：请求截止前的剩余时间，没有截止时间时使用 AI_REQUEST_TIMEOUT_SECONDS"""
+        remaining = remaining_time()
+        if remaining is None:
+            return config.AI_REQUEST_TIMEOUT_SECONDS
+        return max(0.1, min(remaining, config.AI_REQUEST_TIMEOUT_SECONDS))
+    
+    async def invoke(self, operation: str, *args) -> Any:
+        """调用非流式方法，可重试的错误按重试策略重试"""
+        retry_policy.on_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._invoke_once(operation, *args)
+            except Exception as e:
+                delay = retry_policy.next_delay(self.name, e, attempt)
+                if delay is None:
+                    raise
+            with span("retry_backoff"):
+                await asyncio.sleep(delay)
+    
+    async def _invoke_once(self, operation: str, *args) -> Any:
+        """在并发限制器内调用一次非流式方法，超过请求截止时间时取消调用"""
+        check_deadline()
+        with span("limiter"):
+            await self.limiter.acquire()
+        metrics = upstream_metrics(self.name, operation)
+        trace = self._start_trace(operation)
+        start = time.monotonic()
+        try:
+            async with deadline_scope():
+                result = await getattr(self, operation)(*args)
+        except BaseException as e:
+            elapsed = time.monotonic() - start
+            self.limiter.release(elapsed, e)
+            (metrics.error if isinstance(e, Exception) else metrics.cancelled).inc()
+            metrics.duration.observe(elapsed)
+            record_span("provider", elapsed)
+            trace.record_error(e)
+            trace.end()
+            self._record_usage(operation, args, "")
+            raise
+        elapsed = time.monotonic() - start
+        self.limiter.release(elapsed)
+        metrics.ok.inc()
+        metrics.duration.observe(elapsed)
+        record_span("provider", elapsed)
+        trace.end()
+        self._record_usage(operation, args, result if isinstance(result, str) else "")
+        return result
+    
+    def _record_usage(self, operation: str, args: tuple, output: str):
+        """记录一次上游调用的输入输出字符数和估算token数（第一个参数为发送的文本）"""
+        if config.STATS_ENABLED:
+            usage_stats.record_upstream(self.name, operation, args[0] if args and isinstance(args[0], str) else "",
+                                        output)
+    
+    def _start_trace(self, operation: str) -> Span:
+        """上游调用的客户端span（当前请求或任务span的子span）"""
+        return start_span(f"{self.name} {operation}", KIND_CLIENT, attributes={
+            "ai.provider": self.name,
+            "ai.operation": operation,
+            "ai.model": getattr(self, "model", None),
+        })
+    
+    async def invoke_stream(self, operation: str, *args) -> AsyncGenerator[str, None]:
+        """
+        调用流式方法，只在输出第一个片段之前按重试策略重试
+        
+        本生成器被关闭（如客户端断开）时同步关闭服务商的流式方法，使其立即关闭上游HTTP流
+        """
+        retry_policy.on_request()
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            try:
+                async with aclosing(self._invoke_stream_once(operation, *args)) as stream:
+                    async for chunk in stream:
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                delay = None if started else retry_policy.next_delay(self.name, e, attempt)
+                if delay is None:
+                    raise
+            with span("retry_backoff"):
+                await asyncio.sleep(delay)
+    
+    async def _invoke_stream_once(self, operation: str, *args) -> AsyncGenerator[str, None]:
+        """
+        在并发限制器内调用一次流式方法，名额在整个流期间保持占用
+        
+        每个片段的等待在 deadline_scope 内进行，超过请求截止时间时取消上游流并抛出
+        DeadlineExceededError（不计为服务商超时）；单个片段的等待时间同时受服务商的请求超时限制
+        """
+        check_deadline()
+        with span("limiter"):
+            await self.limiter.acquire()
+        metrics = upstream_metrics(self.name, operation)
+        trace = self._start_trace(operation)
+        start = time.monotonic()
+        first_chunk_latency = None
+        chunks = 0
+        parts = []
+        try:
+            async with aclosing(getattr(self, operation)(*args)) as stream:
+                while True:
+                    try:
+                        async with deadline_scope():
+                            chunk = await anext(stream)
+                    except StopAsyncIteration:
+                        break
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.monotonic() - start
+                        metrics.ttft.observe(first_chunk_latency)
+                        record_span("ttft", first_chunk_latency)
+                        trace.set_attribute("ai.ttft_ms", round(first_chunk_latency * 1000, 1))
+                    chunks += 1
+                    parts.append(chunk)
+                    yield chunk
+        except BaseException as e:
+            self.limiter.release(time.monotonic() - start, e)
+            # 客户端断开导致的关闭（GeneratorExit/取消）不计为上游错误
+            (metrics.error if isinstance(e, Exception) else metrics.cancelled).inc()
+            elapsed = time.monotonic() - start
+            metrics.duration.observe(elapsed)
+            metrics.chunks.inc(chunks)
+            record_span("provider", elapsed)
+            trace.set_attribute("ai.chunks", chunks)
+            if isinstance(e, Exception):
+                trace.record_error(e)
+            else:
+                trace.set_attribute("ai.cancelled", True)
+            trace.end()
+            self._record_usage(operation, args, "".join(parts))
+            raise
+        elapsed = time.monotonic() - start
+        self.limiter.release(first_chunk_latency if first_chunk_latency is not None else elapsed)
+        metrics.ok.inc()
+        metrics.duration.observe(elapsed)
+        metrics.chunks.inc(chunks)
+        record_span("provider", elapsed)
+        trace.set_attribute("ai.chunks", chunks)
+        trace.end()
+        self._record_usage(operation, args, "".join(parts))
+    
+    @staticmethod
+    def translate_prompt(text: str, source_lang: str, target_lang: str, context: Optional[str] = None) -> str:
+        """
+        翻译提示词
+        
+        Args:
+            text: 要翻译的文本
+            source_lang: 源语言
+            target_lang: 目标语言
+            context: 前文（实时翻译逐句调用时提供），只用于理解指代和术语，不翻译
+        """
+        prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+        if context:
+            prompt = f"以下是前文，仅供理解上下文，不要翻译：\n{context}\n\n{prompt}"
+        return prompt
+    
+    @staticmethod
+    def summarize_prompt(text: str) -> str:
+        """总结提示词"""
+        return f"请对以下文本进行简洁的总结：\n\n{text}"
+    
     @abstractmethod
-    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+    async def translate(self, text: str, source_lang: str, target_lang: str,
+                        context: Optional[str] = None) -> str:
         """翻译文本"""
         pass
     
@@ -29,7 +557,8 @@ class AIProviderBase(ABC):
         pass
     
     @abstractmethod
-    async def translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def translate_stream(self, text: str, source_lang: str, target_lang: str,
+                               context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """流式翻译"""
         pass
     
@@ -42,25 +571,33 @@ class AIProviderBase(ABC):
 class OpenAIProvider(AIProviderBase):
     """OpenAI服务提供商"""
     
+    name = "openai"
+    
     def __init__(self):
-        if not config.OPENAI_API_KEY:
+        if not is_api_key_configured(config.OPENAI_API_KEY):
             raise ValueError("OPENAI_API_KEY环境变量未设置")
         
+        # 重试由 RetryPolicy 统一处理，关闭SDK内置重试以免重试次数相乘
+        transport = provider_transport(self.name, openai.DefaultAsyncHttpxClient)
         self.client = AsyncOpenAI(
             api_key=config.OPENAI_API_KEY,
-            base_url=config.OPENAI_BASE_URL
+            base_url=config.OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(transport=transport) if transport else None
         )
         self.model = config.OPENAI_MODEL
     
-    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+    async def translate(self, text: str, source_lang: str, target_lang: str,
+                        context: Optional[str] = None) -> str:
         """翻译文本"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
+                temperature=0.3,
+                timeout=self.request_timeout()
             )
             
             return response.choices[0].message.content.strip()
@@ -71,12 +608,13 @@ class OpenAIProvider(AIProviderBase):
     async def summarize(self, text: str) -> str:
         """总结文本"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
+                temperature=0.3,
+                timeout=self.request_timeout()
             )
             
             return response.choices[0].message.content.strip()
@@ -84,21 +622,27 @@ class OpenAIProvider(AIProviderBase):
             logger.error(f"OpenAI总结失败: {e}")
             raise
     
-    async def translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def translate_stream(self, text: str, source_lang: str, target_lang: str,
+                               context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """流式翻译"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                stream=True
+                stream=True,
+                timeout=self.request_timeout()
             )
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            try:
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # 正常结束、出错或被取消（客户端断开）时都立即关闭上游HTTP流，释放连接
+                await close_quietly(stream)
         except Exception as e:
             logger.error(f"OpenAI流式翻译失败: {e}")
             raise
@@ -106,18 +650,23 @@ class OpenAIProvider(AIProviderBase):
     async def summarize_stream(self, text: str) -> AsyncGenerator[str, None]:
         """流式总结"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                stream=True
+                stream=True,
+                timeout=self.request_timeout()
             )
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            try:
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # 正常结束、出错或被取消（客户端断开）时都立即关闭上游HTTP流，释放连接
+                await close_quietly(stream)
         except Exception as e:
             logger.error(f"OpenAI流式总结失败: {e}")
             raise
@@ -126,22 +675,32 @@ class OpenAIProvider(AIProviderBase):
 class ClaudeProvider(AIProviderBase):
     """Claude服务提供商"""
     
+    name = "claude"
+    
     def __init__(self):
-        if not config.CLAUDE_API_KEY:
+        if not is_api_key_configured(config.CLAUDE_API_KEY):
             raise ValueError("CLAUDE_API_KEY环境变量未设置")
         
-        self.client = AsyncAnthropic(api_key=config.CLAUDE_API_KEY)
+        transport = provider_transport(self.name, anthropic.DefaultAsyncHttpxClient)
+        self.client = AsyncAnthropic(
+            api_key=config.CLAUDE_API_KEY,
+            base_url=config.CLAUDE_BASE_URL,
+            max_retries=0,
+            http_client=anthropic.DefaultAsyncHttpxClient(transport=transport) if transport else None
+        )
         self.model = config.CLAUDE_MODEL
     
-    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+    async def translate(self, text: str, source_lang: str, target_lang: str,
+                        context: Optional[str] = None) -> str:
         """翻译文本"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=self.request_timeout()
             )
             
             return response.content[0].text.strip()
@@ -152,12 +711,13 @@ class ClaudeProvider(AIProviderBase):
     async def summarize(self, text: str) -> str:
         """总结文本"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             response = await self.client.messages.create(
                 model=self.model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=self.request_timeout()
             )
             
             return response.content[0].text.strip()
@@ -165,15 +725,17 @@ class ClaudeProvider(AIProviderBase):
             logger.error(f"Claude总结失败: {e}")
             raise
     
-    async def translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def translate_stream(self, text: str, source_lang: str, target_lang: str,
+                               context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """流式翻译"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             async with self.client.messages.stream(
                 model=self.model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=self.request_timeout()
             ) as stream:
                 async for text in stream.text_stream:
                     yield text
@@ -184,12 +746,13 @@ class ClaudeProvider(AIProviderBase):
     async def summarize_stream(self, text: str) -> AsyncGenerator[str, None]:
         """流式总结"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             async with self.client.messages.stream(
                 model=self.model,
                 max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                timeout=self.request_timeout()
             ) as stream:
                 async for text in stream.text_stream:
                     yield text
@@ -201,19 +764,24 @@ class ClaudeProvider(AIProviderBase):
 class QianwenProvider(AIProviderBase):
     """通义千问服务提供商"""
     
+    name = "qianwen"
+    
     def __init__(self):
-        if not config.QIANWEN_API_KEY:
+        if not is_api_key_configured(config.QIANWEN_API_KEY):
             raise ValueError("QIANWEN_API_KEY环境变量未设置")
         
         self.api_key = config.QIANWEN_API_KEY
         self.base_url = config.QIANWEN_BASE_URL
         self.model = config.QIANWEN_MODEL
         
-        # 同步接口使用OpenAI兼容模式
+        # 同步接口使用OpenAI兼容模式（录制/回放模式下与DashScope原生接口共用同一个录制文件）
         from openai import AsyncOpenAI
+        sdk_transport = provider_transport(self.name, openai.DefaultAsyncHttpxClient)
         self.openai_client = AsyncOpenAI(
             api_key=self.api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url=config.QIANWEN_COMPATIBLE_BASE_URL,
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(transport=sdk_transport) if sdk_transport else None
         )
     
     async def _make_request(self, prompt: str) -> str:
@@ -236,11 +804,13 @@ class QianwenProvider(AIProviderBase):
             }
         }
         
-        async with httpx.AsyncClient() as client:
+        # 客户端退出时会关闭传输层，每次请求使用新的传输层
+        async with httpx.AsyncClient(transport=provider_transport(self.name)) as client:
             response = await client.post(
                 f"{self.base_url}/services/aigc/text-generation/generation",
                 headers=headers,
-                json=data
+                json=data,
+                timeout=self.request_timeout()
             )
             response.raise_for_status()
             result = response.json()
@@ -253,15 +823,17 @@ class QianwenProvider(AIProviderBase):
             return "API响应格式错误"
     
     
-    async def translate(self, text: str, source_lang: str, target_lang: str) -> str:
+    async def translate(self, text: str, source_lang: str, target_lang: str,
+                        context: Optional[str] = None) -> str:
         """翻译文本 - 使用OpenAI兼容模式"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             response = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
+                temperature=0.3,
+                timeout=self.request_timeout()
             )
             
             return response.choices[0].message.content.strip()
@@ -272,12 +844,13 @@ class QianwenProvider(AIProviderBase):
     async def summarize(self, text: str) -> str:
         """总结文本 - 使用OpenAI兼容模式"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             response = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
+                temperature=0.3,
+                timeout=self.request_timeout()
             )
             
             return response.choices[0].message.content.strip()
@@ -285,21 +858,26 @@ class QianwenProvider(AIProviderBase):
             logger.error(f"通义千问总结失败: {e}")
             raise
     
-    async def translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def translate_stream(self, text: str, source_lang: str, target_lang: str,
+                               context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """流式翻译 - 使用OpenAI兼容模式"""
         try:
-            prompt = f"请将以下{source_lang}文本翻译成{target_lang}，只返回翻译结果：\n\n{text}"
+            prompt = self.translate_prompt(text, source_lang, target_lang, context)
             
             stream = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                stream=True
+                stream=True,
+                timeout=self.request_timeout()
             )
             
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await close_quietly(stream)
                     
         except Exception as e:
             logger.error(f"通义千问流式翻译失败: {e}")
@@ -308,18 +886,22 @@ class QianwenProvider(AIProviderBase):
     async def summarize_stream(self, text: str) -> AsyncGenerator[str, None]:
         """流式总结 - 使用OpenAI兼容模式"""
         try:
-            prompt = f"请对以下文本进行简洁的总结：\n\n{text}"
+            prompt = self.summarize_prompt(text)
             
             stream = await self.openai_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                stream=True
+                stream=True,
+                timeout=self.request_timeout()
             )
             
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await close_quietly(stream)
                     
         except Exception as e:
             logger.error(f"通义千问流式总结失败: {e}")
@@ -355,29 +937,76 @@ class AIProviderFactory:
             logger.error(f"创建AI服务提供商失败: {e}")
             raise
     
+    @classmethod
+    def provider_order(cls) -> list:
+        """按故障转移顺序返回服务提供商名称：主服务商在前，其后为备用服务商"""
+        order = [config.AI_PROVIDER]
+        fallbacks = config.AI_FALLBACK_PROVIDERS or list(cls._providers)
+        for name in fallbacks:
+            if name in cls._providers and name not in order:
+                order.append(name)
+        return order
+    
+    @classmethod
+    def create_all(cls) -> Dict[str, AIProviderBase]:
+        """
+        按故障转移顺序创建所有已配置的服务提供商实例，未配置的服务商会被跳过
+        
+        配置了 ROUTING_TARGETS 时按路由目标创建，每个目标一个实例（键为 服务商:模型），
+        同一服务商的不同模型共享该服务商的并发限制器
+        """
+        if not hasattr(cls, '_logged_api_status'):
+            cls._log_api_key_status()
+            cls._logged_api_status = True
+        
+        targets = configured_targets()
+        if not targets:
+            providers = {}
+            for name in cls.provider_order():
+                try:
+                    providers[name] = cls._providers[name]()
+                except ValueError as e:
+                    logger.debug(f"{name} 服务提供商不可用: {e}")
+            return providers
+        
+        providers = {}
+        for target in targets:
+            if target.provider not in cls._providers:
+                logger.warning(f"路由目标 {target.key} 的服务提供商不受支持，已忽略")
+                continue
+            try:
+                provider = cls._providers[target.provider]()
+            except ValueError as e:
+                logger.debug("路由目标 %s 不可用: %s", target.key, e)
+                continue
+            provider.model = target.model
+            providers[target.key] = provider
+        return providers
+    
     @classmethod
     def _log_api_key_status(cls):
         """记录API密钥配置状态"""
         logger.info("=== AI API密钥配置状态 ===")
         logger.info(f"选择的AI服务提供商: {config.AI_PROVIDER}")
+        logger.info(f"故障转移顺序: {' -> '.join(cls.provider_order())}")
         
         # OpenAI状态
         openai_key = config.OPENAI_API_KEY
-        if openai_key and openai_key != "your_openai_api_key_here":
+        if is_api_key_configured(openai_key):
             logger.info(f"✅ OpenAI API密钥: 已配置 (sk-...{openai_key[-8:]})")
         else:
             logger.warning("❌ OpenAI API密钥: 未配置")
         
         # Claude状态
         claude_key = config.CLAUDE_API_KEY
-        if claude_key and claude_key != "your_claude_api_key_here":
+        if is_api_key_configured(claude_key):
             logger.info(f"✅ Claude API密钥: 已配置 (...{claude_key[-8:]})")
         else:
             logger.warning("❌ Claude API密钥: 未配置")
         
         # 通义千问状态
         qianwen_key = config.QIANWEN_API_KEY
-        if qianwen_key and qianwen_key != "your_qianwen_api_key_here":
+        if is_api_key_configured(qianwen_key):
             logger.info(f"✅ 通义千问 API密钥: 已配置 (...{qianwen_key[-8:]})")
         else:
             logger.warning("❌ 通义千问 API密钥: 未配置")
@@ -4,11 +4,142 @@ AI服务模块
 """
 
 import asyncio
-from typing import AsyncGenerator
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Optional
 
-from services.ai_providers import AIProviderFactory
-from utils.logger import logger
-from utils.text_processor import preprocess_text
+from config.settings import config
+from services.provider_pool import CircuitBreaker, ProviderPool
+from services.routing import ProviderRouter, RouteDecision
+from services.scheduler import scheduler
+from utils.extractive_summarizer import compress_text
+from utils.logger import debug_sampled, logger
+from utils.metrics import CallbackMetric
+from utils.request_context import LANE_INTERACTIVE, LANE_STREAM, get_client_id, get_lane, remaining_time
+from utils.text_processor import estimate_tokens, preprocess_text
+from utils.timing import span
+
+
+class HedgeBudget:
+    """
+    对冲预算（令牌桶）
+    
+    每个请求按 ratio 存入令牌，每次对冲消耗一个令牌，
+    保证对冲产生的额外流量不超过基础流量的 ratio 比例
+    """
+    
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = 0.0
+    
+    def on_request(self):
+        """记录一个基础请求"""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_acquire(self) -> bool:
+        """尝试消耗一个令牌用于对冲"""
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class HedgingPolicy:
+    """
+    对冲请求策略
+    
+    主请求在服务商延迟分位数之内没有返回时，发起一个备份请求（同一或下一个服务商），
+    取最先成功的结果并取消另一个请求
+    """
+    
+    def __init__(self, pool: ProviderPool):
+        self.pool = pool
+        self.enabled = config.HEDGE_ENABLED
+        self.percentile = config.HEDGE_PERCENTILE
+        self.min_samples = config.HEDGE_MIN_SAMPLES
+        self.min_delay = config.HEDGE_MIN_DELAY_SECONDS
+        self.use_alternate = config.HEDGE_ALTERNATE_PROVIDER
+        self.budget = HedgeBudget(config.HEDGE_BUDGET_RATIO)
+        self.requests = 0
+        self.hedges_launched = 0
+        self.hedges_won = 0
+        self.hedges_suppressed = 0
+    
+    def hedge_delay(self, provider_name: str) -> Optional[float]:
+        """主请求等待多久后发起对冲，样本不足或对冲请求无法在截止时间前完成时返回None表示不对冲"""
+        tracker = self.pool.latency[provider_name]
+        if tracker.count < self.min_samples:
+            return None
+        delay = max(self.min_delay, tracker.percentile(self.percentile))
+        remaining = remaining_time()
+        if remaining is not None and delay + tracker.percentile(50) > remaining:
+            return None
+        return delay
+    
+    async def call(self, operation: str, *args, route: Optional[RouteDecision] = None):
+        """
+        带对冲的非流式调用
+        
+        Args:
+            operation: 服务商方法名
+            *args: 方法参数
+            route: 路由决策，决定主请求和对冲请求的服务商顺序
+            
+        Returns:
+            最先成功的调用结果
+        """
+        self.requests += 1
+        self.budget.on_request()
+        healthy = set(self.pool.healthy_order())
+        order = [name for name in (route.order if route else self.pool.providers) if name in healthy]
+        delay = self.hedge_delay(order[0]) if self.enabled and order else None
+        if delay is None:
+            return await self.pool.call(operation, *args, route=route)
+        
+        tasks = [asyncio.create_task(self.pool.call(operation, *args, route=route))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+            
+            if not self.budget.try_acquire():
+                self.hedges_suppressed += 1
+                return await tasks[0]
+            
+            backup_order = order[1:] + order[:1] if self.use_alternate and len(order) > 1 else order
+            logger.info(f"主请求超过 {delay * 1000:.0f}ms 未返回，发起对冲请求: {backup_order[0]}")
+            self.hedges_launched += 1
+            tasks.append(asyncio.create_task(self.pool.call(operation, *args, order=backup_order, route=route)))
+            
+            pending = set(tasks)
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def status(self) -> dict:
+        """对冲统计"""
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "requests": self.requests,
+            "hedges_launched": self.hedges_launched,
+            "hedges_won": self.hedges_won,
+            "hedges_suppressed": self.hedges_suppressed,
+            "hedge_rate": round(self.hedges_launched / self.requests, 4) if self.requests else 0.0,
+            "budget_tokens": round(self.budget.tokens, 2),
+        }
 
 
 class AIService:
@@ -16,17 +147,23 @@ class AIService:
     
     def __init__(self):
         """初始化AI服务"""
-        self.provider = None
+        self.pool = ProviderPool({})
         self._initialize_provider()
+        self.hedging = HedgingPolicy(self.pool)
+        self.router = ProviderRouter.from_pool(self.pool)
     
     def _initialize_provider(self):
-        """初始化AI服务提供商"""
+        """初始化AI服务提供商池"""
         try:
-            self.provider = AIProviderFactory.create_provider()
-            logger.info(f"AI服务提供商初始化成功: {self.provider.__class__.__name__}")
+            self.pool = ProviderPool.from_config()
         except Exception as e:
             logger.error(f"AI服务提供商初始化失败: {e}")
-            self.provider = None
+            self.pool = ProviderPool({})
+        if self.pool:
+            names = ", ".join(provider.__class__.__name__ for provider in self.pool.providers.values())
+            logger.info(f"AI服务提供商初始化成功: {names}")
+        else:
+            logger.warning("没有已配置的AI服务提供商，将使用模拟实现")
     
 
     async def translate_text(self, text: str, source_lang: str, target_lang: str) -> str:
@@ -41,29 +178,66 @@ class AIService:
         Returns:
             翻译后的文本
         """
-        logger.info(f"翻译请求: {source_lang} -> {target_lang}")
+        logger.info("翻译请求: %s -> %s", source_lang, target_lang)
         
         # 预处理文本
-        cleaned_text = preprocess_text(text)
+        with span("preprocess"):
+            cleaned_text = preprocess_text(text)
         
-        if not self.provider:
+        if not self.pool:
             logger.warning("AI服务提供商未初始化，使用模拟翻译")
             return await self._mock_translate(cleaned_text, source_lang, target_lang)
         
-        try:
-            result = await self.provider.translate(cleaned_text, source_lang, target_lang)
-            logger.info("翻译完成")
-            return result
-        except Exception as e:
-            logger.error(f"翻译失败: {e}，使用模拟翻译")
-            return await self._mock_translate(cleaned_text, source_lang, target_lang)
+        route = self.router.route("translate", cleaned_text)
+        async with self._schedule(cleaned_text, LANE_INTERACTIVE):
+            result = await self.hedging.call("translate", cleaned_text, source_lang, target_lang, route=route)
+        logger.info("翻译完成")
+        return result
+    
+    def _schedule(self, text: str, default_lane: str):
+        """
+        获取调度器名额
+        
+        工作负载通道优先取请求上下文中的设置（后台任务为 async），
+        调用成本按输入token数计算，使租户间按上游消耗公平分配
+        
+        Args:
+            text: 发送给上游的文本
+            default_lane: 上下文未指定通道时使用的通道
+        """
+        cost = 1.0 + estimate_tokens(text) / 1000.0
+        return scheduler.slot(get_lane(default_lane), get_client_id(), cost)
+    
+    def _compress_for_summary(self, text: str, token_budget: Optional[int]) -> str:
+        """
+        总结前的抽取式预压缩（CPU密集，调用方在工作线程中执行）
+        
+        Args:
+            text: 预处理后的文本
+            token_budget: token预算，为空时使用配置默认值
+            
+        Returns:
+            压缩后的文本
+        """
+        budget = token_budget or config.EXTRACTIVE_TOKEN_BUDGET
+        start = time.perf_counter()
+        extraction = compress_text(text, budget, top_k=config.EXTRACTIVE_TOP_K)
+        if extraction.compressed:
+            logger.info(
+                f"抽取式预压缩: {extraction.original_tokens} -> {extraction.compressed_tokens} tokens "
+                f"(减少 {extraction.reduction_ratio:.1%}，保留 {len(extraction.selected_indices)}/"
+                f"{extraction.sentence_count} 句，耗时 {(time.perf_counter() - start) * 1000:.1f}ms)"
+            )
+        return extraction.text
     
-    async def summarize_text(self, text: str) -> str:
+    async def summarize_text(self, text: str, compress: bool = False, token_budget: Optional[int] = None) -> str:
         """
         总结文本
         
         Args:
             text: 要总结的文本
+            compress: 是否在总结前进行抽取式预压缩
+            token_budget: 预压缩的token预算
             
         Returns:
             总结后的文本
@@ -71,63 +245,73 @@ class AIService:
         logger.info("总结请求")
         
         # 预处理文本
-        cleaned_text = preprocess_text(text)
+        with span("preprocess"):
+            cleaned_text = preprocess_text(text)
+        if compress:
+            with span("compress"):
+                cleaned_text = await asyncio.to_thread(self._compress_for_summary, cleaned_text, token_budget)
         
-        if not self.provider:
+        if not self.pool:
             logger.warning("AI服务提供商未初始化，使用模拟总结")
             return await self._mock_summarize(cleaned_text)
         
-        try:
-            result = await self.provider.summarize(cleaned_text)
-            logger.info("总结完成")
-            return result
-        except Exception as e:
-            logger.error(f"总结失败: {e}，使用模拟总结")
-            return await self._mock_summarize(cleaned_text)
+        route = self.router.route("summarize", cleaned_text)
+        async with self._schedule(cleaned_text, LANE_INTERACTIVE):
+            result = await self.hedging.call("summarize", cleaned_text, route=route)
+        logger.info("总结完成")
+        return result
     
-    async def translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def translate_stream(self, text: str, source_lang: str, target_lang: str,
+                               context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """
         流式翻译
         
+        生成器被关闭（客户端断开）时逐层关闭服务商池和服务商的流，并释放调度器名额
+        
         Args:
             text: 要翻译的文本
             source_lang: 源语言
             target_lang: 目标语言
+            context: 前文（实时翻译逐句调用时提供），只作为参考放入提示词，不翻译
             
         Yields:
             翻译结果的片段
         """
-        logger.info(f"流式翻译请求: {source_lang} -> {target_lang}")
+        logger.info("流式翻译请求: %s -> %s", source_lang, target_lang)
         
         # 预处理文本
-        cleaned_text = preprocess_text(text)
+        with span("preprocess"):
+            cleaned_text = preprocess_text(text)
         
-        if not self.provider:
+        if not self.pool:
             logger.warning("AI服务提供商未初始化，使用模拟流式翻译")
-            async for chunk in self._mock_translate_stream(cleaned_text, source_lang, target_lang):
-                logger.debug(f"模拟流式翻译输出: {chunk}")
+            async for chunk in self._mock_translate_stream(cleaned_text, source_lang, target_lang, context):
+                debug_sampled(logger, "模拟流式翻译输出: %s", chunk)
                 yield chunk
             return
         
-        try:
-            chunk_count = 0
-            async for chunk in self.provider.translate_stream(cleaned_text, source_lang, target_lang):
+        chunk_count = 0
+        route = self.router.route("translate", cleaned_text, stream=True)
+        async with self._schedule(cleaned_text, LANE_STREAM), \
+                aclosing(self.pool.stream("translate_stream", cleaned_text, source_lang, target_lang, context,
+                                          route=route)) as stream:
+            async for chunk in stream:
                 chunk_count += 1
-                logger.debug(f"AI流式翻译输出 #{chunk_count}: {chunk}")
-                yield chunk
-            logger.info(f"流式翻译完成，共输出 {chunk_count} 个片段")
-        except Exception as e:
-            logger.error(f"流式翻译失败: {e}，使用模拟流式翻译")
-            async for chunk in self._mock_translate_stream(cleaned_text, source_lang, target_lang):
-                logger.debug(f"降级模拟流式翻译输出: {chunk}")
+                debug_sampled(logger, "AI流式翻译输出 #%d: %s", chunk_count, chunk)
                 yield chunk
+        logger.info("流式翻译完成，共输出 %d 个片段", chunk_count)
     
-    async def summarize_stream(self, text: str) -> AsyncGenerator[str, None]:
+    async def summarize_stream(self, text: str, compress: bool = False,
+                               token_budget: Optional[int] = None) -> AsyncGenerator[str, None]:
         """
         流式总结
         
+        生成器被关闭（客户端断开）时逐层关闭服务商池和服务商的流，并释放调度器名额
+        
         Args:
             text: 要总结的文本
+            compress: 是否在总结前进行抽取式预压缩
+            token_budget: 预压缩的token预算
             
         Yields:
             总结结果的片段
@@ -135,23 +319,25 @@ class AIService:
         logger.info("流式总结请求")
         
         # 预处理文本
-        cleaned_text = preprocess_text(text)
+        with span("preprocess"):
+            cleaned_text = preprocess_text(text)
+        if compress:
+            with span("compress"):
+                cleaned_text = await asyncio.to_thread(self._compress_for_summary, cleaned_text, token_budget)
         
-        if not self.provider:
+        if not self.pool:
             logger.warning("AI服务提供商未初始化，使用模拟流式总结")
             async for chunk in self._mock_summarize_stream(cleaned_text):
                 yield chunk
             return
         
-        try:
-            async for chunk in self.provider.summarize_stream(cleaned_text):
-                yield chunk
-        except Exception as e:
-            logger.error(f"流式总结失败: {e}，使用模拟流式总结")
-            async for chunk in self._mock_summarize_stream(cleaned_text):
+        route = self.router.route("summarize", cleaned_text, stream=True)
+        async with self._schedule(cleaned_text, LANE_STREAM), \
+                aclosing(self.pool.stream("summarize_stream", cleaned_text, route=route)) as stream:
+            async for chunk in stream:
                 yield chunk
     
-    # 模拟实现（作为降级方案）
+    # 模拟实现（未配置任何服务提供商时使用）
     async def _mock_translate(self, text: str, source_lang: str, target_lang: str) -> str:
         """模拟翻译实现"""
         await asyncio.sleep(1)
@@ -167,7 +353,8 @@ class AIService:
         await asyncio.sleep(1.5)
         return f"模拟总结: {text[:50]}{'...' if len(text) > 50 else ''}"
     
-    async def _mock_translate_stream(self, text: str, source_lang: str, target_lang: str) -> AsyncGenerator[str, None]:
+    async def _mock_translate_stream(self, text: str, source_lang: str, target_lang: str,
+                                     context: Optional[str] = None) -> AsyncGenerator[str, None]:
         """模拟流式翻译实现"""
         if source_lang == "中文" and target_lang == "英文":
             result = f"[模拟EN] {text}"
@@ -192,3 +379,11 @@ class AIService:
 
 # 创建全局实例
 ai_service = AIService()
+
+# 熔断器状态: 0 关闭，1 半开，2 打开
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+CallbackMetric(
+    "ai_circuit_breaker_state", "各服务商熔断器状态（0 关闭，1 半开，2 打开）", ("provider",),
+    lambda: [((name,), _BREAKER_STATES[breaker.state]) for name, breaker in ai_service.pool.breakers.items()]
+    if ai_service.pool else []
+)
@@ -0,0 +1,315 @@
+"""
+上游HTTP录制与回放（cassette）
+作为 httpx 传输层注入各服务商的SDK客户端：录制模式下转发到真实上游，并把响应的状态码、响应头、
+每个数据块及其到达间隔追加到服务商对应的JSONL文件；回放模式下不访问网络，按请求匹配录制的响应，
+以原始或按比例缩放的时间逐块返回。SDK的请求构造、SSE解析、重试和服务商适配器代码与真实调用完全相同，
+可以离线复现上游行为并分析包括SDK解析在内的完整请求路径
+"""
+
+import asyncio
+import base64
+import functools
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from config.settings import config
+from utils.logger import logger
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# 不录制的响应头（逐跳头、长度和编码由回放时的响应重新决定，Cookie 不落盘）
+_DROPPED_HEADERS = frozenset({
+    "content-length", "content-encoding", "transfer-encoding", "connection", "keep-alive", "set-cookie",
+})
+
+
+class CassetteMissError(Exception):
+    """回放模式下没有与请求匹配的录制（不可重试）"""
+
+
+def request_key(request: httpx.Request) -> str:
+    """
+    请求的匹配键：方法、路径和请求体（JSON按键排序）的哈希，不包含主机名和请求头，
+    录制时的上游地址与回放时配置的地址不同也能匹配
+    """
+    body = request.content
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256(request.method.encode() + b" " + request.url.raw_path + b"\n" + body).hexdigest()
+    return digest[:32]
+
+
+def _encode_chunk(chunk: bytes) -> str:
+    """数据块为UTF-8文本时原样保存，否则保存为带前缀的base64"""
+    try:
+        return chunk.decode("utf-8")
+    except UnicodeDecodeError:
+        return "b64:" + base64.b64encode(chunk).decode("ascii")
+
+
+def _decode_chunk(data: str) -> bytes:
+    if data.startswith("b64:"):
+        return base64.b64decode(data[4:])
+    return data.encode("utf-8")
+
+
+class Cassette:
+    """
+    一个服务商的录制文件，每行一次交互:
+    {"key", "method", "path", "status", "headers", "ttfb_ms", "chunks": [[距上一块的毫秒数, 数据], ...]}
+
+    Args:
+        path: JSONL文件路径
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> "Cassette":
+        """读取录制文件，同一请求的多次录制按顺序循环回放"""
+        self.interactions.clear()
+        self._cursors.clear()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        interaction = json.loads(line)
+                        self.interactions.setdefault(interaction["key"], []).append(interaction)
+        logger.info(f"已加载录制文件 {self.path}: {sum(map(len, self.interactions.values()))} 次交互")
+        return self
+
+    def next(self, key: str) -> Optional[Dict[str, Any]]:
+        """取出与请求匹配的下一次录制"""
+        candidates = self.interactions.get(key)
+        if not candidates:
+            self.misses += 1
+            return None
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        self.replayed += 1
+        return candidates[cursor % len(candidates)]
+
+    def append(self, interaction: Dict[str, Any]):
+        """追加一次交互（在线程中调用，不阻塞事件循环）"""
+        line = json.dumps(interaction, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "interactions": sum(map(len, self.interactions.values())),
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+class _RecordingStream:
+    """
+    转发上游响应的数据块并记录到达间隔，读到结束后写入录制文件（提前关闭的流不录制）。
+    SDK在收到 [DONE] 后会再次迭代数据流读完剩余内容，再次迭代时从上次的位置继续
+    """
+
+    def __init__(self, stream, cassette: Cassette, interaction: Dict[str, Any], last_time: float):
+        self._stream = stream
+        self._cassette = cassette
+        self._interaction = interaction
+        self._last_time = last_time
+        self._saved = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        chunks = self._interaction["chunks"]
+        async for chunk in self._stream:
+            now = time.perf_counter()
+            chunks.append([round((now - self._last_time) * 1000, 2), _encode_chunk(chunk)])
+            self._last_time = now
+            yield chunk
+        if not self._saved:
+            self._saved = True
+            await asyncio.to_thread(self._cassette.append, self._interaction)
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+
+class _ReplayStream:
+    """
+    按录制的到达间隔（乘以缩放比例）逐块返回，按累计时间等待，sleep 的误差不会逐块累积；
+    再次迭代时从上次的位置继续
+    """
+
+    def __init__(self, chunks: List[List[Any]], scale: float):
+        self._chunks = chunks
+        self._offsets = list(itertools.accumulate(delay_ms / 1000 * scale for delay_ms, _ in chunks))
+        self._scale = scale
+        self._index = 0
+        self._start: Optional[float] = None
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        if self._start is None:
+            self._start = time.perf_counter()
+        while self._index < len(self._chunks):
+            if self._scale > 0:
+                wait = self._start + self._offsets[self._index] - time.perf_counter()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            data = self._chunks[self._index][1]
+            self._index += 1
+            yield _decode_chunk(data)
+
+    async def aclose(self):
+        self._index = len(self._chunks)
+
+
+class CassetteTransport:
+    """
+    录制或回放上游HTTP交互的传输层（通过 bind_transport 派生为具体httpx包的传输层类）
+
+    Args:
+        cassette: 录制文件
+        mode: record 或 replay
+        timing_scale: 回放时等待时间的缩放比例，1为原始时间，0为不等待
+    """
+
+    http: Any = None
+    recording_stream: Any = None
+    replay_stream: Any = None
+
+    def __init__(self, cassette: Cassette, mode: str, timing_scale: float = 1.0):
+        self.cassette = cassette
+        self.mode = mode
+        self.timing_scale = timing_scale
+        self._transport = self.http.AsyncHTTPTransport() if mode == MODE_RECORD else None
+
+    async def handle_async_request(self, request):
+        key = request_key(request)
+        if self.mode == MODE_REPLAY:
+            return await self._replay(request, key)
+
+        # 录制时要求上游不压缩，录制文件中保存可读的原始文本
+        request.headers["accept-encoding"] = "identity"
+        start = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        now = time.perf_counter()
+        interaction = {
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": [[name, value] for name, value in response.headers.multi_items()
+                        if name.lower() not in _DROPPED_HEADERS],
+            "ttfb_ms": round((now - start) * 1000, 2),
+            "chunks": [],
+        }
+        return self.http.Response(
+            response.status_code, headers=response.headers,
+            stream=self.recording_stream(response.stream, self.cassette, interaction, now),
+            extensions=response.extensions
+        )
+
+    async def _replay(self, request, key: str):
+        interaction = self.cassette.next(key)
+        if interaction is None:
+            logger.error(f"录制文件 {self.cassette.path} 中没有匹配的请求: {request.method} {request.url.path} ({key})")
+            raise CassetteMissError(f"没有匹配的录制: {request.method} {request.url.path}")
+        if self.timing_scale > 0:
+            await asyncio.sleep(interaction["ttfb_ms"] / 1000 * self.timing_scale)
+        return self.http.Response(
+            interaction["status"], headers=[tuple(header) for header in interaction["headers"]],
+            stream=self.replay_stream(interaction["chunks"], self.timing_scale), request=request
+        )
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def bind_transport(http) -> type:
+    """
+    派生指定httpx包的传输层类：新版 openai/anthropic SDK 基于 httpx2，
+    传输层和响应数据流必须继承客户端所用包中的基类
+
+    Args:
+        http: httpx 或 httpx2 模块
+
+    Returns:
+        传输层类
+    """
+    return type("CassetteTransport", (CassetteTransport, http.AsyncBaseTransport), {
+        "http": http,
+        "recording_stream": type("RecordingStream", (_RecordingStream, http.AsyncByteStream), {}),
+        "replay_stream": type("ReplayStream", (_ReplayStream, http.AsyncByteStream), {}),
+    })
+
+
+def http_package(client_class: type):
+    """SDK默认客户端类所基于的httpx包（httpx 或 httpx2）"""
+    for cls in client_class.__mro__:
+        package = cls.__module__.partition(".")[0]
+        if package in ("httpx", "httpx2"):
+            return sys.modules[package]
+    return httpx
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(provider: str) -> Cassette:
+    """服务商对应的录制文件（同一服务商的所有客户端共享）"""
+    cassette = _cassettes.get(provider)
+    if cassette is None:
+        cassette = Cassette(os.path.join(config.CASSETTE_DIR, f"{provider}.jsonl"))
+        if config.CASSETTE_MODE == MODE_REPLAY:
+            cassette.load()
+        _cassettes[provider] = cassette
+    return cassette
+
+
+def provider_transport(provider: str, client_class: type = httpx.AsyncClient) -> Optional[CassetteTransport]:
+    """
+    按 CASSETTE_MODE 创建服务商客户端使用的传输层
+
+    Args:
+        provider: 服务商名称，决定录制文件
+        client_class: 使用该传输层的客户端类（SDK的 DefaultAsyncHttpxClient 或 httpx.AsyncClient）
+
+    Returns:
+        录制或回放传输层，CASSETTE_MODE=off 时返回None（使用SDK默认传输）
+    """
+    if config.CASSETTE_MODE not in (MODE_RECORD, MODE_REPLAY):
+        return None
+    transport_class = bind_transport(http_package(client_class))
+    return transport_class(get_cassette(provider), config.CASSETTE_MODE, config.CASSETTE_TIMING_SCALE)
+
+
+def cassette_status() -> Dict[str, Any]:
+    return {
+        "mode": config.CASSETTE_MODE,
+        "timing_scale": config.CASSETTE_TIMING_SCALE,
+        "cassettes": {provider: cassette.status() for provider, cassette in _cassettes.items()},
+    }
@@ -0,0 +1,223 @@
+"""
+实时翻译
+输入文本陆续到达（打字或语音识别），增量断句后每个完整的句子立即作为独立的流式翻译发给服务商，
+最近几句原文作为前文一起发送以保持指代和术语一致；多个句子可以并行翻译，译文按句子顺序流式返回，
+延迟取决于单个句子而不是整篇文本
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+
+from config.settings import config
+from services.ai_service import ai_service
+from services.routing import capture_routes
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+from utils.request_context import LANE_STREAM, request_timeout_for, set_deadline, set_lane
+from utils.sentence_segmenter import SentenceSegmenter
+
+# 句子译文结束标记
+_END = object()
+# 句子翻译被取消（会话关闭）的标记
+_CANCELLED = object()
+
+
+class LiveTranslationStats:
+    """实时翻译统计"""
+
+    def __init__(self):
+        self.sessions = 0
+        self.active_sessions = 0
+        self.sentences = 0
+        self.sentences_failed = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "active_sessions": self.active_sessions,
+            "sentences": self.sentences,
+            "sentences_failed": self.sentences_failed,
+            "context_sentences": config.LIVE_CONTEXT_SENTENCES,
+            "max_parallel": config.LIVE_MAX_PARALLEL,
+        }
+
+
+# 全局实时翻译统计实例
+live_stats = LiveTranslationStats()
+
+CallbackMetric(
+    "live_translation_active_sessions", "进行中的实时翻译会话数", (),
+    lambda: [((), live_stats.active_sessions)]
+)
+CallbackMetric(
+    "live_translation_sentences_total", "实时翻译的句子数（按结果）", ("outcome",),
+    lambda: [(("dispatched",), live_stats.sentences), (("failed",), live_stats.sentences_failed)],
+    type_name="counter"
+)
+
+
+class _Sentence:
+    """一个已断句、正在或等待翻译的句子"""
+
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.text = text
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+
+class LiveTranslationSession:
+    """
+    实时翻译会话
+
+    feed 加入到达的文本，end 表示输入结束，events 按句子顺序产生事件:
+        sentence（index、source）/ chunk（index、content）/ sentence_done（index、translation、routing）/
+        sentence_error（index、message）/ done（sentences、result）
+
+    Args:
+        source_lang: 源语言
+        target_lang: 目标语言
+        timeout_header: 每个句子的超时（X-Request-Timeout 的值），为空时使用 /api/translate 的默认超时
+    """
+
+    def __init__(self, source_lang: str, target_lang: str, timeout_header: Optional[str] = None):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.timeout = request_timeout_for("/api/translate", timeout_header)
+        self.segmenter = SentenceSegmenter()
+        self.ended = False
+        self.closed = False
+        self._count = 0
+        self._context: Deque[str] = deque(maxlen=max(config.LIVE_CONTEXT_SENTENCES, 1))
+        self._parallel = asyncio.Semaphore(max(config.LIVE_MAX_PARALLEL, 1))
+        # 已断句但尚未返回完整译文的句子数上限，满时 feed 等待（背压）
+        self._pending = asyncio.Semaphore(max(config.LIVE_MAX_PENDING_SENTENCES, 1))
+        self._sentences: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        live_stats.sessions += 1
+        live_stats.active_sessions += 1
+
+    async def feed(self, text: str):
+        """
+        加入新到达的文本，完整的句子立即开始翻译
+
+        Raises:
+            RuntimeError: 输入已结束或会话已关闭
+        """
+        if self.ended or self.closed:
+            raise RuntimeError("实时翻译输入已结束")
+        for sentence in self.segmenter.feed(text):
+            await self._dispatch(sentence)
+
+    async def end(self):
+        """输入结束，翻译剩余的文本，所有句子返回后 events 结束"""
+        if self.ended or self.closed:
+            return
+        self.ended = True
+        rest = self.segmenter.flush()
+        if rest:
+            await self._dispatch(rest)
+        self._sentences.put_nowait(_END)
+
+    async def close(self):
+        """关闭会话，取消所有未完成的句子翻译"""
+        if self.closed:
+            return
+        self.closed = True
+        live_stats.active_sessions -= 1
+        self._sentences.put_nowait(_END)
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self, text: str):
+        """创建句子的翻译任务，前文为之前的最近几句原文"""
+        await self._pending.acquire()
+        context = "\n".join(self._context) if config.LIVE_CONTEXT_SENTENCES > 0 else None
+        self._context.append(text)
+        sentence = _Sentence(self._count, text)
+        self._count += 1
+        live_stats.sentences += 1
+        sentence.task = asyncio.create_task(self._translate(sentence, context or None))
+        # 任务在开始执行前被取消时不会进入 _translate，通过回调通知读取者
+        sentence.task.add_done_callback(
+            lambda task: sentence.chunks.put_nowait(_CANCELLED) if task.cancelled() else None
+        )
+        self._tasks = [task for task in self._tasks if not task.done()]
+        self._tasks.append(sentence.task)
+        self._sentences.put_nowait(sentence)
+
+    async def _translate(self, sentence: _Sentence, context: Optional[str]):
+        """流式翻译一个句子，片段放入句子的队列"""
+        async with self._parallel:
+            set_lane(LANE_STREAM)
+            set_deadline(time.time() + self.timeout)
+            routes = capture_routes()
+            try:
+                source = ai_service.translate_stream(sentence.text, self.source_lang, self.target_lang, context)
+                async with aclosing(source) as chunks:
+                    async for chunk in chunks:
+                        sentence.chunks.put_nowait(chunk)
+                sentence.chunks.put_nowait((_END, routes.metadata()))
+            except Exception as e:
+                live_stats.sentences_failed += 1
+                logger.error(f"实时翻译第 {sentence.index} 句失败: {e}")
+                sentence.chunks.put_nowait(e)
+
+    async def _get(self, queue: asyncio.Queue, idle_timeout: Optional[float]):
+        """从队列读取，超过 idle_timeout 没有数据时返回None"""
+        if idle_timeout is None or not queue.empty():
+            return await queue.get()
+        try:
+            async with asyncio.timeout(idle_timeout):
+                return await queue.get()
+        except TimeoutError:
+            return None
+
+    async def events(self, idle_timeout: Optional[float] = None) -> AsyncGenerator[Optional[Dict[str, Any]], None]:
+        """
+        按句子顺序产生翻译事件，输入结束且所有句子返回后产生 done 事件；会话被关闭时直接结束
+
+        Args:
+            idle_timeout: 超过该时间没有事件时产生None（供SSE发送心跳），为空时不产生
+
+        Yields:
+            事件字典或None
+        """
+        results = []
+        while True:
+            sentence = await self._get(self._sentences, idle_timeout)
+            if sentence is None:
+                yield None
+                continue
+            if sentence is _END:
+                if not self.closed:
+                    yield {"type": "done", "sentences": self._count, "result": "\n".join(results)}
+                return
+
+            yield {"type": "sentence", "index": sentence.index, "source": sentence.text}
+            parts = []
+            while True:
+                item = await self._get(sentence.chunks, idle_timeout)
+                if item is None:
+                    yield None
+                    continue
+                if item is _CANCELLED:
+                    return
+                if isinstance(item, tuple):
+                    translation = "".join(parts).strip()
+                    results.append(translation)
+                    yield {"type": "sentence_done", "index": sentence.index, "translation": translation,
+                           "routing": item[1]}
+                    break
+                if isinstance(item, Exception):
+                    results.append("")
+                    yield {"type": "sentence_error", "index": sentence.index, "message": str(item)}
+                    break
+                parts.append(item)
+                yield {"type": "chunk", "index": sentence.index, "content": item}
+            self._pending.release()
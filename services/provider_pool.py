@@ -0,0 +1,453 @@
+"""
+AI服务提供商池
+持有所有已配置的服务提供商，为每个服务商维护熔断器，
+按顺序故障转移到下一个健康的服务商，全部熔断时快速失败
+"""
+
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Iterator, List, Optional
+
+from config.settings import config
+from services.ai_providers import AIProviderBase, AIProviderFactory, ConcurrencyLimitExceeded, is_client_error
+from utils.logger import logger
+from utils.request_context import DeadlineExceededError, remaining_time
+
+if TYPE_CHECKING:
+    from services.routing import RouteDecision
+
+
+class ProviderUnavailableError(Exception):
+    """没有可用的AI服务提供商"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    基于错误率和慢调用率的熔断器
+
+    closed: 正常放行，在滑动窗口内统计失败率和慢调用率，超过阈值后熔断
+    open: 直接拒绝，经过 open_seconds 后进入半开
+    half_open: 放行有限数量的探测请求，成功则恢复，失败则重新熔断
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window_seconds = config.CIRCUIT_WINDOW_SECONDS
+        self.min_requests = config.CIRCUIT_MIN_REQUESTS
+        self.error_rate_threshold = config.CIRCUIT_ERROR_RATE_THRESHOLD
+        self.slow_call_seconds = config.CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_call_rate_threshold = config.CIRCUIT_SLOW_CALL_RATE_THRESHOLD
+        self.open_seconds = config.CIRCUIT_OPEN_SECONDS
+        self.half_open_probes = config.CIRCUIT_HALF_OPEN_PROBES
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._events = deque()  # (时间戳, 是否失败, 是否慢调用)
+        self._failures = 0
+        self._slow_calls = 0
+        self._probes_in_flight = 0
+
+    def _prune(self, now: float):
+        """移除滑动窗口之外的统计事件"""
+        cutoff = now - self.window_seconds
+        events = self._events
+        while events and events[0][0] < cutoff:
+            _, failed, slow = events.popleft()
+            self._failures -= failed
+            self._slow_calls -= slow
+
+    def _transition(self, state: str, now: float):
+        """切换熔断器状态"""
+        if state == self.state:
+            return
+        logger.warning(f"熔断器[{self.name}] 状态变化: {self.state} -> {state}")
+        self.state = state
+        if state == self.OPEN:
+            self.opened_at = now
+        if state == self.CLOSED:
+            self._events.clear()
+            self._failures = 0
+            self._slow_calls = 0
+        self._probes_in_flight = 0
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的剩余秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求，半开状态下会占用一个探测名额"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self._transition(self.HALF_OPEN, now)
+
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def record_success(self, latency: float):
+        """记录一次成功调用"""
+        self._record(latency, failed=False)
+
+    def record_failure(self, latency: float):
+        """记录一次失败调用"""
+        self._record(latency, failed=True)
+
+    def release(self):
+        """调用被取消且无结论时释放探测名额"""
+        if self.state == self.HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    def _record(self, latency: float, failed: bool):
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+
+        if self.state == self.HALF_OPEN:
+            if failed or slow:
+                self._transition(self.OPEN, now)
+            else:
+                self._transition(self.CLOSED, now)
+            return
+
+        if self.state == self.OPEN:
+            # 熔断前已发出的请求结果不再影响状态
+            return
+
+        self._events.append((now, failed, slow))
+        self._failures += failed
+        self._slow_calls += slow
+        self._prune(now)
+
+        total = len(self._events)
+        if total < self.min_requests:
+            return
+        if (self._failures / total >= self.error_rate_threshold
+                or self._slow_calls / total >= self.slow_call_rate_threshold):
+            self._transition(self.OPEN, now)
+
+    def status(self) -> Dict[str, Any]:
+        """熔断器状态快照"""
+        self._prune(time.monotonic())
+        total = len(self._events)
+        return {
+            "state": self.state,
+            "window_requests": total,
+            "error_rate": round(self._failures / total, 4) if total else 0.0,
+            "slow_call_rate": round(self._slow_calls / total, 4) if total else 0.0,
+            "retry_after": round(self.retry_after(), 2),
+        }
+
+
+class LatencyTracker:
+    """
+    最近成功调用的延迟统计
+
+    使用固定大小的环形缓冲区保存样本，分位数在样本更新后按需重新计算
+    """
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples = [0.0] * size
+        self._count = 0
+        self._index = 0
+        self._sorted: Optional[List[float]] = None
+
+    def record(self, latency: float):
+        """记录一次调用延迟（秒）"""
+        self._samples[self._index] = latency
+        self._index = (self._index + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+        self._sorted = None
+
+    @property
+    def count(self) -> int:
+        """当前样本数"""
+        return self._count
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        计算延迟分位数
+
+        Args:
+            q: 分位数，取值0-100
+
+        Returns:
+            分位数延迟（秒），没有样本时返回None
+        """
+        if not self._count:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples[:self._count])
+        index = min(self._count - 1, int(q / 100.0 * self._count))
+        return self._sorted[index]
+
+
+class EwmaStats:
+    """
+    路由目标的EWMA统计
+
+    延迟按每千token归一化（latency / (1 + tokens / 1000)），错误率为每次调用成功(0)/失败(1)的EWMA；
+    流式调用的总耗时取决于客户端读取速度，只记录按输入token归一化的首个片段时间（TTFT）
+    """
+
+    def __init__(self, alpha: Optional[float] = None):
+        self.alpha = config.ROUTING_EWMA_ALPHA if alpha is None else alpha
+        self.latency: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.ttft_samples = 0
+
+    def record(self, latency: Optional[float], tokens: float = 0.0, failed: bool = False):
+        """
+        记录一次调用结果
+
+        Args:
+            latency: 调用耗时，为空时只更新错误率
+            tokens: 本次调用的预估总token数
+            failed: 是否失败，失败的调用只更新错误率
+        """
+        self.samples += 1
+        self.error_rate = self.alpha * float(failed) + (1 - self.alpha) * self.error_rate
+        if failed or latency is None:
+            return
+        normalized = latency / (1.0 + tokens / 1000.0)
+        self.latency = normalized if self.latency is None else \
+            self.alpha * normalized + (1 - self.alpha) * self.latency
+
+    def record_ttft(self, ttft: float, input_tokens: float = 0.0):
+        """
+        记录一次流式调用的首个片段时间
+
+        Args:
+            ttft: 首个片段的到达时间（秒）
+            input_tokens: 输入token数
+        """
+        self.ttft_samples += 1
+        normalized = ttft / (1.0 + input_tokens / 1000.0)
+        self.ttft = normalized if self.ttft is None else self.alpha * normalized + (1 - self.alpha) * self.ttft
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ewma_latency_per_ktok": round(self.latency, 4) if self.latency is not None else None,
+            "ewma_ttft_per_ktok": round(self.ttft, 4) if self.ttft is not None else None,
+            "ewma_error_rate": round(self.error_rate, 4),
+            "samples": self.samples,
+            "ttft_samples": self.ttft_samples,
+        }
+
+
+class ProviderPool:
+    """
+    AI服务提供商池，负责熔断判断和顺序故障转移
+
+    池中的键为路由目标：未配置 ROUTING_TARGETS 时为服务商名称，否则为 服务商:模型
+    """
+
+    def __init__(self, providers: Dict[str, AIProviderBase]):
+        self.providers = providers
+        self.breakers = {name: CircuitBreaker(name) for name in providers}
+        self.latency = {name: LatencyTracker() for name in providers}
+        self.ewma = {name: EwmaStats() for name in providers}
+
+    @classmethod
+    def from_config(cls) -> "ProviderPool":
+        """根据配置创建包含所有已配置服务商的提供商池"""
+        return cls(AIProviderFactory.create_all())
+
+    def __bool__(self) -> bool:
+        return bool(self.providers)
+
+    def _candidates(self, order: Optional[List[str]] = None) -> Iterator[str]:
+        """按故障转移顺序逐个返回熔断器放行的服务商，惰性判断以免占用多余的半开探测名额"""
+        for name in order or self.providers:
+            if self.breakers[name].allow_request():
+                yield name
+
+    def healthy_order(self) -> List[str]:
+        """当前未熔断的服务商（不占用半开探测名额）"""
+        return [name for name, breaker in self.breakers.items() if breaker.state != CircuitBreaker.OPEN]
+
+    def _fits_deadline(self, name: str) -> bool:
+        """按服务商的延迟中位数判断本次调用能否在截止时间前完成，无法完成的故障转移直接跳过"""
+        remaining = remaining_time()
+        if remaining is None:
+            return True
+        if remaining <= 0:
+            return False
+        p50 = self.latency[name].percentile(50)
+        return p50 is None or p50 <= remaining
+    
+    def _unavailable(self, last_error: Optional[Exception] = None, deadline_skipped: bool = False) -> Exception:
+        """构造无可用服务商异常，retry_after 为最早恢复探测的时间；因截止时间跳过服务商时返回超时异常"""
+        if deadline_skipped:
+            suffix = f"（上一次错误: {last_error}）" if last_error is not None else ""
+            return DeadlineExceededError(f"剩余时间不足以完成上游调用，已放弃重试{suffix}")
+        waits = [breaker.retry_after() for breaker in self.breakers.values()]
+        retry_after = min(waits) if waits else None
+        if last_error is not None:
+            message = f"所有AI服务提供商调用失败: {last_error}"
+        else:
+            message = "所有AI服务提供商均已熔断"
+        return ProviderUnavailableError(message, retry_after=retry_after)
+
+    async def call(self, operation: str, *args, order: Optional[List[str]] = None,
+                   route: Optional["RouteDecision"] = None) -> Any:
+        """
+        调用服务商的非流式方法，失败时故障转移到下一个健康的服务商
+
+        Args:
+            operation: 服务商方法名，如 translate、summarize
+            *args: 方法参数
+            order: 自定义尝试顺序，为空时使用路由决策的顺序或池的默认顺序
+            route: 路由决策，用于记录实际完成请求的目标和EWMA统计
+
+        Returns:
+            第一个成功服务商的返回结果
+
+        Raises:
+            ProviderUnavailableError: 全部服务商熔断或调用失败
+            DeadlineExceededError: 超过请求截止时间，或剩余时间不足以尝试下一个服务商
+            Exception: 请求本身的错误（不可重试的4xx），直接抛出，不故障转移
+        """
+        order = order or (route.order if route else None)
+        tokens = route.tokens if route else 0
+        last_error = None
+        deadline_skipped = False
+        for name in self._candidates(order):
+            breaker = self.breakers[name]
+            if not self._fits_deadline(name):
+                breaker.release()
+                deadline_skipped = True
+                continue
+            start = time.monotonic()
+            try:
+                result = await self.providers[name].invoke(operation, *args)
+            except DeadlineExceededError:
+                # 超时由客户端的截止时间决定，不计入熔断统计，也不再故障转移
+                breaker.release()
+                raise
+            except ConcurrencyLimitExceeded as e:
+                # 本地并发排队失败不代表上游故障，不计入熔断统计
+                breaker.release()
+                logger.warning(f"服务提供商 {name} {e}，尝试下一个服务商")
+                last_error = e
+                continue
+            except Exception as e:
+                if is_client_error(e):
+                    # 请求本身的错误（4xx）不代表服务商故障，换服务商也不会成功
+                    breaker.release()
+                    raise
+                breaker.record_failure(time.monotonic() - start)
+                self.ewma[name].record(None, failed=True)
+                logger.warning(f"服务提供商 {name} 调用 {operation} 失败: {e}，尝试下一个服务商")
+                last_error = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            latency = time.monotonic() - start
+            breaker.record_success(latency)
+            self.latency[name].record(latency)
+            self.ewma[name].record(latency, tokens)
+            if route is not None:
+                route.served_by = name
+            return result
+        raise self._unavailable(last_error, deadline_skipped)
+
+    async def stream(self, operation: str, *args, order: Optional[List[str]] = None,
+                     route: Optional["RouteDecision"] = None) -> AsyncGenerator[str, None]:
+        """
+        调用服务商的流式方法
+
+        只有在输出第一个片段之前出错才会故障转移，已经开始输出后出错直接抛出，
+        慢调用按首个片段的到达时间判定；本生成器被关闭时会同步关闭服务商的流
+
+        Args:
+            operation: 服务商流式方法名，如 translate_stream
+            *args: 方法参数
+            order: 自定义尝试顺序，为空时使用路由决策的顺序或池的默认顺序
+            route: 路由决策，用于记录实际完成请求的目标和EWMA统计
+
+        Yields:
+            结果片段
+        """
+        order = order or (route.order if route else None)
+        last_error = None
+        deadline_skipped = False
+        for name in self._candidates(order):
+            breaker = self.breakers[name]
+            if not self._fits_deadline(name):
+                breaker.release()
+                deadline_skipped = True
+                continue
+            start = time.monotonic()
+            first_chunk_latency = None
+            try:
+                async with aclosing(self.providers[name].invoke_stream(operation, *args)) as stream:
+                    async for chunk in stream:
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - start
+                            self.ewma[name].record_ttft(first_chunk_latency, route.input_tokens if route else 0)
+                            if route is not None:
+                                route.served_by = name
+                        yield chunk
+            except DeadlineExceededError:
+                breaker.release()
+                raise
+            except ConcurrencyLimitExceeded as e:
+                breaker.release()
+                logger.warning(f"服务提供商 {name} {e}，尝试下一个服务商")
+                last_error = e
+                continue
+            except Exception as e:
+                if is_client_error(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure(time.monotonic() - start)
+                self.ewma[name].record(None, failed=True)
+                if first_chunk_latency is not None:
+                    raise
+                logger.warning(f"服务提供商 {name} 调用 {operation} 失败: {e}，尝试下一个服务商")
+                last_error = e
+                continue
+            except BaseException:
+                # 客户端断开等取消场景不计入熔断统计
+                breaker.release()
+                raise
+            latency = first_chunk_latency if first_chunk_latency is not None else time.monotonic() - start
+            breaker.record_success(latency)
+            # 流式调用的总耗时取决于客户端消费速度，延迟只记录首个片段时间（见上），这里只更新错误率
+            self.ewma[name].record(None)
+            return
+        raise self._unavailable(last_error, deadline_skipped)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """所有服务商的熔断器状态"""
+        result = []
+        for name, provider in self.providers.items():
+            p50 = self.latency[name].percentile(50)
+            p95 = self.latency[name].percentile(95)
+            result.append({
+                "provider": name,
+                "model": getattr(provider, "model", None),
+                **self.breakers[name].status(),
+                "latency_p50": round(p50, 3) if p50 is not None else None,
+                "latency_p95": round(p95, 3) if p95 is not None else None,
+                **provider.limiter.metrics(),
+            })
+        return result
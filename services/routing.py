@@ -0,0 +1,281 @@
+"""
+服务商与模型路由
+按输入长度、任务类型、各路由目标的实时EWMA延迟和错误率以及配置的成本权重，
+为每个请求选择服务商+模型，并把路由决策记录到响应元数据中
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config.settings import config
+from utils.logger import logger
+from utils.streaming import estimate_output_tokens
+from utils.text_processor import estimate_tokens
+
+
+@dataclass
+class RouteTarget:
+    """路由目标：服务商 + 模型"""
+
+    key: str
+    provider: str
+    model: str
+    cost_weight: float = 1.0  # 每千token的相对成本
+    max_input_tokens: Optional[int] = None  # 模型可接受的最大输入token数，为空表示不限制
+
+    @classmethod
+    def parse(cls, item: str) -> "RouteTarget":
+        """
+        解析 ROUTING_TARGETS 中的一项
+
+        Args:
+            item: 格式为 provider:model[:cost_weight[:max_input_tokens]]
+
+        Returns:
+            路由目标
+        """
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            raise ValueError(f"路由目标格式错误: {item}")
+        provider, model = parts[0], parts[1]
+        cost_weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        max_input_tokens = int(parts[3]) if len(parts) > 3 and parts[3] else None
+        return cls(f"{provider}:{model}", provider, model, cost_weight, max_input_tokens)
+
+    def fits(self, input_tokens: int) -> bool:
+        """输入长度是否在模型上下文范围内"""
+        return self.max_input_tokens is None or input_tokens <= self.max_input_tokens
+
+
+def configured_targets() -> List[RouteTarget]:
+    """解析配置的路由目标，未配置时返回空列表（每个服务商使用其默认模型）"""
+    return [RouteTarget.parse(item) for item in config.ROUTING_TARGETS]
+
+
+@dataclass
+class RouteDecision:
+    """一次请求的路由决策"""
+
+    task: str
+    policy: str
+    input_tokens: int
+    expected_tokens: int
+    order: List[str]
+    scores: Dict[str, float] = field(default_factory=dict)
+    served_by: Optional[str] = None  # 实际完成请求的路由目标，由服务商池填写
+    stream: bool = False
+
+    @property
+    def tokens(self) -> int:
+        """本次调用的预估总token数（输入 + 输出），用于延迟归一化"""
+        return self.input_tokens + self.expected_tokens
+
+    def metadata(self) -> Dict[str, Any]:
+        """写入响应的路由元数据"""
+        return {
+            "policy": self.policy,
+            "task": self.task,
+            "input_tokens": self.input_tokens,
+            "stream": self.stream,
+            "selected": self.order[0] if self.order else None,
+            "served_by": self.served_by,
+            "candidates": self.order,
+            "scores": {key: round(score, 4) for key, score in self.scores.items()},
+        }
+
+
+class RoutingPolicy:
+    """路由策略基类：为请求返回路由目标的尝试顺序"""
+
+    name = ""
+
+    def rank(self, targets: List[RouteTarget], stats: Dict[str, Any], task: str,
+             input_tokens: int, expected_tokens: int, stream: bool = False) -> Dict[str, float]:
+        """
+        为可用的路由目标打分，分数越低越优先
+
+        Args:
+            targets: 输入长度范围内的路由目标（按配置顺序）
+            stats: 各路由目标的EWMA统计
+            task: 任务类型（translate / summarize）
+            input_tokens: 输入token数
+            expected_tokens: 预估输出token数
+            stream: 是否为流式调用
+
+        Returns:
+            路由目标 -> 分数
+        """
+        raise NotImplementedError
+
+
+class OrderedPolicy(RoutingPolicy):
+    """按配置顺序（故障转移顺序）路由，与未启用路由时的行为一致"""
+
+    name = "ordered"
+
+    def rank(self, targets, stats, task, input_tokens, expected_tokens, stream=False):
+        return {target.key: float(index) for index, target in enumerate(targets)}
+
+
+class CostLatencyPolicy(RoutingPolicy):
+    """
+    按预估延迟、成本和错误率加权打分
+
+    分数 = 延迟权重 × 预估延迟 + 成本权重 × 成本 + 错误惩罚 × EWMA错误率，
+    预估延迟 = 每千token的EWMA延迟 × (1 + 总token数 / 1000)，没有样本时使用默认延迟；
+    流式调用的预估延迟为首个片段时间 = 每千输入token的EWMA TTFT × (1 + 输入token数 / 1000)
+    """
+
+    name = "cost_latency"
+
+    def __init__(self, latency_weight: Optional[float] = None, cost_weight: Optional[float] = None,
+                 error_penalty: Optional[float] = None):
+        self.latency_weight = config.ROUTING_LATENCY_WEIGHT if latency_weight is None else latency_weight
+        self.cost_weight = config.ROUTING_COST_WEIGHT if cost_weight is None else cost_weight
+        self.error_penalty = config.ROUTING_ERROR_PENALTY if error_penalty is None else error_penalty
+
+    def rank(self, targets, stats, task, input_tokens, expected_tokens, stream=False):
+        total_ktokens = (input_tokens + expected_tokens) / 1000.0
+        latency_ktokens = input_tokens / 1000.0 if stream else total_ktokens
+        scores = {}
+        for target in targets:
+            target_stats = stats.get(target.key)
+            latency_per_unit = None
+            error_rate = 0.0
+            if target_stats is not None:
+                latency_per_unit = target_stats.ttft if stream else target_stats.latency
+                error_rate = target_stats.error_rate
+            if latency_per_unit is None:
+                latency_per_unit = config.ROUTING_DEFAULT_LATENCY_SECONDS
+            predicted_latency = latency_per_unit * (1.0 + latency_ktokens)
+            cost = target.cost_weight * total_ktokens
+            scores[target.key] = (self.latency_weight * predicted_latency
+                                  + self.cost_weight * cost
+                                  + self.error_penalty * error_rate)
+        return scores
+
+
+ROUTING_POLICIES = {
+    OrderedPolicy.name: OrderedPolicy,
+    CostLatencyPolicy.name: CostLatencyPolicy,
+}
+
+
+def create_policy(name: str) -> RoutingPolicy:
+    """按名称创建路由策略"""
+    if name not in ROUTING_POLICIES:
+        raise ValueError(f"不支持的路由策略: {name}")
+    return ROUTING_POLICIES[name]()
+
+
+class ProviderRouter:
+    """
+    请求路由器
+
+    路由目标与服务商池中的键一一对应；目标的EWMA统计由服务商池在每次调用后更新
+    """
+
+    def __init__(self, targets: List[RouteTarget], stats: Dict[str, Any], policy: Optional[RoutingPolicy] = None):
+        self.targets = targets
+        self.stats = stats
+        self.policy = policy or create_policy(config.ROUTING_POLICY)
+        self.decisions: Dict[str, int] = {}
+
+    @classmethod
+    def from_pool(cls, pool) -> "ProviderRouter":
+        """按服务商池创建路由器，未在 ROUTING_TARGETS 中配置的池成员使用默认成本且不限制输入长度"""
+        configured = {target.key: target for target in configured_targets()}
+        targets = [
+            configured.get(key) or RouteTarget(key, provider.name, getattr(provider, "model", ""))
+            for key, provider in pool.providers.items()
+        ]
+        return cls(targets, pool.ewma)
+
+    def route(self, task: str, text: str, stream: bool = False) -> RouteDecision:
+        """
+        为请求选择路由目标
+
+        Args:
+            task: 任务类型（translate / summarize）
+            text: 发送给上游的文本
+            stream: 是否为流式调用（按首个片段时间预估延迟）
+
+        Returns:
+            路由决策，order 为按分数排序的尝试顺序（超出上下文的目标不参与，全部超出时保留上下文最大的目标）
+        """
+        return self.decide(task, estimate_tokens(text), stream)
+
+    def decide(self, task: str, input_tokens: int, stream: bool = False) -> RouteDecision:
+        """
+        按输入token数做路由决策（模拟回放时直接使用token数）
+
+        Args:
+            task: 任务类型（translate / summarize）
+            input_tokens: 输入token数
+            stream: 是否为流式调用
+
+        Returns:
+            路由决策
+        """
+        expected_tokens = estimate_output_tokens(task, input_tokens)
+        candidates = [target for target in self.targets if target.fits(input_tokens)]
+        if not candidates and self.targets:
+            candidates = [max(self.targets, key=lambda target: target.max_input_tokens or 0)]
+
+        scores = self.policy.rank(candidates, self.stats, task, input_tokens, expected_tokens, stream)
+        order = sorted(scores, key=scores.get)
+        if order:
+            self.decisions[order[0]] = self.decisions.get(order[0], 0) + 1
+        decision = RouteDecision(task, self.policy.name, input_tokens, expected_tokens, order, scores, stream=stream)
+        record_route(decision)
+        logger.debug("路由决策: %s %s tokens -> %s", task, input_tokens, order)
+        return decision
+
+    def status(self) -> Dict[str, Any]:
+        """路由配置、各目标的EWMA统计和选择次数"""
+        targets = []
+        for target in self.targets:
+            target_stats = self.stats.get(target.key)
+            targets.append({
+                "target": target.key,
+                "provider": target.provider,
+                "model": target.model,
+                "cost_weight": target.cost_weight,
+                "max_input_tokens": target.max_input_tokens,
+                "selected": self.decisions.get(target.key, 0),
+                **(target_stats.status() if target_stats is not None else {}),
+            })
+        return {"policy": self.policy.name, "targets": targets}
+
+
+class RouteCapture:
+    """收集当前请求的路由决策，供接口写入响应元数据"""
+
+    def __init__(self):
+        self.decisions: List[RouteDecision] = []
+
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        """最后一次路由决策的元数据，没有经过路由（如模拟模式）时返回None"""
+        return self.decisions[-1].metadata() if self.decisions else None
+
+
+_capture: ContextVar[Optional[RouteCapture]] = ContextVar("route_capture", default=None)
+
+
+def capture_routes() -> RouteCapture:
+    """
+    开始收集当前请求的路由决策
+
+    在调用AIService之前调用；之后在同一请求（包括其创建的子任务）中产生的路由决策都会记录到返回的对象中
+    """
+    capture = RouteCapture()
+    _capture.set(capture)
+    return capture
+
+
+def record_route(decision: RouteDecision):
+    """记录路由决策到当前请求"""
+    capture = _capture.get()
+    if capture is not None:
+        capture.decisions.append(decision)
@@ -0,0 +1,255 @@
+"""
+上游调用调度器
+在服务商调用之前排队，按优先级通道（交互 > 流式 > 异步）和租户加权公平排队分配上游容量，
+等待过久的请求会被提升以防止饥饿
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from config.settings import config
+from services.provider_pool import LatencyTracker
+from utils.admission import admission_controller
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+from utils.timing import record_span
+from utils.request_context import (
+    LANE_ASYNC, LANE_INTERACTIVE, LANE_STREAM, DeadlineExceededError, check_deadline, remaining_time
+)
+
+# 通道按优先级从高到低排列
+LANES = (LANE_INTERACTIVE, LANE_STREAM, LANE_ASYNC)
+
+
+class _Waiter:
+    """排队中的调用"""
+
+    __slots__ = ("lane", "tenant", "finish_tag", "enqueued_at", "future")
+
+    def __init__(self, lane: str, tenant: str, finish_tag: float, future: asyncio.Future):
+        self.lane = lane
+        self.tenant = tenant
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.future = future
+
+
+class _Lane:
+    """单个优先级通道：租户间按虚拟完成时间加权公平排队"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.heap = []  # (完成标签, 序号, 等待者)
+        self.arrivals = deque()  # 按到达顺序，用于饥饿检测
+        self.virtual_time = 0.0
+        self.tenant_finish: Dict[str, float] = {}
+        self.wait_times = LatencyTracker()
+        self.dispatched = 0
+        self.deadline_expired = 0  # 排队期间超过截止时间而放弃的调用数
+        self.max_wait = 0.0
+
+    def live_head(self) -> Optional[_Waiter]:
+        """到达最早且仍在等待的调用"""
+        while self.arrivals and self.arrivals[0].future.done():
+            self.arrivals.popleft()
+        return self.arrivals[0] if self.arrivals else None
+
+    def pop_fair(self) -> Optional[_Waiter]:
+        """按加权公平顺序取出下一个调用"""
+        while self.heap:
+            _, _, waiter = heapq.heappop(self.heap)
+            if not waiter.future.done():
+                return waiter
+        return None
+
+    def depth(self) -> int:
+        """排队深度"""
+        return sum(1 for waiter in self.arrivals if not waiter.future.done())
+
+
+class WeightedFairScheduler:
+    """加权公平调度器"""
+
+    def __init__(self):
+        self.max_concurrency = config.SCHEDULER_MAX_CONCURRENCY
+        self.starvation_seconds = config.SCHEDULER_STARVATION_SECONDS
+        self.tenant_weights: Dict[str, float] = dict(config.SCHEDULER_TENANT_WEIGHTS)
+        self.in_flight = 0
+        self.starvation_promotions = 0
+        self._lanes = {name: _Lane(name) for name in LANES}
+        self._sequence = itertools.count()
+
+    def configure(self, max_concurrency: Optional[int] = None, starvation_seconds: Optional[float] = None,
+                  tenant_weights: Optional[Dict[str, float]] = None):
+        """
+        运行时调整调度参数
+
+        Args:
+            max_concurrency: 上游总并发容量
+            starvation_seconds: 等待超过该时间的调用优先调度
+            tenant_weights: 租户权重，未列出的租户权重为1
+        """
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        if starvation_seconds is not None:
+            self.starvation_seconds = starvation_seconds
+        if tenant_weights is not None:
+            self.tenant_weights = dict(tenant_weights)
+        logger.info(
+            f"调度器配置已更新: max_concurrency={self.max_concurrency}, "
+            f"starvation_seconds={self.starvation_seconds}, tenant_weights={self.tenant_weights}"
+        )
+        self._dispatch()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """选择下一个要调度的调用：先处理饥饿的调用，再按通道优先级和公平顺序"""
+        now = time.monotonic()
+        oldest = None
+        for lane in self._lanes.values():
+            head = lane.live_head()
+            if head is not None and (oldest is None or head.enqueued_at < oldest.enqueued_at):
+                oldest = head
+        if oldest is None:
+            return None
+        if now - oldest.enqueued_at >= self.starvation_seconds:
+            self.starvation_promotions += 1
+            return oldest
+
+        for name in LANES:
+            waiter = self._lanes[name].pop_fair()
+            if waiter is not None:
+                return waiter
+        return None
+
+    def _dispatch(self):
+        """在容量允许的范围内唤醒排队的调用"""
+        while self._has_capacity():
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            lane = self._lanes[waiter.lane]
+            lane.virtual_time = max(lane.virtual_time, waiter.finish_tag)
+            self._grant(lane, waiter)
+            waiter.future.set_result(None)
+
+    def _grant(self, lane: _Lane, waiter: Optional[_Waiter] = None):
+        """占用一个名额并记录排队时间"""
+        self.in_flight += 1
+        waited = time.monotonic() - waiter.enqueued_at if waiter else 0.0
+        lane.dispatched += 1
+        lane.wait_times.record(waited)
+        lane.max_wait = max(lane.max_wait, waited)
+
+    async def acquire(self, lane: str, tenant: str, cost: float = 1.0):
+        """
+        获取一个上游调用名额
+
+        Args:
+            lane: 工作负载通道
+            tenant: 租户（客户端）标识
+            cost: 调用成本，用于计算加权公平顺序
+            
+        Raises:
+            DeadlineExceededError: 排队期间超过请求截止时间
+        """
+        check_deadline()
+        queue = self._lanes[lane]
+        if self._has_capacity() and not self._has_waiters():
+            self._grant(queue)
+            admission_controller.observe_queue_delay(0.0)
+            record_span("queue", 0.0)
+            return
+
+        if len(queue.tenant_finish) > 1024:
+            # 完成标签落后于虚拟时间的租户不影响排序，可以清理
+            queue.tenant_finish = {
+                name: tag for name, tag in queue.tenant_finish.items() if tag > queue.virtual_time
+            }
+        weight = self.tenant_weights.get(tenant, 1.0)
+        start_tag = max(queue.virtual_time, queue.tenant_finish.get(tenant, 0.0))
+        finish_tag = start_tag + cost / weight
+        queue.tenant_finish[tenant] = finish_tag
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(lane, tenant, finish_tag, future)
+        heapq.heappush(queue.heap, (finish_tag, next(self._sequence), waiter))
+        queue.arrivals.append(waiter)
+        timeout = asyncio.timeout(remaining_time())
+        try:
+            async with timeout:
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, TimeoutError) and timeout.expired():
+                queue.deadline_expired += 1
+                # 排队到截止时间的请求同样计入排队时延，否则最拥塞时反而没有样本
+                admission_controller.observe_queue_delay(time.monotonic() - waiter.enqueued_at)
+                raise DeadlineExceededError("排队期间超过请求截止时间") from e
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        admission_controller.observe_queue_delay(waited)
+        record_span("queue", waited)
+
+    def _has_waiters(self) -> bool:
+        return any(lane.live_head() is not None for lane in self._lanes.values())
+
+    def release(self):
+        """释放名额并调度下一个排队的调用"""
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: str, tenant: str, cost: float = 1.0):
+        """在调度器名额内执行一段代码"""
+        await self.acquire(lane, tenant, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def status(self) -> Dict[str, Any]:
+        """调度器状态和各通道排队时间统计"""
+        lanes = {}
+        for name, lane in self._lanes.items():
+            p50 = lane.wait_times.percentile(50)
+            p95 = lane.wait_times.percentile(95)
+            lanes[name] = {
+                "queue_depth": lane.depth(),
+                "dispatched": lane.dispatched,
+                "deadline_expired": lane.deadline_expired,
+                "queue_wait_p50": round(p50, 4) if p50 is not None else None,
+                "queue_wait_p95": round(p95, 4) if p95 is not None else None,
+                "queue_wait_max": round(lane.max_wait, 4),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "starvation_seconds": self.starvation_seconds,
+            "starvation_promotions": self.starvation_promotions,
+            "tenant_weights": self.tenant_weights,
+            "lanes": lanes,
+        }
+
+
+# 全局调度器实例
+scheduler = WeightedFairScheduler()
+
+CallbackMetric(
+    "scheduler_queue_depth", "调度器各通道排队的上游调用数", ("lane",),
+    lambda: [((name,), lane.depth()) for name, lane in scheduler._lanes.items()]
+)
+CallbackMetric(
+    "scheduler_in_flight", "调度器已分配容量的上游调用数", (),
+    lambda: [((), scheduler.in_flight)]
+)
@@ -0,0 +1,207 @@
+"""
+可续传的流式响应
+流式生成在后台任务中进行，每个SSE事件按事件编号写入短期保存的Redis Stream（Redis不可用时保存在内存），
+客户端通过流ID和 Last-Event-ID 重新连接后从下一个事件继续读取；所有客户端断开超过宽限时间后取消上游生成，
+生成结束后缓冲在 STREAM_RESUME_COMPLETED_TTL_SECONDS 后过期
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+
+from config.settings import config
+from data.redis_keys import RedisKeys
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+from utils.redis_client import redis_client
+from utils.sse import HEARTBEAT_FRAME, SSEEncoder
+
+
+# 每次从缓冲读取的最大事件数
+READ_BATCH_SIZE = 100
+
+
+def _entry_id(event_id: int) -> str:
+    """事件编号对应的Stream记录ID"""
+    return f"0-{event_id}"
+
+
+class BufferedStream:
+    """本进程中正在生成的流"""
+
+    def __init__(self, stream_id: str):
+        self.stream_id = stream_id
+        self.key = RedisKeys.stream_key(stream_id)
+        self.readers = 0
+        self.detached_at = time.monotonic()
+        self.last_id = 0
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """有新事件或生成结束时被设置的事件，每次通知后替换"""
+        return self._changed
+
+    def notify(self):
+        """唤醒等待新事件的读取者"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def attach(self):
+        self.readers += 1
+
+    def detach(self):
+        self.readers -= 1
+        if self.readers == 0:
+            self.detached_at = time.monotonic()
+
+    async def is_disconnected(self) -> bool:
+        """
+        所有客户端断开超过宽限时间
+
+        与 Request.is_disconnected 签名一致，供 cancel_on_disconnect 判断是否取消上游
+        """
+        return self.readers == 0 and time.monotonic() - self.detached_at >= config.STREAM_RESUME_GRACE_SECONDS
+
+
+class StreamBuffer:
+    """可续传流的管理器"""
+
+    def __init__(self):
+        self._local: Dict[str, BufferedStream] = {}
+        self.created = 0
+        self.resumed = 0
+        self.events_buffered = 0
+
+    def create(self) -> BufferedStream:
+        """创建一个新的流"""
+        stream = BufferedStream(uuid.uuid4().hex)
+        self._local[stream.stream_id] = stream
+        self.created += 1
+        return stream
+
+    async def exists(self, stream_id: str) -> bool:
+        """流是否仍可读取（正在生成或缓冲未过期）"""
+        return stream_id in self._local or await redis_client.run(redis_client.exists, RedisKeys.stream_key(stream_id))
+
+    async def _append(self, stream: BufferedStream, event_id: int, fields: Dict[str, str], ttl: int):
+        await redis_client.run(redis_client.stream_append, stream.key, fields, _entry_id(event_id), ttl)
+        stream.last_id = event_id
+        stream.notify()
+
+    def start(self, stream: BufferedStream, encoder: SSEEncoder, frames: AsyncIterator[str]) -> asyncio.Task:
+        """
+        在后台任务中生成流，把每个事件写入缓冲
+
+        Args:
+            stream: create 返回的流
+            encoder: 生成事件使用的编码器，用于获取事件编号
+            frames: SSE帧生成器（心跳帧不写入缓冲，由读取者各自发送）
+
+        Returns:
+            后台任务
+        """
+        stream.task = asyncio.create_task(self._produce(stream, encoder, frames))
+        return stream.task
+
+    async def _produce(self, stream: BufferedStream, encoder: SSEEncoder, frames: AsyncIterator[str]):
+        try:
+            async for frame in frames:
+                if frame == HEARTBEAT_FRAME:
+                    continue
+                await self._append(stream, encoder.last_id, {"frame": frame}, config.STREAM_RESUME_TTL_SECONDS)
+                self.events_buffered += 1
+        except Exception as e:
+            logger.error(f"可续传流 {stream.stream_id} 生成失败: {e}")
+        finally:
+            # 结束标记使用下一个编号，读取者读到后结束响应
+            try:
+                await self._append(stream, stream.last_id + 1, {"end": "1"}, config.STREAM_RESUME_COMPLETED_TTL_SECONDS)
+            finally:
+                stream.done = True
+                self._local.pop(stream.stream_id, None)
+
+    async def subscribe(self, stream_id: str, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """
+        读取流中编号大于 last_event_id 的事件，直到生成结束
+
+        本进程生成的流在有新事件时立即唤醒，其他进程生成的流按 STREAM_RESUME_POLL_SECONDS 轮询；
+        等待期间超过 SSE_HEARTBEAT_SECONDS 没有事件时发送心跳注释
+
+        Args:
+            stream_id: 流ID
+            last_event_id: 客户端最后收到的事件编号
+
+        Yields:
+            SSE帧
+        """
+        stream = self._local.get(stream_id)
+        key = RedisKeys.stream_key(stream_id)
+        if last_event_id:
+            self.resumed += 1
+        if stream is not None:
+            stream.attach()
+        cursor = last_event_id
+        last_sent = time.monotonic()
+        try:
+            while True:
+                changed = stream.changed if stream is not None and not stream.done else None
+                entries = await redis_client.run(redis_client.stream_read, key, _entry_id(cursor + 1), READ_BATCH_SIZE)
+                if entries is None:
+                    # 缓冲已过期（本进程正在生成的流在写入第一个事件前也不存在）
+                    if stream is None or stream.done:
+                        return
+                    entries = []
+                for entry_id, fields in entries:
+                    if "end" in fields:
+                        return
+                    cursor = int(entry_id.partition("-")[2])
+                    yield fields["frame"]
+                    last_sent = time.monotonic()
+                if entries:
+                    continue
+
+                wait = max(0.0, last_sent + config.SSE_HEARTBEAT_SECONDS - time.monotonic())
+                if changed is None:
+                    await asyncio.sleep(min(wait, config.STREAM_RESUME_POLL_SECONDS))
+                else:
+                    try:
+                        async with asyncio.timeout(wait):
+                            await changed.wait()
+                    except TimeoutError:
+                        pass
+                if time.monotonic() - last_sent >= config.SSE_HEARTBEAT_SECONDS:
+                    yield HEARTBEAT_FRAME
+                    last_sent = time.monotonic()
+        finally:
+            if stream is not None:
+                stream.detach()
+
+    def status(self) -> Dict[str, Any]:
+        """可续传流统计"""
+        return {
+            "active": len(self._local),
+            "active_readers": sum(stream.readers for stream in self._local.values()),
+            "created": self.created,
+            "resumed": self.resumed,
+            "events_buffered": self.events_buffered,
+            "grace_seconds": config.STREAM_RESUME_GRACE_SECONDS,
+            "ttl_seconds": config.STREAM_RESUME_TTL_SECONDS,
+            "completed_ttl_seconds": config.STREAM_RESUME_COMPLETED_TTL_SECONDS,
+        }
+
+
+# 全局可续传流管理器
+stream_buffer = StreamBuffer()
+
+CallbackMetric(
+    "stream_resumable_active", "本进程中正在生成的可续传流数", (),
+    lambda: [((), len(stream_buffer._local))]
+)
+CallbackMetric(
+    "stream_resumed_total", "通过 Last-Event-ID 续传的次数", (),
+    lambda: [((), stream_buffer.resumed)], type_name="counter"
+)
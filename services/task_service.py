@@ -1,21 +1,98 @@
 """任务服务 - 处理异步任务管理"""
 import logging
+import time
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 from schemas import TaskResult
-from .ai_service import AIService
+from .ai_providers import is_client_error
+from .ai_service import ai_service
 from utils.redis_client import redis_client
+from utils.text_processor import estimate_tokens
 from config import config
 from data.redis_keys import RedisKeys
+from utils.request_context import DeadlineExceededError
 
 logger = logging.getLogger(__name__)
 
 
+class PartialResultWriter:
+    """
+    把后台任务的流式输出按节流间隔写入任务记录
+    
+    轮询任务的客户端可以在任务完成前看到 partial_result 和 progress；
+    进度按已输出token数与预估输出token数之比计算，完成前最多显示99%
+    
+    流式调用没有对冲，且开始输出后出错不再故障转移；因此输出中途失败时可以改用非流式调用
+    （带对冲和完整的故障转移）重新执行一次，代价是已生成的部分被丢弃、重新计费
+    
+    Args:
+        task_result: 处理中状态的任务记录，写入时更新其部分结果和进度
+        expected_tokens: 预估的完整输出token数
+        interval: 两次写入的最小间隔（秒），为空时使用 TASK_PARTIAL_UPDATE_SECONDS
+    """
+    
+    def __init__(self, task_result: TaskResult, expected_tokens: int, interval: Optional[float] = None):
+        self.task_result = task_result
+        self.expected_tokens = max(expected_tokens, 1)
+        self.interval = config.TASK_PARTIAL_UPDATE_SECONDS if interval is None else interval
+        self.parts: List[str] = []
+        self.writes = 0
+        self.restarted = False
+        self._last_write = time.monotonic()
+    
+    @property
+    def text(self) -> str:
+        """目前为止的输出"""
+        return "".join(self.parts)
+    
+    async def consume(self, chunks: AsyncIterator[str],
+                      restart: Optional[Callable[[], Awaitable[str]]] = None) -> str:
+        """
+        读取流式输出，按节流间隔写入部分结果
+        
+        Args:
+            chunks: 流式输出片段
+            restart: 已有输出后流式调用失败时重新执行的非流式调用；超过截止时间或请求本身的错误（4xx）不重新执行
+            
+        Returns:
+            完整输出
+        """
+        try:
+            async for chunk in chunks:
+                self.parts.append(chunk)
+                if time.monotonic() - self._last_write >= self.interval:
+                    await self.flush()
+        except Exception as e:
+            # 开始输出之前的错误已经由提供商池故障转移过，重新执行也不会成功
+            if restart is None or not self.parts or isinstance(e, DeadlineExceededError) or is_client_error(e):
+                raise
+            logger.warning(f"任务 {self.task_result.task_id} 的流式输出中途失败: {e}，改用非流式调用重新执行")
+            self.restarted = True
+            return await restart()
+        return self.text
+    
+    async def flush(self):
+        """把当前的部分结果和进度写入任务记录"""
+        partial = self.text
+        progress = min(99.0, estimate_tokens(partial) * 100.0 / self.expected_tokens)
+        self.task_result.partial_result = partial
+        self.task_result.progress = round(progress, 1)
+        # 同步Redis客户端的写入放到工作线程中执行，节流写入不阻塞事件循环
+        await redis_client.run(
+            redis_client.set_json,
+            RedisKeys.task_key(self.task_result.task_id),
+            self.task_result.model_dump(mode="json"),
+            ex=config.TASK_EXPIRE_SECONDS
+        )
+        self.writes += 1
+        self._last_write = time.monotonic()
+
+
 class TaskService:
     """任务服务类，处理异步任务管理"""
     
     def __init__(self):
-        self.ai_service = AIService()
+        self.ai_service = ai_service
     
     def create_task(self, task_id: str, task_result: TaskResult):
         """创建任务"""
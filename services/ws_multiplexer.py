@@ -0,0 +1,359 @@
+"""
+WebSocket多路复用
+一个WebSocket连接上并发执行多个带任务ID的翻译/总结/实时翻译任务，各任务的流式片段按任务ID交错返回；
+每个连接限制并发任务数，支持取消消息，客户端读取缓慢时通过有界发送队列把背压传递到上游流；
+对客户端消息的直接回复（accepted/error）走单独的控制队列优先发送，不受数据队列背压影响，
+接收循环因此不会被阻塞，取消消息总能及时处理
+"""
+
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from typing import Any, Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from config.settings import config
+from schemas.requests import LiveTranslationRequest, SummaryRequest, TranslationRequest
+from services.ai_service import ai_service
+from services.live_translation import LiveTranslationSession
+from services.routing import capture_routes
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+from utils.request_context import LANE_STREAM, request_timeout_for, set_deadline, set_lane
+
+# 任务类型 -> (请求模型, 超时使用的接口路径)
+JOB_TYPES = {
+    "translate": (TranslationRequest, "/api/translate/stream"),
+    "summarize": (SummaryRequest, "/api/summarize/stream"),
+}
+
+
+class WebSocketStats:
+    """WebSocket连接与任务统计"""
+
+    def __init__(self):
+        self.connections = 0
+        self.active_connections = 0
+        self.jobs_started = 0
+        self.jobs_completed = 0
+        self.jobs_cancelled = 0
+        self.jobs_failed = 0
+        self.jobs_rejected = 0
+        self.messages_sent = 0
+        self.backpressure_waits = 0  # 发送队列已满、任务等待客户端读取的次数
+        self.slow_consumer_closes = 0  # 控制队列已满（客户端只发不收）而关闭的连接数
+        self.live_inputs_rejected = 0  # 输入队列已满而拒绝的 live_text 消息数
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "active_connections": self.active_connections,
+            "jobs_started": self.jobs_started,
+            "jobs_completed": self.jobs_completed,
+            "jobs_cancelled": self.jobs_cancelled,
+            "jobs_failed": self.jobs_failed,
+            "jobs_rejected": self.jobs_rejected,
+            "jobs_in_progress": self.jobs_started - self.jobs_completed - self.jobs_cancelled - self.jobs_failed,
+            "messages_sent": self.messages_sent,
+            "backpressure_waits": self.backpressure_waits,
+            "slow_consumer_closes": self.slow_consumer_closes,
+            "live_inputs_rejected": self.live_inputs_rejected,
+            "max_jobs_per_connection": config.WS_MAX_CONCURRENT_JOBS,
+            "send_queue_size": config.WS_SEND_QUEUE_SIZE,
+        }
+
+
+# 全局WebSocket统计实例
+ws_stats = WebSocketStats()
+
+CallbackMetric(
+    "websocket_active_connections", "当前的WebSocket连接数", (),
+    lambda: [((), ws_stats.active_connections)]
+)
+CallbackMetric(
+    "websocket_jobs_total", "WebSocket任务数（按结果）", ("outcome",),
+    lambda: [((outcome,), getattr(ws_stats, f"jobs_{outcome}"))
+             for outcome in ("started", "completed", "cancelled", "failed", "rejected")],
+    type_name="counter"
+)
+CallbackMetric(
+    "websocket_backpressure_waits_total", "WebSocket发送队列已满、任务等待客户端读取的次数", (),
+    lambda: [((), ws_stats.backpressure_waits)], type_name="counter"
+)
+
+
+class SlowConsumerError(Exception):
+    """客户端持续发送消息但不读取回复，控制队列已满"""
+
+
+class MultiplexSession:
+    """
+    一个WebSocket连接上的多路复用会话
+
+    客户端消息:
+        {"type": "translate", "id": "j1", "text": "...", "source_lang": "英文", "target_lang": "中文"}
+        {"type": "summarize", "id": "j2", "text": "...", "compress": false}
+        {"type": "cancel", "id": "j1"}
+        {"type": "live", "id": "l1", "source_lang": "英文", "target_lang": "中文"}
+        {"type": "live_text", "id": "l1", "text": "Hello wor"}
+        {"type": "live_end", "id": "l1"}
+
+    服务端消息（均带任务ID）:
+        accepted / chunk（content）/ done（result、routing）/ cancelled / error（message）
+        实时翻译另有 sentence / sentence_done / sentence_error，chunk 带句子编号 index
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.jobs: Dict[str, asyncio.Task] = {}
+        self.live_inputs: Dict[str, asyncio.Queue] = {}
+        self._cancel_requested: Set[str] = set()
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=config.WS_SEND_QUEUE_SIZE)
+        self._control: asyncio.Queue = asyncio.Queue(maxsize=config.WS_SEND_QUEUE_SIZE)
+        self._wakeup = asyncio.Event()
+
+    async def run(self):
+        """接收客户端消息直到连接断开，断开后取消所有未完成的任务"""
+        ws_stats.connections += 1
+        ws_stats.active_connections += 1
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+                text = message.get("text")
+                if text is None:
+                    self.reply({"type": "error", "id": None, "message": "只支持文本消息"})
+                    continue
+                await self._handle(text)
+        except WebSocketDisconnect:
+            logger.info(f"WebSocket连接断开，取消 {len(self.jobs)} 个未完成的任务")
+        except SlowConsumerError:
+            ws_stats.slow_consumer_closes += 1
+            logger.warning(f"WebSocket客户端不读取回复，关闭连接并取消 {len(self.jobs)} 个未完成的任务")
+            try:
+                await self.websocket.close(code=1008)
+            except Exception:
+                pass
+        finally:
+            ws_stats.active_connections -= 1
+            tasks = list(self.jobs.values())
+            for task in tasks:
+                task.cancel()
+            sender.cancel()
+            await asyncio.gather(*tasks, sender, return_exceptions=True)
+
+    async def _send_loop(self):
+        """发送队列中的消息，控制消息优先；客户端读取缓慢时发送阻塞，数据队列随之填满"""
+        while True:
+            if not self._control.empty():
+                message = self._control.get_nowait()
+            elif not self._outbox.empty():
+                message = self._outbox.get_nowait()
+            else:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+            ws_stats.messages_sent += 1
+
+    async def send(self, message: Dict[str, Any]):
+        """任务把数据消息放入发送队列，队列已满时等待（背压）"""
+        if self._outbox.full():
+            ws_stats.backpressure_waits += 1
+        await self._outbox.put(message)
+        self._wakeup.set()
+
+    def reply(self, message: Dict[str, Any]):
+        """
+        接收循环对客户端消息的直接回复，放入控制队列后立即返回
+
+        Raises:
+            SlowConsumerError: 控制队列已满（客户端只发送不读取），连接将被关闭
+        """
+        try:
+            self._control.put_nowait(message)
+        except asyncio.QueueFull:
+            raise SlowConsumerError() from None
+        self._wakeup.set()
+
+    async def _handle(self, raw: str):
+        """处理一条客户端消息"""
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            self.reply({"type": "error", "id": None, "message": "消息不是有效的JSON"})
+            return
+        if not isinstance(message, dict):
+            self.reply({"type": "error", "id": None, "message": "消息必须是JSON对象"})
+            return
+
+        job_id = message.get("id")
+        kind = message.get("type")
+        if kind == "cancel":
+            await self._cancel(job_id)
+        elif kind in JOB_TYPES:
+            await self._start(job_id, kind, message)
+        elif kind == "live":
+            await self._start_live(job_id, message)
+        elif kind in ("live_text", "live_end"):
+            await self._live_input(job_id, kind, message)
+        else:
+            self.reply({"type": "error", "id": job_id, "message": f"不支持的消息类型: {kind}"})
+
+    async def _accept_job_id(self, job_id: Optional[str]) -> bool:
+        """检查任务ID和并发任务数，不能启动时发送 error 消息"""
+        if not job_id or not isinstance(job_id, str):
+            self.reply({"type": "error", "id": None, "message": "任务缺少字符串类型的id"})
+            return False
+        if job_id in self.jobs:
+            self.reply({"type": "error", "id": job_id, "message": "任务ID已在执行中"})
+            return False
+        if len(self.jobs) >= config.WS_MAX_CONCURRENT_JOBS:
+            ws_stats.jobs_rejected += 1
+            self.reply({
+                "type": "error", "id": job_id,
+                "message": f"连接的并发任务数已达上限 {config.WS_MAX_CONCURRENT_JOBS}"
+            })
+            return False
+        return True
+
+    async def _start(self, job_id: Optional[str], kind: str, message: Dict[str, Any]):
+        """校验并启动一个任务"""
+        if not await self._accept_job_id(job_id):
+            return
+
+        model, path = JOB_TYPES[kind]
+        try:
+            request = model(**message)
+        except ValidationError as e:
+            self.reply({"type": "error", "id": job_id, "message": f"参数错误: {e.errors()}"})
+            return
+
+        ws_stats.jobs_started += 1
+        timeout_value = message.get("timeout")
+        timeout = request_timeout_for(path, str(timeout_value) if timeout_value is not None else None)
+        self.jobs[job_id] = asyncio.create_task(self._run_job(job_id, kind, request, timeout))
+        self.reply({"type": "accepted", "id": job_id})
+
+    async def _cancel(self, job_id: Optional[str]):
+        """取消任务，任务结束后发送 cancelled 消息"""
+        task = self.jobs.get(job_id)
+        if task is None:
+            self.reply({"type": "error", "id": job_id, "message": "任务不存在或已结束"})
+            return
+        self._cancel_requested.add(job_id)
+        task.cancel()
+
+    async def _run_job(self, job_id: str, kind: str, request, timeout: float):
+        """执行任务，把流式片段按任务ID发送给客户端"""
+        set_lane(LANE_STREAM)
+        set_deadline(time.time() + timeout)
+        routes = capture_routes()
+        parts = []
+        if kind == "translate":
+            source = ai_service.translate_stream(request.text, request.source_lang, request.target_lang)
+        else:
+            source = ai_service.summarize_stream(request.text, request.compress, request.token_budget)
+        try:
+            async with aclosing(source) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    await self.send({"type": "chunk", "id": job_id, "content": chunk})
+            ws_stats.jobs_completed += 1
+            await self.send({"type": "done", "id": job_id, "result": "".join(parts), "routing": routes.metadata()})
+        except asyncio.CancelledError:
+            ws_stats.jobs_cancelled += 1
+            if job_id not in self._cancel_requested:
+                raise
+            # 客户端取消：上游已随生成器关闭，通知客户端后正常结束
+            await self.send({"type": "cancelled", "id": job_id})
+        except Exception as e:
+            ws_stats.jobs_failed += 1
+            logger.error(f"WebSocket任务 {job_id} 失败: {e}")
+            await self.send({"type": "error", "id": job_id, "message": str(e)})
+        finally:
+            self.jobs.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+
+    async def _start_live(self, job_id: Optional[str], message: Dict[str, Any]):
+        """启动实时翻译任务，之后由 live_text / live_end 消息提供输入"""
+        if not await self._accept_job_id(job_id):
+            return
+        try:
+            request = LiveTranslationRequest(**message)
+        except ValidationError as e:
+            self.reply({"type": "error", "id": job_id, "message": f"参数错误: {e.errors()}"})
+            return
+
+        ws_stats.jobs_started += 1
+        timeout_value = message.get("timeout")
+        session = LiveTranslationSession(request.source_lang, request.target_lang,
+                                         str(timeout_value) if timeout_value is not None else None)
+        # 输入先放入有界队列再由任务送入会话，会话背压时不阻塞本连接的消息接收；
+        # 多留一个位置，保证结束标记总能放入
+        inputs: asyncio.Queue = asyncio.Queue(maxsize=config.LIVE_MAX_PENDING_SENTENCES + 1)
+        self.live_inputs[job_id] = inputs
+        self.jobs[job_id] = asyncio.create_task(self._run_live(job_id, session, inputs))
+        self.reply({"type": "accepted", "id": job_id})
+
+    async def _live_input(self, job_id: Optional[str], kind: str, message: Dict[str, Any]):
+        """
+        把实时翻译的输入文本或结束标记放入任务的输入队列
+
+        输入队列已有 LIVE_MAX_PENDING_SENTENCES 段文本时不接收新的文本，回复 backpressure 错误，
+        客户端应稍后重发该段文本
+        """
+        inputs = self.live_inputs.get(job_id)
+        if inputs is None:
+            self.reply({"type": "error", "id": job_id, "message": "实时翻译任务不存在或输入已结束"})
+            return
+        if kind == "live_end":
+            self.live_inputs.pop(job_id, None)
+            inputs.put_nowait(None)
+            return
+        text = message.get("text")
+        if not isinstance(text, str):
+            self.reply({"type": "error", "id": job_id, "message": "live_text 缺少字符串类型的text"})
+            return
+        if inputs.qsize() >= config.LIVE_MAX_PENDING_SENTENCES:
+            ws_stats.live_inputs_rejected += 1
+            self.reply({
+                "type": "error", "id": job_id, "code": "backpressure",
+                "message": f"实时翻译输入积压已达上限 {config.LIVE_MAX_PENDING_SENTENCES}，本段文本未接收，请稍后重发"
+            })
+            return
+        inputs.put_nowait(text)
+
+    async def _run_live(self, job_id: str, session: LiveTranslationSession, inputs: asyncio.Queue):
+        """执行实时翻译任务，按句子顺序把事件发送给客户端"""
+
+        async def feed():
+            while True:
+                text = await inputs.get()
+                if text is None:
+                    await session.end()
+                    return
+                await session.feed(text)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            async for event in session.events():
+                await self.send({**event, "id": job_id})
+            ws_stats.jobs_completed += 1
+        except asyncio.CancelledError:
+            ws_stats.jobs_cancelled += 1
+            if job_id not in self._cancel_requested:
+                raise
+            await self.send({"type": "cancelled", "id": job_id})
+        finally:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+            await session.close()
+            self.live_inputs.pop(job_id, None)
+            self.jobs.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
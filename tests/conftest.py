@@ -0,0 +1,28 @@
+"""
+测试公共配置
+并发组件的测试直接构造组件实例并在测试内覆盖阈值参数，不依赖 .env 中的取值；
+需要控制时间的测试用 FakeClock 替换模块中的 time
+"""
+
+import pytest
+
+
+class FakeClock:
+    """可手动推进的时钟，同时提供 monotonic() 和 time()"""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
@@ -0,0 +1,112 @@
+"""熔断器状态转换测试"""
+
+import pytest
+
+from services import provider_pool
+from services.provider_pool import CircuitBreaker
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(provider_pool, "time", clock)
+    breaker = CircuitBreaker("test")
+    breaker.window_seconds = 30
+    breaker.min_requests = 4
+    breaker.error_rate_threshold = 0.5
+    breaker.slow_call_seconds = 10
+    breaker.slow_call_rate_threshold = 0.8
+    breaker.open_seconds = 20
+    breaker.half_open_probes = 1
+    return breaker
+
+
+def test_stays_closed_below_min_requests(breaker):
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_when_error_rate_reaches_threshold(breaker):
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_opens_on_slow_call_rate(breaker):
+    for _ in range(4):
+        breaker.record_success(12)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_events_outside_window_are_pruned(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.advance(31)
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def _open(breaker):
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_moves_to_half_open_after_open_seconds(breaker, clock):
+    _open(breaker)
+    clock.advance(5)
+    assert breaker.retry_after() == pytest.approx(15)
+    assert not breaker.allow_request()
+    clock.advance(15)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 只有一个探测名额
+    assert not breaker.allow_request()
+
+
+def test_half_open_success_closes(breaker, clock):
+    _open(breaker)
+    clock.advance(20)
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    # 恢复后窗口重新统计，之前的失败不再计入
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("failed, latency", [(True, 0.1), (False, 12)])
+def test_half_open_failure_or_slow_call_reopens(breaker, clock, failed, latency):
+    _open(breaker)
+    clock.advance(20)
+    assert breaker.allow_request()
+    if failed:
+        breaker.record_failure(latency)
+    else:
+        breaker.record_success(latency)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == pytest.approx(20)
+
+
+def test_release_frees_half_open_probe(breaker, clock):
+    _open(breaker)
+    clock.advance(20)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_results_while_open_are_ignored(breaker, clock):
+    _open(breaker)
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,134 @@
+"""AIMD并发限制器测试"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from services import ai_providers
+from services.ai_providers import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded
+from utils.request_context import DeadlineExceededError
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    monkeypatch.setattr(ai_providers, "time", clock)
+    limiter = AdaptiveConcurrencyLimiter("test")
+    limiter.limit = 4.0
+    limiter.min_limit = 1
+    limiter.max_limit = 8
+    limiter.backoff_ratio = 0.5
+    limiter.latency_threshold = 10
+    limiter.backoff_cooldown = 5
+    limiter.max_queue = 2
+    limiter.queue_timeout = 0.2
+    return limiter
+
+
+def _fill(limiter, count):
+    for _ in range(count):
+        asyncio.run(limiter.acquire())
+
+
+def test_additive_increase_when_saturated(limiter):
+    _fill(limiter, 2)
+    limiter.release(0.5)
+    assert limiter.limit == pytest.approx(4.25)
+    assert limiter.in_flight == 1
+
+
+def test_no_increase_below_half_utilisation(limiter):
+    _fill(limiter, 1)
+    limiter.release(0.5)
+    assert limiter.limit == 4.0
+
+
+def test_no_increase_for_slow_calls(limiter):
+    _fill(limiter, 4)
+    limiter.release(11)
+    assert limiter.limit == 4.0
+
+
+def test_increase_capped_at_max_limit(limiter):
+    limiter.limit = 8.0
+    _fill(limiter, 8)
+    limiter.release(0.5)
+    assert limiter.limit == 8.0
+
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError(), httpx.ReadTimeout("timeout")])
+def test_multiplicative_decrease_on_timeout(limiter, clock, error):
+    clock.advance(100)
+    _fill(limiter, 1)
+    limiter.release(5, error)
+    assert limiter.limit == 2.0
+    assert limiter.backoffs == 1
+
+
+def test_decrease_once_per_backoff_window(limiter, clock):
+    clock.advance(100)
+    _fill(limiter, 4)
+    limiter.release(1, asyncio.TimeoutError())
+    limiter.release(1, asyncio.TimeoutError())
+    assert limiter.limit == 2.0
+    clock.advance(4)
+    limiter.release(1, asyncio.TimeoutError())
+    assert limiter.limit == 2.0
+    clock.advance(1)
+    limiter.release(1, asyncio.TimeoutError())
+    assert limiter.limit == 1.0
+    assert limiter.backoffs == 2
+
+
+def test_decrease_floored_at_min_limit(limiter, clock):
+    limiter.limit = 1.0
+    clock.advance(100)
+    _fill(limiter, 1)
+    limiter.release(1, asyncio.TimeoutError())
+    assert limiter.limit == 1.0
+
+
+@pytest.mark.parametrize("error", [DeadlineExceededError("deadline"), ValueError("bad request")])
+def test_other_errors_do_not_change_limit(limiter, clock, error):
+    clock.advance(100)
+    _fill(limiter, 4)
+    limiter.release(1, error)
+    assert limiter.limit == 4.0
+    assert limiter.in_flight == 3
+
+
+def test_waiters_are_woken_on_release():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("test")
+        limiter.limit = 1.0
+        limiter.max_queue = 2
+        limiter.queue_timeout = 1
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        limiter.release(20)
+        await asyncio.wait_for(waiter, 1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_full_and_queue_timeout_raise():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("test")
+        limiter.limit = 1.0
+        limiter.max_queue = 1
+        limiter.queue_timeout = 0.05
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceeded):
+            await queued
+        assert limiter.rejected == 1
+        assert limiter.queue_timeouts == 1
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,150 @@
+"""加权公平调度器测试：通道优先级、租户权重、饥饿提升和排队截止时间"""
+
+import asyncio
+import time
+
+import pytest
+
+from services.scheduler import WeightedFairScheduler
+from utils.request_context import (
+    LANE_ASYNC, LANE_INTERACTIVE, LANE_STREAM, DeadlineExceededError, set_deadline
+)
+
+
+def _scheduler(max_concurrency: int = 1, starvation_seconds: float = 60.0, tenant_weights=None):
+    scheduler = WeightedFairScheduler()
+    scheduler.max_concurrency = max_concurrency
+    scheduler.starvation_seconds = starvation_seconds
+    scheduler.tenant_weights = dict(tenant_weights or {})
+    return scheduler
+
+
+async def _queue(scheduler, order, label, lane, tenant="t", cost=1.0):
+    """排队获取名额，获得后记录标签并立即释放（下一个排队的调用随之获得名额）"""
+    await scheduler.acquire(lane, tenant, cost)
+    order.append(label)
+    scheduler.release()
+
+
+async def _run_queued(scheduler, requests):
+    """占住唯一的名额，让所有请求排队后再释放，返回获得名额的顺序"""
+    order = []
+    await scheduler.acquire(LANE_INTERACTIVE, "holder")
+    tasks = []
+    for label, lane, tenant, cost in requests:
+        tasks.append(asyncio.create_task(_queue(scheduler, order, label, lane, tenant, cost)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    return order
+
+
+def test_immediate_grant_with_capacity():
+    async def scenario():
+        scheduler = _scheduler(max_concurrency=2)
+        await scheduler.acquire(LANE_ASYNC, "a")
+        await scheduler.acquire(LANE_ASYNC, "b")
+        assert scheduler.in_flight == 2
+        scheduler.release()
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_lanes_dispatch_in_priority_order():
+    async def scenario():
+        scheduler = _scheduler()
+        return await _run_queued(scheduler, [
+            ("async", LANE_ASYNC, "t", 1.0),
+            ("stream", LANE_STREAM, "t", 1.0),
+            ("interactive", LANE_INTERACTIVE, "t", 1.0),
+        ])
+
+    assert asyncio.run(scenario()) == ["interactive", "stream", "async"]
+
+
+def test_tenants_share_lane_by_weight():
+    async def scenario():
+        scheduler = _scheduler(tenant_weights={"heavy": 2.0})
+        requests = [(f"heavy{i}", LANE_ASYNC, "heavy", 1.0) for i in range(6)]
+        requests += [(f"light{i}", LANE_ASYNC, "light", 1.0) for i in range(6)]
+        return await _run_queued(scheduler, requests)
+
+    order = asyncio.run(scenario())
+    # 权重2的租户在前6个名额中得到4个，没有因为先到达而独占
+    first = order[:6]
+    assert sum(label.startswith("heavy") for label in first) == 4
+    assert sum(label.startswith("light") for label in first) == 2
+
+
+def test_cost_counts_against_tenant_share():
+    async def scenario():
+        scheduler = _scheduler()
+        requests = [("big", LANE_ASYNC, "a", 4.0), ("big2", LANE_ASYNC, "a", 4.0)]
+        requests += [(f"small{i}", LANE_ASYNC, "b", 1.0) for i in range(4)]
+        return await _run_queued(scheduler, requests)
+
+    order = asyncio.run(scenario())
+    assert order.index("big2") > order.index("small3")
+
+
+def test_starving_waiter_is_promoted():
+    async def scenario():
+        scheduler = _scheduler(starvation_seconds=0.05)
+        order = []
+        await scheduler.acquire(LANE_INTERACTIVE, "holder")
+        old = asyncio.create_task(_queue(scheduler, order, "async", LANE_ASYNC))
+        await asyncio.sleep(0.1)
+        newer = [asyncio.create_task(_queue(scheduler, order, f"interactive{i}", LANE_INTERACTIVE))
+                 for i in range(3)]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(asyncio.gather(old, *newer), 5)
+        return order, scheduler.starvation_promotions
+
+    order, promotions = asyncio.run(scenario())
+    assert order[0] == "async"
+    assert promotions >= 1
+
+
+def test_without_starvation_lower_lane_waits():
+    async def scenario():
+        scheduler = _scheduler(starvation_seconds=60)
+        return await _run_queued(scheduler, [
+            ("async", LANE_ASYNC, "t", 1.0),
+            *[(f"interactive{i}", LANE_INTERACTIVE, "t", 1.0) for i in range(3)],
+        ])
+
+    assert asyncio.run(scenario())[-1] == "async"
+
+
+def test_deadline_expires_while_queued():
+    async def scenario():
+        scheduler = _scheduler()
+        await scheduler.acquire(LANE_INTERACTIVE, "holder")
+        set_deadline(time.time() + 0.05)
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.acquire(LANE_ASYNC, "late")
+        set_deadline(None)
+        assert scheduler.status()["lanes"][LANE_ASYNC]["deadline_expired"] == 1
+        # 放弃排队的调用不占用名额，释放后下一个调用立即获得
+        scheduler.release()
+        await asyncio.wait_for(scheduler.acquire(LANE_ASYNC, "next"), 1)
+        assert scheduler.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_capacity():
+    async def scenario():
+        scheduler = _scheduler()
+        await scheduler.acquire(LANE_INTERACTIVE, "holder")
+        waiter = asyncio.create_task(scheduler.acquire(LANE_STREAM, "gone"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+"""增量断句器测试"""
+
+import pytest
+
+from utils.sentence_segmenter import SentenceSegmenter
+
+
+def _feed_all(parts, max_chars=200):
+    segmenter = SentenceSegmenter(max_chars)
+    sentences = []
+    for part in parts:
+        sentences.extend(segmenter.feed(part))
+    return sentences, segmenter
+
+
+@pytest.mark.parametrize("text, expected, pending", [
+    ("你好。世界！", ["你好。", "世界！"], ""),
+    ("等等……然后", ["等等……"], "然后"),
+    ("Hello world. How", ["Hello world."], " How"),
+    ("Really?! Yes", ["Really?!"], " Yes"),
+    ("line one\nline two", ["line one"], "line two"),
+])
+def test_terminators(text, expected, pending):
+    sentences, segmenter = _feed_all([text])
+    assert sentences == expected
+    assert segmenter.pending == pending
+
+
+def test_english_period_at_end_waits_for_more_input():
+    sentences, segmenter = _feed_all(["Hello world."])
+    assert sentences == []
+    assert segmenter.feed(" Next") == ["Hello world."]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Pi is 3.14 exactly. Next", ["Pi is 3.14 exactly."]),
+    ("Mr. Smith arrived. Then", ["Mr. Smith arrived."]),
+    ("See fig. 3 for details. Then", ["See fig. 3 for details."]),
+    ("J. K. Rowling wrote it. Then", ["J. K. Rowling wrote it."]),
+])
+def test_decimals_abbreviations_and_initials_do_not_split(text, expected):
+    assert _feed_all([text])[0] == expected
+
+
+def test_pronoun_i_is_not_an_initial():
+    assert _feed_all(["So did I. Then"])[0] == ["So did I."]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("他说：“你好。”然后", ["他说：“你好。”"]),
+    ('She said "Hi." Then', ['She said "Hi."']),
+])
+def test_closing_quotes_attach_to_previous_sentence(text, expected):
+    assert _feed_all([text])[0] == expected
+
+
+def test_open_quote_at_end_waits_for_closer():
+    sentences, segmenter = _feed_all(["他说：“你好。"])
+    assert sentences == []
+    assert segmenter.feed("”好的。") == ["他说：“你好。”", "好的。"]
+
+
+def test_sentences_split_across_fragments():
+    sentences, segmenter = _feed_all(["Hello wor", "ld. Nex", "t one? Yes"])
+    assert sentences == ["Hello world.", "Next one?"]
+    assert segmenter.flush() == "Yes"
+
+
+def test_fragment_boundary_inside_terminator_run():
+    sentences, _ = _feed_all(["Wait.", "..", " What?", "! Ok"])
+    assert sentences == ["Wait...", "What?!"]
+
+
+def test_force_split_prefers_soft_break():
+    sentences, segmenter = _feed_all(["aaaa bbbb, cccc"], max_chars=12)
+    assert sentences == ["aaaa bbbb,"]
+    assert segmenter.pending == "cccc"
+
+
+def test_force_split_without_soft_break_cuts_at_max_chars():
+    sentences, segmenter = _feed_all(["abcdefghij"], max_chars=4)
+    assert sentences == ["abcd", "efgh"]
+    assert segmenter.pending == "ij"
+
+
+def test_flush_returns_remainder_and_resets():
+    _, segmenter = _feed_all(["  trailing text  "])
+    assert segmenter.flush() == "trailing text"
+    assert segmenter.flush() is None
+    assert segmenter.pending == ""
+
+
+@pytest.mark.parametrize("parts", [[""], ["   "], ["\n\n"]])
+def test_empty_and_whitespace_input(parts):
+    sentences, segmenter = _feed_all(parts)
+    assert sentences == []
+    assert segmenter.flush() is None
@@ -0,0 +1,237 @@
+"""
+准入控制与负载卸载
+按接口统计在途请求数、处理速率和调度排队时延，当实测排队时延超过SLO的一定比例时
+直接返回 503 + Retry-After，避免请求堆积到客户端超时后才失败
+
+只按排队时延卸载：在途请求数/处理速率是请求的整个处理时间（长时间的流式请求会使其很大），
+并不代表新请求需要等待的时间
+"""
+
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from config import config
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+
+
+def _retry_after_seconds(excess: float, rate: float) -> int:
+    """按处理速率计算排空多余工作所需的秒数，限制在 [1, ADMISSION_MAX_RETRY_AFTER]"""
+    if rate <= 0:
+        return config.ADMISSION_MAX_RETRY_AFTER
+    return max(1, min(config.ADMISSION_MAX_RETRY_AFTER, math.ceil(max(1.0, excess) / rate)))
+
+
+class _DrainRate:
+    """每秒完成数的EWMA估计，按秒滚动计数"""
+
+    def __init__(self):
+        self.rate = 0.0
+        self._bucket_start = time.monotonic()
+        self._bucket_completions = 0
+
+    def tick(self):
+        """记录一次完成"""
+        self._bucket_completions += 1
+        self.roll()
+
+    def roll(self):
+        """超过一秒时把当前计数折算进EWMA"""
+        now = time.monotonic()
+        elapsed = now - self._bucket_start
+        if elapsed < 1.0:
+            return
+        rate = self._bucket_completions / elapsed
+        alpha = config.ADMISSION_EWMA_ALPHA
+        self.rate = rate if self.rate == 0.0 else alpha * rate + (1 - alpha) * self.rate
+        self._bucket_start = now
+        self._bucket_completions = 0
+
+
+class _EndpointStats:
+    """单个接口的准入统计"""
+
+    def __init__(self, path: str, slo_seconds: float):
+        self.path = path
+        self.slo_seconds = slo_seconds
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.drain = _DrainRate()
+        self.queue_delay = 0.0  # 调度排队时延（EWMA）
+        self._queue_delay_at = 0.0
+
+    def on_complete(self):
+        self.in_flight -= 1
+        self.drain.tick()
+
+    def observe_queue_delay(self, seconds: float):
+        alpha = config.ADMISSION_EWMA_ALPHA
+        self.queue_delay = alpha * seconds + (1 - alpha) * self.queue_delay
+        self._queue_delay_at = time.monotonic()
+
+    def current_queue_delay(self) -> float:
+        """
+        当前排队时延估计
+
+        卸载期间没有新请求进入调度器，超过一个SLO周期没有新样本时视为已排空，
+        放行请求重新测量，避免一直停留在卸载状态
+        """
+        if time.monotonic() - self._queue_delay_at > self.slo_seconds:
+            self.queue_delay = 0.0
+        return self.queue_delay
+
+    def should_shed(self) -> bool:
+        """是否需要拒绝新请求"""
+        if self.in_flight < config.ADMISSION_MIN_IN_FLIGHT:
+            return False
+        return self.current_queue_delay() > self.slo_seconds * config.ADMISSION_QUEUE_DELAY_RATIO
+
+    def retry_after(self) -> int:
+        """按当前排队时延估算的重试等待秒数"""
+        return max(1, min(config.ADMISSION_MAX_RETRY_AFTER, math.ceil(self.queue_delay)))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "drain_rate": round(self.drain.rate, 3),
+            "queue_delay": round(self.current_queue_delay(), 4),
+            "slo_seconds": self.slo_seconds,
+        }
+
+
+_current_endpoint: ContextVar[Optional[_EndpointStats]] = ContextVar("admission_endpoint", default=None)
+
+
+class AdmissionController:
+    """准入控制器：接口级负载卸载和异步任务积压限制"""
+
+    def __init__(self):
+        self.enabled = config.ADMISSION_ENABLED
+        self.endpoints: Dict[str, _EndpointStats] = {}
+        self.task_backlog = 0
+        self.task_backlog_rejected = 0
+        self._task_drain = _DrainRate()
+
+    def _endpoint(self, path: str) -> _EndpointStats:
+        stats = self.endpoints.get(path)
+        if stats is None:
+            slo = config.ADMISSION_ENDPOINT_SLOS.get(path, config.ADMISSION_SLO_SECONDS)
+            stats = self.endpoints[path] = _EndpointStats(path, slo)
+        return stats
+
+    def try_admit(self, path: str) -> Optional[_EndpointStats]:
+        """
+        尝试接纳一个请求
+
+        Returns:
+            接纳时返回接口统计对象（请求结束后需调用 on_complete），拒绝时返回None
+        """
+        stats = self._endpoint(path)
+        if self.enabled and stats.should_shed():
+            stats.rejected += 1
+            return None
+        stats.in_flight += 1
+        stats.admitted += 1
+        _current_endpoint.set(stats)
+        return stats
+
+    def observe_queue_delay(self, seconds: float):
+        """服务层钩子：记录当前请求在调度器中的排队时延"""
+        stats = _current_endpoint.get()
+        if stats is not None:
+            stats.observe_queue_delay(seconds)
+
+    def check_task_backlog(self):
+        """
+        服务层钩子：提交异步任务前检查积压
+
+        Raises:
+            HTTPException: 积压超过上限时返回503和Retry-After
+        """
+        if not self.enabled or self.task_backlog < config.ADMISSION_MAX_TASK_BACKLOG:
+            return
+        self.task_backlog_rejected += 1
+        self._task_drain.roll()
+        excess = self.task_backlog - config.ADMISSION_MAX_TASK_BACKLOG + 1
+        retry_after = _retry_after_seconds(excess, self._task_drain.rate)
+        logger.warning(f"异步任务积压 {self.task_backlog} 超过上限，拒绝提交，Retry-After={retry_after}s")
+        raise HTTPException(
+            status_code=503,
+            detail="任务队列繁忙，请稍后重试",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def task_submitted(self):
+        """异步任务进入积压"""
+        self.task_backlog += 1
+
+    def task_finished(self):
+        """异步任务执行结束（无论成功失败）"""
+        self.task_backlog -= 1
+        self._task_drain.tick()
+
+    def status(self) -> Dict[str, Any]:
+        """准入控制状态"""
+        return {
+            "enabled": self.enabled,
+            "task_backlog": self.task_backlog,
+            "task_backlog_limit": config.ADMISSION_MAX_TASK_BACKLOG,
+            "task_backlog_rejected": self.task_backlog_rejected,
+            "task_drain_rate": round(self._task_drain.rate, 3),
+            "endpoints": {path: stats.status() for path, stats in self.endpoints.items()},
+        }
+
+
+# 全局准入控制器实例
+admission_controller = AdmissionController()
+
+CallbackMetric(
+    "task_backlog", "已提交但尚未结束的异步任务数", (),
+    lambda: [((), admission_controller.task_backlog)]
+)
+CallbackMetric(
+    "admission_rejected_total", "准入控制拒绝（负载卸载）的请求数", ("route",),
+    lambda: [((path,), stats.rejected) for path, stats in admission_controller.endpoints.items()],
+    type_name="counter"
+)
+
+
+class AdmissionControlMiddleware:
+    """准入控制中间件（纯ASGI实现），只作用于配置的AI接口"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in config.ADMISSION_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = admission_controller.try_admit(scope["path"])
+        if stats is None:
+            endpoint = admission_controller.endpoints[scope["path"]]
+            retry_after = endpoint.retry_after()
+            logger.warning(
+                f"负载卸载: {scope['path']} 在途 {endpoint.in_flight}，"
+                f"排队时延 {endpoint.queue_delay:.1f}s 超过SLO，Retry-After={retry_after}s"
+            )
+            response = JSONResponse(
+                status_code=503,
+                headers={"Retry-After": str(retry_after)},
+                content={"success": False, "message": "服务繁忙，请稍后重试"}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stats.on_complete()
@@ -0,0 +1,24 @@
+"""
+管理接口鉴权
+管理接口需要在请求头 X-Admin-Token 中携带与 ADMIN_TOKEN 配置一致的令牌
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from config import config
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    校验管理令牌的FastAPI依赖
+
+    Raises:
+        HTTPException: 未配置ADMIN_TOKEN时返回404，令牌错误时返回401
+    """
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="管理接口未启用")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
@@ -3,10 +3,15 @@
 提供统一的异常处理和错误响应
 """
 
+import math
+
 from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from utils.logger import logger
+from services.provider_pool import ProviderUnavailableError
+from utils.logger import logger, truncate_for_log
+from utils.request_context import DeadlineExceededError
 
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -20,23 +25,70 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     Returns:
         JSONResponse: 格式化的错误响应
     """
-    logger.error(f"请求验证失败: {request.url}")
-    logger.error(f"验证错误详情: {exc.errors()}")
+    logger.error("请求验证失败: %s", request.url)
+    logger.error("验证错误详情: %s", truncate_for_log(str(exc.errors())))
     
-    # 安全地获取请求体，避免编码问题
+    # 安全地获取请求体，避免编码问题；请求体可能很长，只记录开头部分
     try:
         body = await request.body()
         body_str = body.decode('utf-8', errors='replace')
-        logger.error(f"请求体: {body_str}")
+        logger.error("请求体: %s", truncate_for_log(body_str))
     except Exception as e:
-        logger.error(f"无法读取请求体: {e}")
+        logger.error("无法读取请求体: %s", e)
     
     return JSONResponse(
         status_code=422,
         content={
             "success": False,
             "message": "请求参数验证失败",
-            "errors": exc.errors()
+            # 自定义校验器的错误上下文中包含异常对象，需要转换后才能序列化
+            "errors": jsonable_encoder(exc.errors())
+        }
+    )
+
+
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailableError):
+    """
+    AI服务提供商不可用处理器
+    
+    Args:
+        request: FastAPI请求对象
+        exc: 服务提供商不可用异常
+        
+    Returns:
+        JSONResponse: 503响应，附带Retry-After头
+    """
+    logger.error(f"AI服务提供商不可用: {request.url} - {exc}")
+    retry_after = max(1, math.ceil(exc.retry_after or 0))
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "success": False,
+            "message": "AI服务暂时不可用，请稍后重试",
+            "error": str(exc)
+        }
+    )
+
+
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    """
+    请求截止时间超时处理器
+    
+    Args:
+        request: FastAPI请求对象
+        exc: 截止时间超时异常
+        
+    Returns:
+        JSONResponse: 504响应
+    """
+    logger.warning(f"请求超过截止时间: {request.url} - {exc}")
+    return JSONResponse(
+        status_code=504,
+        content={
+            "success": False,
+            "message": "请求处理超时",
+            "error": str(exc)
         }
     )
 
@@ -49,3 +101,5 @@ def register_error_handlers(app):
         app: FastAPI应用实例
     """
     app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_exception_handler(ProviderUnavailableError, provider_unavailable_handler)
+    app.add_exception_handler(DeadlineExceededError, deadline_exceeded_handler)
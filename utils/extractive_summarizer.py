@@ -0,0 +1,292 @@
+"""
+抽取式预压缩工具模块
+在调用大模型总结之前，基于句子TF-IDF与TextRank挑选最重要的句子，
+在给定token预算内压缩输入，减少发送给上游的token数量
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+from scipy import sparse
+
+from utils.text_processor import estimate_tokens
+
+# 句子切分：中文句末标点和换行直接切分，英文句末标点后需跟空白
+_CJK_SPLIT_PATTERN = re.compile(r'(?<=[。！？；])|\n+')
+_ENGLISH_SPLIT_PATTERN = re.compile(r'(?<=[.!?])\s+')
+_EN_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_CJK_RUN_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]+')
+# 中日韩文字和全角标点：与这类字符相邻的句子直接拼接，其余句子之间加空格
+_CJK_BOUNDARY_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+# 常见英文停用词，避免虚词主导相似度
+_STOPWORDS = frozenset(
+    "a an the and or but if of to in on at for with by from as is are was were be been "
+    "being it its this that these those he she they we you i his her their our your "
+    "not no so than then there here which who whom what when where why how all any "
+    "can could will would should may might must do does did has have had".split()
+)
+
+
+@dataclass
+class ExtractionResult:
+    """抽取结果"""
+    text: str
+    original_tokens: int
+    compressed_tokens: int
+    selected_indices: List[int] = field(default_factory=list)
+    sentence_count: int = 0
+
+    @property
+    def compressed(self) -> bool:
+        """是否发生了压缩"""
+        return self.compressed_tokens < self.original_tokens
+
+    @property
+    def reduction_ratio(self) -> float:
+        """token减少比例"""
+        if not self.original_tokens:
+            return 0.0
+        return 1.0 - self.compressed_tokens / self.original_tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    将文本切分为句子，同时支持中英文标点
+
+    Args:
+        text: 要切分的文本
+
+    Returns:
+        句子列表（已去除首尾空白，过滤空句）
+    """
+    if not text:
+        return []
+
+    sentences = []
+    for part in _CJK_SPLIT_PATTERN.split(text):
+        for sentence in _ENGLISH_SPLIT_PATTERN.split(part):
+            sentence = sentence.strip()
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+
+def join_sentences(sentences: List[str]) -> str:
+    """拼接句子：边界任一侧是中文字符或全角标点时直接相连，否则以空格分隔"""
+    if not sentences:
+        return ""
+    parts = [sentences[0]]
+    for previous, sentence in zip(sentences, sentences[1:]):
+        if not (_CJK_BOUNDARY_PATTERN.match(previous[-1]) or _CJK_BOUNDARY_PATTERN.match(sentence[0])):
+            parts.append(" ")
+        parts.append(sentence)
+    return "".join(parts)
+
+
+def tokenize_sentence(sentence: str) -> List[str]:
+    """句子分词：英文按单词，中文按字符二元组"""
+    lowered = sentence.lower()
+    terms = [w for w in _EN_TOKEN_PATTERN.findall(lowered) if w not in _STOPWORDS]
+    for run in _CJK_RUN_PATTERN.findall(sentence):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def build_tfidf_matrix(sentences: List[str], max_features: int = 4096) -> sparse.csr_matrix:
+    """
+    构建按行L2归一化的稀疏句子TF-IDF矩阵
+
+    Args:
+        sentences: 句子列表
+        max_features: 词表上限，按文档频率保留最常见的词项
+
+    Returns:
+        形状为 (句子数, 词项数) 的float32 CSR矩阵
+    """
+    vocabulary = {}
+    rows = []
+    cols = []
+    for row, sentence in enumerate(sentences):
+        for term in tokenize_sentence(sentence):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+
+    n_sentences = len(sentences)
+    if not cols:
+        return sparse.csr_matrix((n_sentences, 0), dtype=np.float32)
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    n_terms = len(vocabulary)
+
+    # 每个(句子, 词项)组合的词频（COO格式，只保存非零项）
+    pairs, counts = np.unique(rows * n_terms + cols, return_counts=True)
+    rows, cols = pairs // n_terms, pairs % n_terms
+    df = np.bincount(cols, minlength=n_terms)
+
+    # 超出词表上限时只保留文档频率最高的词项
+    if n_terms > max_features:
+        keep = np.argsort(-df, kind="stable")[:max_features]
+        remap = np.full(n_terms, -1, dtype=np.int64)
+        remap[keep] = np.arange(keep.size)
+        cols = remap[cols]
+        mask = cols >= 0
+        rows, cols, counts = rows[mask], cols[mask], counts[mask]
+        df = df[keep]
+        n_terms = keep.size
+
+    idf = np.log((1.0 + n_sentences) / (1.0 + df)).astype(np.float32) + 1.0
+    values = np.log1p(counts).astype(np.float32) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=values.astype(np.float64) ** 2, minlength=n_sentences))
+    norms[norms == 0] = 1.0
+    values /= norms[rows].astype(np.float32)
+    return sparse.csr_matrix((values, (rows, cols)), shape=(n_sentences, n_terms), dtype=np.float32)
+
+
+def sparse_similarity_graph(tfidf: sparse.csr_matrix, top_k: int = 10, threshold: float = 0.05,
+                            block_rows: int = 512):
+    """
+    构建稀疏的句子相似度图（COO格式）
+
+    每个句子只保留相似度最高的 top_k 个邻居，并丢弃低于阈值的边。
+    相似度按行分块做稀疏矩阵乘法，内存占用与非零相似度的数量成正比，不构建 n×n 稠密矩阵
+
+    Args:
+        tfidf: 行归一化的稀疏TF-IDF矩阵
+        top_k: 每个句子保留的邻居数
+        threshold: 最小相似度
+        block_rows: 每次相乘的行数
+
+    Returns:
+        (rows, cols, weights) 三个一维数组
+    """
+    n = tfidf.shape[0]
+    k = min(top_k, n - 1)
+    if k <= 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    transposed = tfidf.T.tocsr()
+    edge_rows, edge_cols, edge_weights = [], [], []
+    for start in range(0, n, block_rows):
+        block = (tfidf[start:start + block_rows] @ transposed).tocoo()
+        rows = block.row.astype(np.int64) + start
+        cols = block.col.astype(np.int64)
+        weights = block.data
+        mask = (rows != cols) & (weights > threshold)
+        rows, cols, weights = rows[mask], cols[mask], weights[mask]
+
+        # 每行按相似度降序排列，保留前 k 个
+        order = np.lexsort((-weights, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        rank = np.arange(rows.size) - np.searchsorted(rows, rows, side="left")
+        keep = rank < k
+        edge_rows.append(rows[keep])
+        edge_cols.append(cols[keep])
+        edge_weights.append(weights[keep])
+
+    return (np.concatenate(edge_rows), np.concatenate(edge_cols),
+            np.concatenate(edge_weights).astype(np.float32))
+
+
+def textrank_scores(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, n: int,
+                    damping: float = 0.85, max_iter: int = 50, tol: float = 1e-6) -> np.ndarray:
+    """
+    在稀疏图上用幂迭代计算TextRank得分
+
+    Args:
+        rows: 边起点
+        cols: 边终点
+        weights: 边权重
+        n: 节点数
+        damping: 阻尼系数
+        max_iter: 最大迭代次数
+        tol: 收敛阈值
+
+    Returns:
+        每个句子的得分
+    """
+    scores = np.full(n, 1.0 / n, dtype=np.float64)
+    if weights.size == 0:
+        return scores
+
+    # 对称化后按出度归一化，得到转移概率
+    src = np.concatenate([rows, cols])
+    dst = np.concatenate([cols, rows])
+    w = np.concatenate([weights, weights]).astype(np.float64)
+    out_weight = np.bincount(src, weights=w, minlength=n)
+    transition = w / out_weight[src]
+
+    base = (1.0 - damping) / n
+    for _ in range(max_iter):
+        updated = base + damping * np.bincount(dst, weights=transition * scores[src], minlength=n)
+        if np.abs(updated - scores).sum() < tol:
+            return updated
+        scores = updated
+    return scores
+
+
+def compress_text(text: str, token_budget: int, top_k: int = 10) -> ExtractionResult:
+    """
+    按token预算抽取最重要的句子
+
+    文本本身未超出预算时原样返回；否则按TextRank得分从高到低选句，
+    直到达到预算，再按原文顺序拼接以保持可读性
+
+    Args:
+        text: 原始文本
+        token_budget: token预算
+        top_k: 相似度图中每个句子保留的邻居数
+
+    Returns:
+        ExtractionResult 抽取结果
+
+    Raises:
+        ValueError: token_budget 不大于0
+    """
+    if token_budget <= 0:
+        raise ValueError(f"token_budget 必须大于0: {token_budget}")
+    original_tokens = estimate_tokens(text)
+    if original_tokens <= token_budget:
+        return ExtractionResult(text, original_tokens, original_tokens)
+
+    sentences = split_sentences(text)
+    if len(sentences) < 2:
+        return ExtractionResult(text, original_tokens, original_tokens, sentence_count=len(sentences))
+
+    tfidf = build_tfidf_matrix(sentences)
+    rows, cols, weights = sparse_similarity_graph(tfidf, top_k=top_k)
+    scores = textrank_scores(rows, cols, weights, len(sentences))
+
+    sentence_tokens = np.fromiter((estimate_tokens(s) for s in sentences), dtype=np.int64, count=len(sentences))
+    order = np.argsort(-scores, kind="stable")
+
+    selected = []
+    used = 0
+    for index in order:
+        cost = int(sentence_tokens[index])
+        if used + cost > token_budget:
+            continue
+        selected.append(int(index))
+        used += cost
+
+    if not selected:
+        # 单句就超出预算时至少保留得分最高的一句
+        selected = [int(order[0])]
+        used = int(sentence_tokens[order[0]])
+
+    selected.sort()
+    compressed = join_sentences([sentences[i] for i in selected])
+    return ExtractionResult(
+        text=compressed,
+        original_tokens=original_tokens,
+        compressed_tokens=used,
+        selected_indices=selected,
+        sentence_count=len(sentences),
+    )
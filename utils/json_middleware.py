@@ -5,12 +5,14 @@ JSON清理中间件
 
 import json
 import re
+import time
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request as StarletteRequest
 
 from utils.logger import logger
+from utils.timing import record_span
 from utils.text_processor import TextProcessor
 
 
@@ -20,6 +22,7 @@ class JSONCleanupMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         """处理请求的主要逻辑"""
         if request.headers.get("content-type", "").startswith("application/json"):
+            start = time.perf_counter()
             body = await request.body()
             try:
                 # 先尝试解析JSON看是否有问题
@@ -29,6 +32,7 @@ class JSONCleanupMiddleware(BaseHTTPMiddleware):
                 try:
                     json.loads(body_str)
                     # 如果解析成功，直接使用原始请求体
+                    record_span("json_cleanup", time.perf_counter() - start)
                     response = await call_next(request)
                     return response
                 except json.JSONDecodeError:
@@ -90,6 +94,7 @@ class JSONCleanupMiddleware(BaseHTTPMiddleware):
                 # 创建新的请求对象
                 new_request = StarletteRequest(scope, receive)
                 
+                record_span("json_cleanup", time.perf_counter() - start)
                 response = await call_next(new_request)
                 return response
                 
@@ -1,27 +1,209 @@
-"""日志配置工具"""
+"""
+日志配置工具
+日志在调用线程中只做过滤和入队（QueueHandler），格式化和写入 stdout 由后台监听线程完成，
+终端或日志收集器写入缓慢时不会阻塞事件循环；LOG_FORMAT=json 时每行输出一个JSON对象，
+附带当前请求的trace ID、span ID和客户端标识，可与 /debug/traces 的链路关联。
+热路径上使用 %s 占位符传参（logger.debug("...%s", value)），级别未启用时不做任何格式化；
+参数全部是字符串、数字等不可变标量时，格式化推迟到监听线程，参数中有列表、字典、异常等其他对象时
+在调用线程中立即格式化（对象入队后可能被修改，监听线程看到的会是修改后的内容）；
+异常堆栈同样在调用线程中渲染为文本，队列中的记录不持有 traceback 及其栈帧。
+每个流式片段一条的DEBUG日志通过 debug_sampled 按比例采样
+"""
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional, TextIO, Tuple
 
+from config.settings import config
 
-def setup_logger(name: str = __name__, level: int = logging.INFO) -> logging.Logger:
-    """设置日志配置"""
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 可以推迟到监听线程格式化的参数类型
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+def truncate_for_log(text: str, limit: Optional[int] = None) -> str:
+    """
+    截断写入日志的长文本（请求体、模型输出等）
+
+    Args:
+        text: 原文本
+        limit: 最大字符数，为空时使用 LOG_MAX_BODY_CHARS
+
+    Returns:
+        不超过限制的文本，截断时注明原长度
+    """
+    limit = config.LOG_MAX_BODY_CHARS if limit is None else limit
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（已截断，共 {len(text)} 字符）"
+
+
+def debug_sampled(log: logging.Logger, msg: str, *args):
+    """
+    记录高频的DEBUG日志（如每个流式片段一条）
+
+    级别未启用时立即返回；启用时按 LOG_DEBUG_SAMPLE_RATE 采样，采样判断在创建日志记录之前，
+    未采中的调用几乎没有开销
+
+    Args:
+        log: 日志器
+        msg: %s 占位符格式的消息
+        args: 消息参数
+    """
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    rate = config.LOG_DEBUG_SAMPLE_RATE
+    if rate >= 1 or random.random() < rate:
+        log.debug(msg, *args, stacklevel=2)
+
+
+_context_getters: Optional[Tuple[Callable, Callable]] = None
+
+
+def _get_context_getters() -> Optional[Tuple[Callable, Callable]]:
+    """延迟导入链路追踪和请求上下文（两者都依赖本模块）"""
+    global _context_getters
+    if _context_getters is None:
+        try:
+            from utils.request_context import get_client_id
+            from utils.tracing import get_current_span
+        except ImportError:
+            return None
+        _context_getters = (get_current_span, get_client_id)
+    return _context_getters
+
+
+class ContextFilter(logging.Filter):
+    """在记录日志的线程中附加请求上下文（contextvars 在监听线程中不可见，必须在入队前读取）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        getters = _get_context_getters()
+        span = getters[0]() if getters else None
+        record.trace_id = span.trace_id if span is not None else None
+        record.span_id = span.span_id if span is not None else None
+        record.client_id = getters[1]() if getters else None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("trace_id", "span_id", "client_id"):
+            value = getattr(record, key, None)
+            if value:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+_exception_formatter = logging.Formatter()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """队列已满时丢弃日志并计数，不阻塞调用线程"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        入队前只固定可能变化的内容，消息格式化尽量留给监听线程
+
+        默认实现在调用线程中格式化消息并清除 exc_info 和参数，既把格式化开销留在了调用线程，
+        也使监听线程的格式化器拿不到异常信息（JSON日志缺少 exception 字段）；
+        这里参数都是不可变标量时只复制记录，否则立即格式化消息；异常堆栈渲染为 exc_text
+        （文本和JSON格式化器都直接使用）后清除 exc_info，释放 traceback 引用的栈帧
+        """
+        record = copy.copy(record)
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogListener(QueueListener):
+    """后台写入线程；停止时等待队列有空位再放入结束标记，保证已入队的日志全部写出"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def create_handler(stream: TextIO, log_format: str = "text",
+                   use_queue: bool = True) -> Tuple[logging.Handler, Optional[QueueListener]]:
+    """
+    创建日志处理器
+
+    Args:
+        stream: 输出流
+        log_format: text 或 json
+        use_queue: 是否通过队列由后台线程写入
+
+    Returns:
+        (挂到日志器上的处理器, 后台监听器)，不使用队列时监听器为None，使用队列时监听器已启动
+    """
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JSONFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    if not use_queue:
+        handler, listener = output, None
+    else:
+        handler = _DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+        listener = _LogListener(handler.queue, output, respect_handler_level=True)
+        listener.start()
+    handler.addFilter(ContextFilter())
+    return handler, listener
+
+
+def setup_logger(name: str = __name__, level: Optional[int] = None) -> logging.Logger:
+    """
+    设置日志配置
+
+    Args:
+        name: 日志器名称
+        level: 日志级别，为空时使用 LOG_LEVEL
+    """
     logger = logging.getLogger(name)
-    
+
     if not logger.handlers:
-        # 创建控制台处理器
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(level)
-        
-        # 创建格式器
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        console_handler.setFormatter(formatter)
-        
-        # 添加处理器到日志器
-        logger.addHandler(console_handler)
+        if level is None:
+            level = logging.getLevelName(config.LOG_LEVEL.upper())
+            if not isinstance(level, int):
+                level = logging.INFO
+        handler, listener = create_handler(sys.stdout, config.LOG_FORMAT, config.LOG_QUEUE_ENABLED)
+        if listener is not None:
+            # 进程退出时写完队列中剩余的日志
+            atexit.register(listener.stop)
+        logger.addHandler(handler)
         logger.setLevel(level)
-    
+
     return logger
 
 
@@ -0,0 +1,140 @@
+"""
+事件循环延迟监控
+事件循环中的同步阻塞调用（同步Redis命令、文件IO、CPU密集计算）会让所有请求一起停顿。
+探测协程按固定间隔睡眠，实际唤醒时间比预期晚的部分即调度延迟，持续记录到直方图；
+看门狗线程在探测协程超过阈值仍未唤醒时（事件循环正被阻塞）抓取事件循环线程的调用栈并写入日志，
+日志中的栈顶就是正在阻塞的代码
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from config.settings import config
+from utils.logger import logger
+from utils.metrics import CallbackMetric, Histogram
+
+# 调度延迟的桶（秒），正常情况下在1ms以内
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+event_loop_lag_seconds = Histogram(
+    "event_loop_lag_seconds", "事件循环调度延迟（探测协程比预期晚唤醒的时间）", buckets=LAG_BUCKETS)
+
+# 日志中保留的栈帧数（最内层）
+_STACK_LIMIT = 30
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    Args:
+        interval: 探测间隔（秒）
+        threshold: 延迟超过该值时视为阻塞，看门狗抓取调用栈
+    """
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        self.interval = config.LOOP_LAG_INTERVAL_SECONDS if interval is None else interval
+        self.threshold = config.LOOP_LAG_THRESHOLD_SECONDS if threshold is None else threshold
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.recent_stalls: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._captured = False  # 本次阻塞是否已抓取调用栈
+        self._stack: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._probe is not None and not self._probe.done()
+
+    def start(self):
+        """在事件循环线程中启动探测协程和看门狗线程"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._probe = asyncio.create_task(self._probe_loop())
+        self._watchdog = threading.Thread(target=self._watchdog_loop, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环延迟监控已启动: 探测间隔 {self.interval}s，阻塞阈值 {self.threshold}s")
+
+    async def stop(self):
+        """停止探测协程和看门狗线程"""
+        self._stop.set()
+        if self._probe is not None:
+            self._probe.cancel()
+            await asyncio.gather(self._probe, return_exceptions=True)
+            self._probe = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _probe_loop(self):
+        """按间隔睡眠，记录实际唤醒时间与预期的差"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self._heartbeat = now
+            event_loop_lag_seconds.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self._record_stall(lag)
+            self._captured = False
+            self._stack = None
+
+    def _record_stall(self, lag: float):
+        """事件循环恢复后记录一次阻塞（调用栈由看门狗在阻塞期间抓取）"""
+        self.stalls += 1
+        self.recent_stalls.append({
+            "at": datetime.now().isoformat(),
+            "lag_ms": round(lag * 1000, 1),
+            "stack": self._stack,
+        })
+        logger.warning(f"事件循环阻塞 {lag * 1000:.0f}ms（阈值 {self.threshold * 1000:.0f}ms）")
+
+    def _watchdog_loop(self):
+        """看门狗线程：探测协程超过阈值未唤醒时抓取事件循环线程的调用栈，每次阻塞只抓取一次"""
+        check_interval = max(min(self.interval, self.threshold) / 2, 0.01)
+        while not self._stop.wait(check_interval):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold or self._captured:
+                continue
+            self._captured = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=_STACK_LIMIT))
+            self._stack = stack
+            logger.warning(f"事件循环已阻塞 {blocked * 1000:.0f}ms，事件循环线程调用栈:\n{stack}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "recent_stalls": list(self.recent_stalls),
+        }
+
+
+# 全局事件循环延迟监控实例
+loop_monitor = LoopLagMonitor()
+
+CallbackMetric(
+    "event_loop_stalls_total", "事件循环调度延迟超过阈值的次数", (),
+    lambda: [((), loop_monitor.stalls)], type_name="counter"
+)
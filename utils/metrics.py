@@ -0,0 +1,319 @@
+"""
+Prometheus指标
+进程内聚合的计数器、仪表和直方图，GET /metrics 以Prometheus文本格式导出；
+直方图使用固定的桶计数（不保存样本），标签组合的子项在第一次使用时创建并缓存，
+热路径上的调用方持有子项直接观测，每次观测只做计数累加；
+已有的统计对象（流式统计、调度器、熔断器等）通过回调在导出时读取，不重复计数
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认的延迟桶（秒），覆盖Redis命令到长文本生成
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 回调指标返回的样本: (标签值元组, 数值)
+Sample = Tuple[Tuple[str, ...], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class CounterChild:
+    """计数器的一个标签组合"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class GaugeChild:
+    """仪表的一个标签组合"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class HistogramChild:
+    """直方图的一个标签组合：每个桶一个计数（非累积，导出时累加）"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    """带标签的指标，子项按标签值缓存"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry or metrics_registry).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """获取标签组合的子项（第一次使用时创建），热路径上应缓存返回值"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增的计数器"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        """无标签计数器累加"""
+        self.labels().inc(amount)
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._children.items()]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        """无标签仪表赋值"""
+        self.labels().set(value)
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._children.items()]
+
+
+class Histogram(_Metric):
+    """固定桶的直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["MetricsRegistry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """无标签直方图观测"""
+        self.labels().observe(value)
+
+    def collect(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    导出时通过回调读取数值的指标，用于导出已有的统计对象
+
+    Args:
+        callback: 返回 (标签值元组, 数值) 序列的函数
+        type_name: counter 或 gauge
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Sample]], type_name: str = "gauge",
+                 registry: Optional["MetricsRegistry"] = None):
+        self.callback = callback
+        self.type_name = type_name
+        super().__init__(name, documentation, labelnames, registry)
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+                for values, value in self.callback()]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.collect()
+            except Exception as e:
+                # 回调出错时跳过该指标，不影响其他指标的导出
+                lines.append(f"# {metric.name} 导出失败: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+# 接口请求
+http_requests_total = Counter(
+    "http_requests_total", "HTTP请求数", ("method", "route", "status"))
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（流式接口为整个响应的时间）", ("method", "route"))
+
+# 上游调用
+upstream_requests_total = Counter(
+    "ai_upstream_requests_total", "上游服务商调用次数（每次尝试）", ("provider", "operation", "outcome"))
+upstream_request_duration_seconds = Histogram(
+    "ai_upstream_request_duration_seconds", "上游调用耗时（流式调用为整个流的时间）", ("provider", "operation"))
+upstream_ttft_seconds = Histogram(
+    "ai_upstream_time_to_first_token_seconds", "流式调用到第一个片段的时间", ("provider", "operation"))
+upstream_stream_chunks_total = Counter(
+    "ai_upstream_stream_chunks_total", "上游流式片段数", ("provider", "operation"))
+
+# Redis
+redis_command_duration_seconds = Histogram(
+    "redis_command_duration_seconds", "Redis命令耗时", ("command",))
+
+
+class UpstreamMetrics:
+    """一个服务商的一种调用的指标子项"""
+    __slots__ = ("ok", "error", "cancelled", "duration", "ttft", "chunks")
+
+    def __init__(self, provider: str, operation: str):
+        self.ok = upstream_requests_total.labels(provider, operation, "ok")
+        self.error = upstream_requests_total.labels(provider, operation, "error")
+        self.cancelled = upstream_requests_total.labels(provider, operation, "cancelled")
+        self.duration = upstream_request_duration_seconds.labels(provider, operation)
+        self.ttft = upstream_ttft_seconds.labels(provider, operation)
+        self.chunks = upstream_stream_chunks_total.labels(provider, operation)
+
+
+_upstream: Dict[str, Dict[str, UpstreamMetrics]] = {}
+
+
+def upstream_metrics(provider: str, operation: str) -> UpstreamMetrics:
+    """获取服务商某种调用的指标子项（按服务商和调用缓存，查找时不创建标签元组）"""
+    by_operation = _upstream.get(provider)
+    if by_operation is None:
+        by_operation = _upstream[provider] = {}
+    metrics = by_operation.get(operation)
+    if metrics is None:
+        metrics = by_operation[operation] = UpstreamMetrics(provider, operation)
+    return metrics
+
+
+_redis_commands: Dict[str, HistogramChild] = {}
+
+
+def observe_redis_command(command: str, seconds: float):
+    """记录一次Redis命令耗时"""
+    child = _redis_commands.get(command)
+    if child is None:
+        child = _redis_commands[command] = redis_command_duration_seconds.labels(command.lower())
+    child.observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    接口请求指标中间件（纯ASGI实现，不影响流式响应）
+
+    按路由模板（而不是实际路径）统计请求数和耗时，避免路径参数导致标签数量无限增长；
+    耗时从收到请求到响应体发送完毕
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests_total.labels(method, path, str(status)).inc()
+            http_request_duration_seconds.labels(method, path).observe(time.perf_counter() - start)
@@ -0,0 +1,210 @@
+"""
+按需性能分析
+CPU：采样线程按固定间隔读取所有线程的调用栈（sys._current_frames），统计每个调用栈出现的次数，
+输出折叠栈格式（flamegraph.pl、speedscope 可直接读取）和按函数汇总的热点，不需要重新部署或重启；
+内存：通过 tracemalloc 记录分配位置，启动时保存基线快照，之后与基线比较找出增长最多的分配位置
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.logger import logger
+
+# 项目根目录，栈帧的文件路径相对它显示
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 空闲等待的栈顶函数 (文件名, 函数名)，默认不计入采样（事件循环等待IO、线程等待锁或队列）
+_IDLE_FRAMES = frozenset({
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+})
+
+
+def _short_path(path: str) -> str:
+    """项目内的文件显示相对路径，其他文件显示最后两级"""
+    if path.startswith(_PROJECT_ROOT + os.sep):
+        return os.path.relpath(path, _PROJECT_ROOT)
+    parts = path.replace("\\", "/").rsplit("/", 2)
+    return "/".join(parts[-2:])
+
+
+class SamplingProfiler:
+    """统计采样CPU分析器，同一时间只运行一次分析"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[Any, str] = {}
+
+    def _label(self, code) -> str:
+        """栈帧的显示名（按函数而不是行号，使火焰图按函数聚合）"""
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def profile(self, seconds: float, interval: float, include_idle: bool = False) -> Dict[str, Any]:
+        """
+        在当前线程中采样所有其他线程的调用栈（阻塞调用，应在独立线程中执行）
+
+        Args:
+            seconds: 采样时长
+            interval: 采样间隔
+            include_idle: 是否包含空闲等待的调用栈
+
+        Returns:
+            采样次数、折叠栈和按函数汇总的热点
+
+        Raises:
+            RuntimeError: 已有分析在进行中
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有CPU分析在进行中")
+        try:
+            return self._profile(seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _profile(self, seconds: float, interval: float, include_idle: bool) -> Dict[str, Any]:
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        idle = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    idle += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[tuple(reversed(labels))] += 1
+            samples += 1
+            time.sleep(interval)
+        elapsed = time.perf_counter() - started
+
+        collapsed = "\n".join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common())
+        logger.info(f"CPU分析完成: {elapsed:.1f}s，采样 {samples} 次，{len(stacks)} 个不同调用栈")
+        return {
+            "duration_seconds": round(elapsed, 2),
+            "interval_seconds": interval,
+            "samples": samples,
+            "idle_samples": idle,
+            "top_functions": self._top_functions(stacks),
+            "collapsed": collapsed,
+        }
+
+    @staticmethod
+    def _top_functions(stacks: Counter, limit: int = 30) -> List[Dict[str, Any]]:
+        """按函数汇总：self 为位于栈顶的次数，total 为出现在栈中的次数（递归只计一次）"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        return [
+            {"function": label, "self": own[label], "total": total[label]}
+            for label, _ in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]
+        ]
+
+
+class MemoryProfiler:
+    """tracemalloc 分配追踪，与启动时的基线快照比较"""
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_at: Optional[str] = None
+
+    def start(self, frames: int) -> Dict[str, Any]:
+        """开始追踪并保存基线快照（已在追踪时只重新保存基线）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_at = datetime.now().isoformat()
+            logger.info(f"tracemalloc 已开始，记录 {frames} 层调用栈")
+        self._baseline = self._snapshot()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """停止追踪并释放快照，返回停止前的内存统计"""
+        status = self.status()
+        tracemalloc.stop()
+        self._baseline = None
+        self._started_at = None
+        logger.info("tracemalloc 已停止")
+        return {**status, "tracing": False}
+
+    def diff(self, top: int = 20, group_by: str = "lineno", rebase: bool = False) -> Dict[str, Any]:
+        """
+        与基线快照比较，按增长的内存排序
+
+        Args:
+            top: 返回的分配位置数
+            group_by: lineno（按行）、filename（按文件）或 traceback（按完整调用栈）
+            rebase: 比较后把当前快照作为新的基线
+
+        Raises:
+            RuntimeError: 尚未开始追踪
+        """
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            raise RuntimeError("tracemalloc 未开始，请先调用 start")
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._baseline, group_by)
+        if rebase:
+            self._baseline = snapshot
+        return {
+            **self.status(),
+            "total_diff_bytes": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                    "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "started_at": self._started_at,
+        }
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """当前快照，排除 tracemalloc 自身和导入机制的分配"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+
+# 全局分析器实例
+cpu_profiler = SamplingProfiler()
+memory_profiler = MemoryProfiler()
+
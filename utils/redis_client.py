@@ -1,12 +1,56 @@
 """Redis客户端配置"""
+import asyncio
 import redis
 import json
 import logging
-from typing import Optional, Any
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Set, Tuple
 from config import config
+from utils.metrics import observe_redis_command
+from utils.timing import record_span
+from utils.tracing import KIND_CLIENT, child_span
 
 logger = logging.getLogger(__name__)
 
+# 内存模式下全量清理过期键的最小间隔（秒），两次清理之间只检查被访问的键
+_PURGE_INTERVAL_SECONDS = 1.0
+
+
+@contextmanager
+def _timed(command: str, attributes: Optional[Dict[str, Any]] = None):
+    """记录一次Redis往返的耗时指标、Server-Timing 阶段和链路span"""
+    start = time.perf_counter()
+    try:
+        with child_span(f"redis {command}", KIND_CLIENT, {"db.system": "redis", **(attributes or {})}):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe_redis_command(command, elapsed)
+        record_span("redis", elapsed)
+
+
+class _TimedPipeline(redis.client.Pipeline):
+    """按一次往返记录耗时的管道，命令名为 MULTI（事务）或 PIPELINE"""
+    
+    def execute(self, raise_on_error: bool = True):
+        commands = [str(args[0]) for args, _ in self.command_stack]
+        with _timed("MULTI" if self.transaction else "PIPELINE", {"db.redis.commands": " ".join(commands)}):
+            return super().execute(raise_on_error)
+
+
+class _TimedRedis(redis.Redis):
+    """记录每条命令耗时和链路span的Redis客户端，管道按整体往返记录"""
+    
+    def execute_command(self, *args, **options):
+        with _timed(str(args[0])):
+            return super().execute_command(*args, **options)
+    
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> _TimedPipeline:
+        return _TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
 
 class RedisClient:
     """Redis客户端封装类"""
@@ -14,13 +58,21 @@ class RedisClient:
     def __init__(self):
         self.client = None
         self._memory_storage = {}
+        self._memory_expiry = {}  # 内存模式下设置了过期时间的键 -> 过期时刻
+        self._next_purge = 0.0
         self._initialized = False
+        self._init_lock = threading.Lock()
     
     def _initialize(self):
         """延迟初始化Redis连接"""
         if self._initialized:
             return
-            
+        with self._init_lock:
+            if not self._initialized:
+                self._connect()
+    
+    def _connect(self):
+        """连接Redis，失败时使用内存存储"""
         try:
             redis_config = {
                 'host': config.REDIS_HOST,
@@ -33,7 +85,7 @@ class RedisClient:
             if config.REDIS_PASSWORD:
                 redis_config['password'] = config.REDIS_PASSWORD
                 
-            self.client = redis.Redis(**redis_config)
+            self.client = _TimedRedis(**redis_config)
             self.client.ping()
             logger.info(f"Redis连接成功: {config.REDIS_HOST}:{config.REDIS_PORT}")
         except Exception as e:
@@ -66,7 +118,9 @@ class RedisClient:
                 json_str = self.client.get(key)
                 return json.loads(json_str) if json_str else None
             else:
-                return self._memory_storage.get(key)
+                value = self._memory_storage.get(key)
+                # 异步set写入的是JSON字符串，与Redis模式保持一致地解析
+                return json.loads(value) if isinstance(value, str) else value
         except Exception as e:
             logger.error(f"获取失败: {e}")
             return None
@@ -118,6 +172,261 @@ class RedisClient:
             logger.error(f"异步获取失败: {e}")
             return None
 
+    
+    async def run(self, func, *args, **kwargs):
+        """
+        在异步代码中执行同步方法：Redis模式下在工作线程中执行，不阻塞事件循环；
+        内存模式下直接在事件循环线程中执行，内存存储只被一个线程修改
+        
+        Args:
+            func: 本类的同步方法
+            
+        Returns:
+            方法的返回值
+        """
+        if not self._initialized:
+            await asyncio.to_thread(self._initialize)
+        if self.client:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    
+    def _purge_expired(self, key: Optional[str] = None):
+        """
+        清理内存模式下已过期的键
+        
+        被访问的键每次检查；全量扫描最多每 _PURGE_INTERVAL_SECONDS 执行一次，
+        避免每次读写都遍历所有设置了过期时间的键
+        """
+        if not self._memory_expiry:
+            return
+        now = time.time()
+        if key is not None and self._memory_expiry.get(key, now + 1) <= now:
+            self._memory_expiry.pop(key, None)
+            self._memory_storage.pop(key, None)
+        if now < self._next_purge:
+            return
+        self._next_purge = now + _PURGE_INTERVAL_SECONDS
+        for expired in [k for k, expires_at in self._memory_expiry.items() if expires_at <= now]:
+            self._memory_expiry.pop(expired, None)
+            self._memory_storage.pop(expired, None)
+    
+    def exists(self, key: str) -> bool:
+        self._initialize()
+        try:
+            if self.client:
+                return bool(self.client.exists(key))
+            else:
+                self._purge_expired(key)
+                return key in self._memory_storage
+        except Exception as e:
+            logger.error(f"检查键失败: {e}")
+            return False
+    
+    def expire(self, key: str, seconds: int) -> bool:
+        """设置键的过期时间（内存模式下同样生效）"""
+        self._initialize()
+        try:
+            if self.client:
+                return bool(self.client.expire(key, seconds))
+            else:
+                if key not in self._memory_storage:
+                    return False
+                self._memory_expiry[key] = time.time() + seconds
+                return True
+        except Exception as e:
+            logger.error(f"设置过期时间失败: {e}")
+            return False
+    
+    def xadd(self, key: str, fields: Dict[str, str], entry_id: str = "*") -> Optional[str]:
+        """
+        向Redis Stream追加一条记录
+        
+        Args:
+            key: Stream键名
+            fields: 记录字段
+            entry_id: 记录ID，必须大于Stream中已有的ID，默认由Redis生成
+            
+        Returns:
+            记录ID，失败时返回None
+        """
+        self._initialize()
+        try:
+            if self.client:
+                return self.client.xadd(key, fields, id=entry_id)
+            else:
+                self._purge_expired(key)
+                entries = self._memory_storage.setdefault(key, [])
+                if entry_id == "*":
+                    entry_id = f"{int(time.time() * 1000)}-{len(entries)}"
+                entries.append((entry_id, dict(fields)))
+                return entry_id
+        except Exception as e:
+            logger.error(f"Stream追加失败: {e}")
+            return None
+    
+    def xrange(self, key: str, start: str = "-", count: Optional[int] = None) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        读取Redis Stream中ID不小于 start 的记录
+        
+        Returns:
+            (记录ID, 字段) 列表，键不存在时返回空列表
+        """
+        self._initialize()
+        try:
+            if self.client:
+                return self.client.xrange(key, min=start, count=count)
+            else:
+                self._purge_expired(key)
+                entries = self._memory_storage.get(key) or []
+                index = 0 if start == "-" else bisect_left(entries, _stream_id(start), key=lambda e: _stream_id(e[0]))
+                end = index + count if count else None
+                return entries[index:end]
+        except Exception as e:
+            logger.error(f"Stream读取失败: {e}")
+            return []
+    
+    def stream_append(self, key: str, fields: Dict[str, str], entry_id: str, ttl: int) -> bool:
+        """
+        追加一条Stream记录并刷新过期时间（Redis模式下XADD和EXPIRE在同一次往返中发送）
+        
+        Args:
+            key: Stream键名
+            fields: 记录字段
+            entry_id: 记录ID
+            ttl: 过期时间（秒）
+            
+        Returns:
+            是否成功
+        """
+        self._initialize()
+        try:
+            if self.client:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.xadd(key, fields, id=entry_id)
+                pipe.expire(key, ttl)
+                pipe.execute()
+                return True
+            return self.xadd(key, fields, entry_id) is not None and self.expire(key, ttl)
+        except Exception as e:
+            logger.error(f"Stream追加失败: {e}")
+            return False
+    
+    def stream_read(self, key: str, start: str, count: int) -> Optional[List[Tuple[str, Dict[str, str]]]]:
+        """
+        读取ID不小于 start 的至多 count 条记录，同时判断Stream是否存在（Redis模式下一次往返）
+        
+        Returns:
+            (记录ID, 字段) 列表，Stream不存在（已过期）时返回None，读取失败时返回空列表
+        """
+        self._initialize()
+        try:
+            if self.client:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.xrange(key, min=start, count=count)
+                pipe.exists(key)
+                entries, exists = pipe.execute()
+                return entries if exists else None
+            if not self.exists(key):
+                return None
+            return self.xrange(key, start, count)
+        except Exception as e:
+            logger.error(f"Stream读取失败: {e}")
+            return []
+
+    
+    def increment_batch(self, hash_increments: Dict[str, Dict[str, int]], counter_increments: Dict[str, int],
+                        hll_members: Dict[str, Set[str]], expire: Optional[Dict[str, int]] = None) -> bool:
+        """
+        在一次往返中批量累加计数（Redis模式使用事务管道）
+        
+        调用方在失败时会把增量合并回去等待下次写入，事务保证增量要么全部生效要么全部不生效，
+        避免部分命令已执行时重复计数（EXEC 已发出但连接在收到回复前断开的情况仍可能重复计数）
+        
+        Args:
+            hash_increments: 哈希键 -> {字段: 增量}（HINCRBY）
+            counter_increments: 计数键 -> 增量（INCRBY）
+            hll_members: HyperLogLog键 -> 成员集合（PFADD），内存模式下用集合精确计数
+            expire: 键 -> 过期时间（秒），每次累加后刷新
+            
+        Returns:
+            是否成功
+        """
+        self._initialize()
+        try:
+            if self.client:
+                pipe = self.client.pipeline(transaction=True)
+                for key, fields in hash_increments.items():
+                    for field, amount in fields.items():
+                        pipe.hincrby(key, field, amount)
+                for key, amount in counter_increments.items():
+                    pipe.incrby(key, amount)
+                for key, members in hll_members.items():
+                    pipe.pfadd(key, *members)
+                for key, seconds in (expire or {}).items():
+                    pipe.expire(key, seconds)
+                pipe.execute()
+            else:
+                self._purge_expired()
+                for key, fields in hash_increments.items():
+                    stored = self._memory_storage.setdefault(key, {})
+                    for field, amount in fields.items():
+                        stored[field] = stored.get(field, 0) + amount
+                for key, amount in counter_increments.items():
+                    self._memory_storage[key] = int(self._memory_storage.get(key, 0)) + amount
+                for key, members in hll_members.items():
+                    self._memory_storage.setdefault(key, set()).update(members)
+                for key, seconds in (expire or {}).items():
+                    self._memory_expiry[key] = time.time() + seconds
+            return True
+        except Exception as e:
+            logger.error(f"批量累加计数失败: {e}")
+            return False
+    
+    def read_batch(self, hash_keys: List[str], counter_keys: List[str],
+                   hll_keys: List[str]) -> Tuple[List[Dict[str, int]], List[int], List[int], int]:
+        """
+        在一次往返中批量读取计数
+        
+        Returns:
+            (各哈希键的字段计数, 各计数键的值, 各HyperLogLog键的基数, 所有HyperLogLog键合并后的基数)
+        """
+        self._initialize()
+        try:
+            if self.client:
+                pipe = self.client.pipeline(transaction=False)
+                for key in hash_keys:
+                    pipe.hgetall(key)
+                for key in counter_keys:
+                    pipe.get(key)
+                for key in hll_keys:
+                    pipe.pfcount(key)
+                if hll_keys:
+                    pipe.pfcount(*hll_keys)
+                results = pipe.execute()
+                hashes = [{field: int(value) for field, value in item.items()} for item in results[:len(hash_keys)]]
+                results = results[len(hash_keys):]
+                counters = [int(value or 0) for value in results[:len(counter_keys)]]
+                results = results[len(counter_keys):]
+                cardinalities = list(results[:len(hll_keys)])
+                union = results[len(hll_keys)] if hll_keys else 0
+            else:
+                self._purge_expired()
+                hashes = [dict(self._memory_storage.get(key) or {}) for key in hash_keys]
+                counters = [int(self._memory_storage.get(key) or 0) for key in counter_keys]
+                sets = [self._memory_storage.get(key) or set() for key in hll_keys]
+                cardinalities = [len(members) for members in sets]
+                union = len(set().union(*sets))
+            return hashes, counters, cardinalities, union
+        except Exception as e:
+            logger.error(f"批量读取计数失败: {e}")
+            return [{} for _ in hash_keys], [0 for _ in counter_keys], [0 for _ in hll_keys], 0
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    """把Stream记录ID解析为可比较的 (毫秒, 序号)"""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
 
 # 全局Redis客户端实例
 redis_client = RedisClient()
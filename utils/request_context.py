@@ -0,0 +1,165 @@
+"""
+请求上下文
+通过contextvars在一次请求（及其后台任务）内传递客户端标识、工作负载类型、截止时间等信息
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from config.settings import config
+
+# 工作负载类型，决定调度优先级
+LANE_INTERACTIVE = "interactive"
+LANE_STREAM = "stream"
+LANE_ASYNC = "async"
+
+_client_id: ContextVar[str] = ContextVar("client_id", default="anonymous")
+_lane: ContextVar[Optional[str]] = ContextVar("lane", default=None)
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """请求已超过截止时间"""
+
+
+def get_client_id() -> str:
+    """当前请求的客户端（租户）标识"""
+    return _client_id.get()
+
+
+def set_client_id(client_id: str):
+    """设置当前请求的客户端标识"""
+    _client_id.set(client_id or "anonymous")
+
+
+def get_lane(default: str = LANE_INTERACTIVE) -> str:
+    """当前工作负载类型，未显式设置时返回默认值"""
+    return _lane.get() or default
+
+
+def set_lane(lane: str):
+    """设置当前工作负载类型，后台任务在执行前设置为 async"""
+    _lane.set(lane)
+
+
+def get_deadline() -> Optional[float]:
+    """当前请求的截止时间（Unix时间戳），未设置时返回None"""
+    return _deadline.get()
+
+
+def set_deadline(deadline: Optional[float]):
+    """设置当前请求的截止时间，后台任务在执行前从任务记录中恢复"""
+    _deadline.set(deadline)
+
+
+def format_deadline(deadline: Optional[float]) -> Optional[str]:
+    """截止时间转换为ISO格式，用于写入任务记录"""
+    return datetime.fromtimestamp(deadline).isoformat() if deadline is not None else None
+
+
+def remaining_time() -> Optional[float]:
+    """距离截止时间的剩余秒数（可能为负数），未设置截止时间时返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def check_deadline():
+    """
+    检查截止时间
+
+    Raises:
+        DeadlineExceededError: 已超过截止时间
+    """
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError(f"请求已超过截止时间 {-remaining:.1f}s")
+
+
+@asynccontextmanager
+async def deadline_scope():
+    """
+    在截止时间内执行一段代码，到期时取消并抛出 DeadlineExceededError
+
+    上游SDK自身的超时（按剩余时间设置）可能先于本作用域触发，截止时间已过时抛出的其他异常
+    同样转换为 DeadlineExceededError，避免客户端设置的截止时间被计为服务商超时
+    """
+    check_deadline()
+    timeout = asyncio.timeout(remaining_time())
+    try:
+        async with timeout:
+            yield
+    except DeadlineExceededError:
+        raise
+    except TimeoutError as e:
+        if timeout.expired():
+            raise DeadlineExceededError("请求已超过截止时间") from e
+        raise
+    except Exception as e:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError("请求已超过截止时间") from e
+        raise
+
+
+def request_timeout_for(path: str, header_value: Optional[str] = None) -> float:
+    """
+    计算请求的超时时间
+
+    Args:
+        path: 请求路径，用于查找接口默认超时
+        header_value: X-Request-Timeout 请求头的值（秒）
+
+    Returns:
+        超时秒数，不超过 REQUEST_TIMEOUT_MAX_SECONDS
+    """
+    timeout = config.REQUEST_TIMEOUT_ENDPOINT_DEFAULTS.get(path, config.REQUEST_TIMEOUT_SECONDS)
+    if header_value:
+        try:
+            requested = float(header_value)
+        except ValueError:
+            requested = 0.0
+        if requested > 0:
+            timeout = requested
+    return min(timeout, config.REQUEST_TIMEOUT_MAX_SECONDS)
+
+
+def client_id_from_scope(scope) -> str:
+    """从 X-Client-ID 头读取客户端标识，缺失时使用客户端IP"""
+    for name, value in scope.get("headers", []):
+        if name == b"x-client-id":
+            client_id = value.decode("latin-1").strip()
+            if client_id:
+                return client_id
+    return scope["client"][0] if scope.get("client") else "anonymous"
+
+
+class RequestContextMiddleware:
+    """
+    请求上下文中间件（纯ASGI实现，不影响流式响应）
+
+    从 X-Client-ID 头读取客户端标识，缺失时使用客户端IP；
+    按 X-Request-Timeout 头（秒）或接口默认超时设置请求截止时间
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        timeout_header = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                timeout_header = value.decode("latin-1").strip()
+        set_client_id(client_id_from_scope(scope))
+        if scope["type"] == "http":
+            set_deadline(time.time() + request_timeout_for(scope["path"], timeout_header))
+        await self.app(scope, receive, send)
@@ -0,0 +1,134 @@
+"""
+增量断句工具模块
+实时翻译时输入文本按打字或语音识别的节奏陆续到达，本模块在文本到达时识别已完整的句子：
+中文句末标点和换行直接断句，英文句末标点后需跟空白（排除小数、常见缩写和姓名首字母），
+句末标点后的引号/括号归入前一句；长时间没有句末标点时在最近的逗号或空格处强制断句
+"""
+
+import re
+from typing import List, Optional
+
+from config.settings import config
+
+# 中文句末标点：其后不需要空白即可断句
+_CJK_TERMINATORS = frozenset("。！？；…")
+# 句末标点（含英文），连续出现时视为一个句末（如 "?!"、"……"、"..."）
+_TERMINATORS = _CJK_TERMINATORS | frozenset(".!?！？")
+# 位于输入末尾时立即断句的中文句末标点（省略号和引号可能还有后续，需等待）
+_IMMEDIATE_TERMINATORS = frozenset("。！？；")
+# 句末标点后归入前一句的闭合引号和括号
+_CLOSERS = frozenset("\"'”’」』）》】)]")
+# 成对的中文引号和括号，句中有未闭合的开引号时句末标点后可能还有闭合引号
+_PAIRS = {"“": "”", "‘": "’", "「": "」", "『": "』", "（": "）", "《": "》", "【": "】"}
+# 强制断句时优先选择的位置（在该字符之后断开）
+_SOFT_BREAKS = frozenset("，,、：:；; ")
+
+# 句点前的这些词不是句末（小写比较）
+_ABBREVIATIONS = frozenset(
+    "mr mrs ms dr prof sr jr st vs etc e.g i.e u.s u.k no fig approx dept inc ltd co jan feb mar apr "
+    "jun jul aug sep sept oct nov dec".split()
+)
+_LAST_WORD_PATTERN = re.compile(r'([A-Za-z][A-Za-z.]*)$')
+
+
+class SentenceSegmenter:
+    """
+    增量断句器
+
+    Args:
+        max_chars: 没有句末标点时缓冲达到该长度后强制断句
+    """
+
+    def __init__(self, max_chars: Optional[int] = None):
+        self.max_chars = config.LIVE_MAX_SENTENCE_CHARS if max_chars is None else max_chars
+        self._buffer = ""
+        self._scan = 0  # 缓冲中已确认不含句末的位置，下次从这里继续扫描
+
+    @property
+    def pending(self) -> str:
+        """尚未组成完整句子的文本"""
+        return self._buffer
+
+    def feed(self, text: str) -> List[str]:
+        """
+        加入新到达的文本
+
+        Args:
+            text: 新到达的文本片段（可以在句子、单词甚至标点序列中间截断）
+
+        Returns:
+            本次完整的句子列表（已去除首尾空白，过滤空句）
+        """
+        if not text:
+            return []
+        buffer = self._buffer + text
+        sentences = []
+        start = 0
+        i = self._scan
+        while i < len(buffer):
+            ch = buffer[i]
+            if ch == "\n":
+                self._emit(sentences, buffer[start:i])
+                start = i = i + 1
+                continue
+            if ch not in _TERMINATORS:
+                i += 1
+                continue
+            # 跳过连续的句末标点和闭合引号；末尾没有后续字符时，除中文句号等确定的句末外等待更多输入再判断
+            end = i + 1
+            while end < len(buffer) and (buffer[end] in _TERMINATORS or buffer[end] in _CLOSERS):
+                end += 1
+            if end == len(buffer):
+                if buffer[end - 1] in _IMMEDIATE_TERMINATORS and not _has_open_quote(buffer[start:end]):
+                    self._emit(sentences, buffer[start:end])
+                    start = i = end
+                break
+            if ch in _CJK_TERMINATORS or ch in "！？" or (
+                    buffer[end].isspace() and not self._is_abbreviation(buffer[start:i])):
+                self._emit(sentences, buffer[start:end])
+                start = end
+            i = end
+
+        self._buffer = buffer[start:]
+        self._scan = i - start
+        while len(self._buffer) > self.max_chars:
+            self._force_split(sentences)
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """输入结束，返回剩余的文本（没有时返回None）"""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        self._scan = 0
+        return rest or None
+
+    def _force_split(self, sentences: List[str]):
+        """缓冲过长时在最近的逗号或空格处断开，找不到时按长度断开"""
+        cut = self.max_chars
+        for index in range(self.max_chars - 1, self.max_chars // 2, -1):
+            if self._buffer[index] in _SOFT_BREAKS:
+                cut = index + 1
+                break
+        self._emit(sentences, self._buffer[:cut])
+        self._buffer = self._buffer[cut:]
+        self._scan = max(0, self._scan - cut)
+
+    @staticmethod
+    def _is_abbreviation(sentence: str) -> bool:
+        """英文句点是否属于缩写或姓名首字母"""
+        match = _LAST_WORD_PATTERN.search(sentence)
+        if match is None:
+            return False
+        word = match.group(1)
+        return word.lower() in _ABBREVIATIONS or (len(word) == 1 and word.isupper() and word != "I")
+
+    @staticmethod
+    def _emit(sentences: List[str], sentence: str):
+        sentence = sentence.strip()
+        if sentence:
+            sentences.append(sentence)
+
+
+def _has_open_quote(sentence: str) -> bool:
+    """句中是否有未闭合的中文引号或括号"""
+    return any(sentence.count(opener) > sentence.count(closer) for opener, closer in _PAIRS.items())
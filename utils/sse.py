@@ -0,0 +1,233 @@
+"""
+SSE编码器
+流式接口共用的Server-Sent Events编码：在短的刷新窗口或字节阈值内合并上游片段，
+完整结果保存在列表缓冲中，空闲时发送注释心跳防止代理关闭连接，每个事件带递增的 id 以支持 Last-Event-ID
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+
+import anyio
+from fastapi.responses import StreamingResponse
+
+from config.settings import config
+from utils.streaming import close_quietly
+
+HEARTBEAT_FRAME = ": ping\n\n"
+
+# 流式接口的响应头（X-Accel-Buffering 关闭Nginx的响应缓冲）
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Allow-Methods": "*",
+}
+
+# 编码器读取上游片段的队列长度，队列满时暂停读取上游
+_QUEUE_SIZE = 64
+
+# 上游结束标记
+_END = object()
+
+# SSE数据中不保留的控制字符
+_CONTROL_CHARS = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """解析 Last-Event-ID 请求头，无效时返回None"""
+    if not value:
+        return None
+    try:
+        event_id = int(value.strip())
+    except ValueError:
+        return None
+    return event_id if event_id >= 0 else None
+
+
+class SSEEncoder:
+    """
+    SSE编码器
+
+    Args:
+        chunk_payload: 把合并后的片段文本转换为事件数据的函数
+        flush_interval: 片段最长合并时间（秒）
+        flush_bytes: 合并的片段达到该字节数时立即发送
+        heartbeat_interval: 超过该时间没有发送任何帧时发送心跳注释
+        start_id: 第一个事件的前一个编号（续传时为客户端最后收到的事件编号）
+    """
+
+    def __init__(self, chunk_payload: Callable[[str], Dict[str, Any]],
+                 flush_interval: Optional[float] = None, flush_bytes: Optional[int] = None,
+                 heartbeat_interval: Optional[float] = None, start_id: int = 0):
+        self.chunk_payload = chunk_payload
+        self.flush_interval = config.SSE_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self.flush_bytes = config.SSE_FLUSH_BYTES if flush_bytes is None else flush_bytes
+        self.heartbeat_interval = config.SSE_HEARTBEAT_SECONDS if heartbeat_interval is None else heartbeat_interval
+        self.last_id = start_id
+        self.parts: List[str] = []
+        self.chunks = 0
+        self.frames = 0
+        self.heartbeats = 0
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._pending_since = 0.0
+        self._last_frame_at = time.monotonic()
+
+    @property
+    def full_result(self) -> str:
+        """目前为止的完整结果"""
+        return "".join(self.parts)
+
+    def event(self, payload: Dict[str, Any]) -> str:
+        """编码一个带编号的事件"""
+        self.last_id += 1
+        self.frames += 1
+        self._last_frame_at = time.monotonic()
+        return f"id: {self.last_id}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def add(self, chunk: str) -> Optional[str]:
+        """
+        加入一个上游片段
+
+        Returns:
+            达到字节阈值或合并窗口到期时返回要发送的帧，否则返回None
+        """
+        if not chunk:
+            return None
+        self.parts.append(chunk)
+        self.chunks += 1
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(chunk)
+        self._pending_bytes += len(chunk)
+        if self._pending_bytes >= self.flush_bytes or time.monotonic() - self._pending_since >= self.flush_interval:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """发送合并中的片段，没有时返回None"""
+        if not self._pending:
+            return None
+        text = "".join(self._pending).translate(_CONTROL_CHARS)
+        self._pending.clear()
+        self._pending_bytes = 0
+        return self.event(self.chunk_payload(text))
+
+    def heartbeat(self) -> str:
+        """心跳注释帧"""
+        self.heartbeats += 1
+        self._last_frame_at = time.monotonic()
+        return HEARTBEAT_FRAME
+
+    def _next_wakeup(self) -> float:
+        """距离下一次需要主动发送（合并窗口到期或心跳）的秒数"""
+        now = time.monotonic()
+        wakeup = self._last_frame_at + self.heartbeat_interval
+        if self._pending:
+            wakeup = min(wakeup, self._pending_since + self.flush_interval)
+        return max(0.0, wakeup - now)
+
+    def _due_frame(self) -> Optional[str]:
+        """合并窗口到期或空闲超时时需要发送的帧"""
+        now = time.monotonic()
+        if self._pending and now - self._pending_since >= self.flush_interval:
+            return self.flush()
+        if now - self._last_frame_at >= self.heartbeat_interval:
+            return self.heartbeat()
+        return None
+
+    async def stream(self, source: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+        """
+        把上游片段编码为SSE帧
+
+        由一个后台任务读取 source 放入有界队列，本生成器按合并窗口和心跳间隔定时等待队列
+        （每个流只创建一个任务，而不是每个片段一个）；source 结束或出错时先发送剩余的片段，
+        本生成器被关闭时同时取消后台任务并关闭 source
+
+        Args:
+            source: 上游片段生成器
+
+        Yields:
+            SSE帧
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        pump = asyncio.ensure_future(_pump(source, queue))
+        try:
+            while True:
+                if queue.empty():
+                    try:
+                        async with asyncio.timeout(self._next_wakeup()):
+                            item = await queue.get()
+                    except TimeoutError:
+                        frame = self._due_frame()
+                        if frame is not None:
+                            yield frame
+                        continue
+                else:
+                    item = queue.get_nowait()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    # 先发送出错前已收到的片段
+                    frame = self.flush()
+                    if frame is not None:
+                        yield frame
+                    raise item
+                frame = self.add(item)
+                if frame is not None:
+                    yield frame
+            frame = self.flush()
+            if frame is not None:
+                yield frame
+        finally:
+            if not pump.done():
+                pump.cancel()
+                with anyio.CancelScope(shield=True):
+                    await asyncio.gather(pump, return_exceptions=True)
+            await close_quietly(source)
+
+
+async def _pump(source: AsyncIterator[str], queue: asyncio.Queue):
+    """把上游片段依次放入队列，结束时放入结束标记，出错时放入异常"""
+    try:
+        async for chunk in source:
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+        return
+    await queue.put(_END)
+
+
+class SSEResponse(StreamingResponse):
+    """
+    SSE响应，默认带 SSE_HEADERS
+
+    客户端断开时 StreamingResponse 只取消发送任务，停在 yield 处的事件生成器要等到被垃圾回收才关闭；
+    这里在响应结束后立即关闭生成器，使其 finally 中的清理（取消上游、注销读取者）及时执行
+
+    Args:
+        content: SSE帧生成器
+        headers: 额外的响应头
+        reads_request_body: 接口在响应期间仍在读取请求体（流式输入）时为True，此时不监听断开消息，
+            以免与接口争抢请求体消息，断开由接口读取请求体时检测
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[str], headers: Optional[Dict[str, str]] = None,
+                 reads_request_body: bool = False, **kwargs):
+        super().__init__(content, headers={**SSE_HEADERS, **(headers or {})}, **kwargs)
+        self.reads_request_body = reads_request_body
+
+    async def __call__(self, scope, receive, send):
+        try:
+            if self.reads_request_body:
+                await self.stream_response(send)
+            else:
+                await super().__call__(scope, receive, send)
+        finally:
+            await close_quietly(self.body_iterator)
@@ -0,0 +1,158 @@
+"""
+流式响应工具
+监测客户端断开连接，断开后立即关闭上游生成器（逐层传播到服务商的HTTP流，释放连接池中的连接），
+并统计被取消的流以及因提前取消而节省的输出token数
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Dict
+
+import anyio
+from starlette.requests import Request
+
+from config.settings import config
+from utils.logger import logger
+from utils.metrics import CallbackMetric
+from utils.text_processor import estimate_tokens
+
+# 总结输出的预估上限，与服务商的 max_tokens 保持一致
+SUMMARY_MAX_OUTPUT_TOKENS = 1000
+
+
+def expected_output_tokens(operation: str, text: str) -> int:
+    """
+    预估一次调用完整输出的token数，用于计算流被取消后节省的token以及路由时的成本估算
+
+    Args:
+        operation: translate 或 summarize
+        text: 输入文本
+
+    Returns:
+        预估输出token数（翻译与输入相当，总结约为输入的三分之一且不超过上限）
+    """
+    return estimate_output_tokens(operation, estimate_tokens(text))
+
+
+def estimate_output_tokens(operation: str, input_tokens: int) -> int:
+    """按输入token数预估输出token数，见 expected_output_tokens"""
+    if operation == "summarize":
+        return min(SUMMARY_MAX_OUTPUT_TOKENS, input_tokens // 3 + 1)
+    return input_tokens
+
+
+class StreamStats:
+    """流式请求统计"""
+
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.tokens_emitted = 0
+        self.tokens_saved = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "in_progress": self.started - self.completed - self.cancelled - self.failed,
+            "tokens_emitted": self.tokens_emitted,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+# 全局流式统计实例
+stream_stats = StreamStats()
+
+CallbackMetric(
+    "stream_requests_total", "流式请求数（按结果）", ("outcome",),
+    lambda: [((outcome,), getattr(stream_stats, outcome)) for outcome in ("started", "completed", "cancelled", "failed")],
+    type_name="counter"
+)
+CallbackMetric(
+    "stream_tokens_saved_total", "客户端断开后取消上游预计节省的输出token数", (),
+    lambda: [((), stream_stats.tokens_saved)], type_name="counter"
+)
+
+
+async def close_quietly(resource: Any):
+    """
+    关闭上游流或异步生成器
+
+    在已被取消的作用域内（如Starlette因客户端断开取消响应任务）普通的await会再次被取消，
+    这里屏蔽取消以保证关闭操作执行完毕
+    """
+    close = getattr(resource, "aclose", None) or getattr(resource, "close", None)
+    if close is None:
+        return
+    with anyio.CancelScope(shield=True):
+        try:
+            await close()
+        except Exception as e:
+            logger.debug("关闭上游流时出错: %s", e)
+
+
+async def cancel_on_disconnect(request: Request, source: AsyncIterator[str],
+                               expected_tokens: int = 0) -> AsyncGenerator[str, None]:
+    """
+    转发上游片段，客户端断开连接时立即取消上游
+
+    等待下一个片段时以及片段持续到达时都按 STREAM_DISCONNECT_POLL_SECONDS 间隔检查连接状态，
+    断开后取消正在等待的片段并关闭 source，关闭操作会沿 AIService、服务商池一直传播到服务商的HTTP流
+
+    Args:
+        request: 当前请求，用于检测连接状态（也可以是任何提供 is_disconnected() 的对象，如可续传流）
+        source: 上游片段生成器
+        expected_tokens: 预估的完整输出token数，用于统计节省的token
+
+    Yields:
+        上游片段
+    """
+    stream_stats.started += 1
+    poll_interval = config.STREAM_DISCONNECT_POLL_SECONDS
+    emitted = 0
+    pending = None
+    outcome = "cancelled"
+    next_check = time.monotonic() + poll_interval
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=poll_interval)
+            # 片段持续到达时也按间隔检查连接状态
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + poll_interval
+                if await request.is_disconnected():
+                    break
+            if not done:
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                outcome = "completed"
+                return
+            except Exception:
+                outcome = "failed"
+                raise
+            emitted += estimate_tokens(chunk)
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(pending, return_exceptions=True)
+        await close_quietly(source)
+        stream_stats.tokens_emitted += emitted
+        if outcome == "completed":
+            stream_stats.completed += 1
+        elif outcome == "failed":
+            stream_stats.failed += 1
+        else:
+            saved = max(0, expected_tokens - emitted)
+            stream_stats.cancelled += 1
+            stream_stats.tokens_saved += saved
+            logger.info("客户端断开连接，已取消上游流（已输出约 %d tokens，预计节省 %d tokens）", emitted, saved)
@@ -84,7 +84,7 @@ class TextProcessor:
             # 2. 测试序列化是否成功
             test_payload = {"text": cleaned}
             json.dumps(test_payload, ensure_ascii=False)
-            logger.debug(f"文本预处理完成，原长度: {len(user_input)}, 处理后长度: {len(cleaned)}")
+            logger.debug("文本预处理完成，原长度: %s, 处理后长度: %s", len(user_input), len(cleaned))
             return cleaned
         except json.JSONDecodeError as e:
             logger.warning(f"JSON序列化测试失败: {e}，使用基础清理方法")
@@ -174,6 +174,31 @@ class TextProcessor:
             return text
         
         return text[:max_length - len(suffix)] + suffix
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        粗略估算文本的token数量
+        
+        中文按每个汉字约1个token计算，英文单词按约1.3个token计算，
+        用于预算控制和统计，不追求与具体模型分词器完全一致
+        
+        Args:
+            text: 要估算的文本
+            
+        Returns:
+            估算的token数量
+        """
+        if not text:
+            return 0
+        
+        cjk_count = len(_CJK_PATTERN.findall(text))
+        word_count = len(_WORD_PATTERN.findall(text))
+        return cjk_count + int(word_count * 1.3 + 0.5)
+
+
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9]+')
 
 
 # 便捷函数
@@ -195,3 +220,8 @@ def normalize_whitespace(text: str) -> str:
 def truncate_text(text: str, max_length: int, suffix: str = "...") -> str:
     """截断文本的便捷函数"""
     return TextProcessor.truncate_text(text, max_length, suffix)
+
+
+def estimate_tokens(text: str) -> int:
+    """估算token数量的便捷函数"""
+    return TextProcessor.estimate_tokens(text)
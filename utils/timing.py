@@ -0,0 +1,154 @@
+"""
+请求耗时分解
+每个HTTP请求在 contextvars 中携带一个阶段计时器，JSON清理、文本预处理、Redis、调度排队、
+并发限制排队和上游调用等阶段把耗时记录到当前请求；响应头 Server-Timing 返回已完成阶段的耗时，
+流式接口在完成事件中返回完整的耗时分解；总耗时超过 SLOW_REQUEST_THRESHOLD_SECONDS 的请求写入慢请求日志
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from config.settings import config
+from utils.logger import logger
+
+_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    一个请求的阶段耗时
+
+    同一请求及其创建的子任务（流式生成、后台任务）共享同一个对象；
+    同名阶段的耗时累加（如重试、对冲或多次Redis命令），并记录次数
+    """
+
+    __slots__ = ("method", "path", "started_at", "start", "durations", "counts")
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float):
+        """累加一个阶段的耗时"""
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def elapsed(self) -> float:
+        """请求开始至今的时间（秒）"""
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头的值（毫秒）"""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """耗时分解（毫秒），用于流式完成事件和慢请求日志"""
+        return {
+            "total_ms": round(self.elapsed() * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()},
+            "counts": dict(self.counts),
+        }
+
+
+def start_timing(method: str = "", path: str = "") -> RequestTimings:
+    """为当前请求创建阶段计时器"""
+    timings = RequestTimings(method, path)
+    _timings.set(timings)
+    return timings
+
+
+def get_timings() -> Optional[RequestTimings]:
+    """当前请求的阶段计时器，不在请求中时返回None"""
+    return _timings.get()
+
+
+def record_span(name: str, seconds: float):
+    """把已测量的阶段耗时记录到当前请求"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """测量一段代码的耗时并记录到当前请求"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def timing_breakdown() -> Optional[Dict[str, Any]]:
+    """当前请求的耗时分解，不在请求中时返回None"""
+    timings = _timings.get()
+    return timings.breakdown() if timings is not None else None
+
+
+def log_if_slow(timings: RequestTimings, status: int):
+    """总耗时超过阈值时写入一条结构化的慢请求记录"""
+    threshold = config.SLOW_REQUEST_THRESHOLD_SECONDS
+    if threshold <= 0 or timings.elapsed() < threshold:
+        return
+    record = {
+        "event": "slow_request",
+        "method": timings.method,
+        "path": timings.path,
+        "status": status,
+        "started_at": datetime.fromtimestamp(timings.started_at).isoformat(),
+        **timings.breakdown(),
+    }
+    logger.warning(f"慢请求: {json.dumps(record, ensure_ascii=False)}")
+
+
+class ServerTimingMiddleware:
+    """
+    请求耗时分解中间件（纯ASGI实现，不影响流式响应）
+
+    请求开始时创建阶段计时器，响应开始时加入 Server-Timing 响应头（流式接口只包含响应开始前的阶段），
+    响应体发送完毕后按总耗时判断是否写入慢请求日志（响应后执行的后台任务不计入请求耗时）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_timing(scope["method"], scope["path"])
+        status = 500
+        logged = False
+
+        async def send_wrapper(message):
+            nonlocal status, logged
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                logged = True
+                log_if_slow(timings, status)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not logged:
+                log_if_slow(timings, status)
@@ -0,0 +1,418 @@
+"""
+请求链路追踪
+每个HTTP请求在中间件中创建根span（沿用请求头 traceparent 中的trace ID），上游服务商调用和Redis命令
+作为子span记录；异步任务提交时把 traceparent 写入任务记录，后台处理任务以它为父span继续同一条链路，
+从提交请求、任务记录到后台处理和上游调用都能按trace ID关联。
+结束的span以OpenTelemetry（OTLP/JSON）格式保存在进程内的环形缓冲中，由 /debug/traces 查看，
+可选同时追加写入本地JSONL文件，不需要外部收集器
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from config.settings import config
+from utils.logger import logger
+
+# span类型（OTLP SpanKind）
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+KIND_PRODUCER = 4
+KIND_CONSUMER = 5
+_KIND_NAMES = {
+    KIND_INTERNAL: "SPAN_KIND_INTERNAL",
+    KIND_SERVER: "SPAN_KIND_SERVER",
+    KIND_CLIENT: "SPAN_KIND_CLIENT",
+    KIND_PRODUCER: "SPAN_KIND_PRODUCER",
+    KIND_CONSUMER: "SPAN_KIND_CONSUMER",
+}
+
+# span状态（OTLP StatusCode）
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    一个span
+
+    未采样的链路使用不记录的span（recording 为False），所有记录方法直接返回，
+    trace ID 和 span ID 仍然向下传递，以保持整条链路的采样决定一致
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status_code", "status_message", "recording")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str] = None,
+                 kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None, recording: bool = True):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = (
+            {key: value for key, value in attributes.items() if value is not None} if attributes and recording else {}
+        )
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self.recording = recording
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent 头的值"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.recording else '00'}"
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        if self.recording and value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        """把span标记为失败，记录异常类型和信息"""
+        if not self.recording:
+            return
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)[:500]
+        self.attributes["exception.type"] = type(error).__name__
+
+    def end(self):
+        """结束span并交给导出器（重复调用无效）"""
+        if not self.recording or self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        span_exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON 格式的span"""
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _KIND_NAMES[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status_code},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        if self.status_message:
+            data["status"]["message"] = self.status_message
+        return data
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """OTLP AnyValue（int64 按protobuf JSON映射编码为字符串）"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _random_id(bits: int) -> str:
+    value = 0
+    while value == 0:
+        value = random.getrandbits(bits)
+    return f"{value:0{bits // 4}x}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    解析W3C traceparent
+
+    Args:
+        value: 形如 00-<32位trace ID>-<16位span ID>-<flags> 的字符串
+
+    Returns:
+        (trace_id, parent_span_id, sampled)，格式无效时返回None
+    """
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id, span_id, sampled
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, parent: Union["Span", str, None] = None,
+               attributes: Optional[Dict[str, Any]] = None) -> Span:
+    """
+    创建span（不设为当前span）
+
+    Args:
+        name: span名称
+        kind: span类型
+        parent: 父span或 traceparent 字符串，为空时使用当前span；都没有时开始新的链路并按采样比例决定是否记录
+        attributes: 初始属性
+
+    Returns:
+        新的span，调用方负责调用 end()
+    """
+    if parent is None:
+        parent = _current.get()
+    if isinstance(parent, str):
+        parsed = parse_traceparent(parent)
+        if parsed is not None:
+            trace_id, parent_id, sampled = parsed
+            return Span(name, trace_id, _random_id(64), parent_id, kind, attributes,
+                        sampled and config.TRACING_ENABLED)
+        parent = None
+    if parent is not None:
+        return Span(name, parent.trace_id, _random_id(64), parent.span_id, kind, attributes, parent.recording)
+    sampled = config.TRACING_ENABLED and random.random() < config.TRACE_SAMPLE_RATIO
+    return Span(name, _random_id(128), _random_id(64), None, kind, attributes, sampled)
+
+
+def get_current_span() -> Optional[Span]:
+    """当前span，不在链路中时返回None"""
+    return _current.get()
+
+
+def set_current_span(span: Span) -> Token:
+    """把span设为当前span，返回用于 reset_current_span 的令牌"""
+    return _current.set(span)
+
+
+def reset_current_span(token: Token):
+    _current.reset(token)
+
+
+def current_traceparent() -> Optional[str]:
+    """当前span的 traceparent，用于写入任务记录"""
+    current = _current.get()
+    return current.traceparent if current is not None else None
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+@contextmanager
+def child_span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+    """
+    在当前span下记录一段代码（不改变当前span），异常时标记为失败
+
+    不在被记录的链路中时不创建span，产生None
+    """
+    parent = _current.get()
+    if parent is None or not parent.recording:
+        yield None
+        return
+    span = Span(name, parent.trace_id, _random_id(64), parent.span_id, kind, attributes)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        span.end()
+
+
+class SpanExporter:
+    """
+    结束的span保存在环形缓冲中（供 /debug/traces 查看），设置 TRACE_FILE_PATH 时同时由后台线程
+    按批追加写入JSONL文件，每行是一个OTLP ExportTraceServiceRequest，请求路径上不做文件IO
+
+    Args:
+        buffer_size: 环形缓冲保存的span数
+        file_path: JSONL文件路径，为空时不写文件
+    """
+
+    def __init__(self, buffer_size: int, file_path: Optional[str] = None):
+        self.spans: Deque[Span] = deque(maxlen=max(buffer_size, 1))
+        self.file_path = file_path
+        self.exported = 0
+        self.file_errors = 0
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        self.spans.append(span)
+        self.exported += 1
+        if self.file_path:
+            self._file_queue().put(span)
+
+    def _file_queue(self) -> queue.SimpleQueue:
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = queue.SimpleQueue()
+                    threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True).start()
+        return self._queue
+
+    def _write_loop(self):
+        """后台线程：取出已结束的span，每批写一行"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                directory = os.path.dirname(self.file_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.file_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(otlp_request(batch), ensure_ascii=False) + "\n")
+            except OSError as e:
+                self.file_errors += 1
+                logger.warning(f"写入链路追踪文件失败: {e}")
+            time.sleep(0.5)
+
+    def traces(self, limit: int = 50, min_duration_ms: float = 0, errors_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        按链路汇总缓冲中的span，最近开始的链路在前
+
+        Args:
+            limit: 返回的链路数
+            min_duration_ms: 只返回总时长不小于该值的链路
+            errors_only: 只返回包含失败span的链路
+        """
+        grouped: Dict[str, List[Span]] = {}
+        for span in list(self.spans):
+            grouped.setdefault(span.trace_id, []).append(span)
+        summaries = []
+        for trace_id, spans in grouped.items():
+            start = min(span.start_ns for span in spans)
+            end = max(span.end_ns for span in spans)
+            roots = [span for span in spans if not span.parent_id] or sorted(spans, key=lambda s: s.start_ns)
+            errors = sum(1 for span in spans if span.status_code == STATUS_ERROR)
+            duration_ms = (end - start) / 1e6
+            if duration_ms < min_duration_ms or (errors_only and not errors):
+                continue
+            summaries.append({
+                "trace_id": trace_id,
+                "root": roots[0].name,
+                "start_time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start / 1e9)),
+                "duration_ms": round(duration_ms, 1),
+                "spans": len(spans),
+                "errors": errors,
+                "_start": start,
+            })
+        summaries.sort(key=lambda item: item["_start"], reverse=True)
+        for item in summaries:
+            del item["_start"]
+        return summaries[:limit]
+
+    def trace(self, trace_id: str) -> List[Span]:
+        """一条链路在缓冲中的所有span，按开始时间排序"""
+        return sorted((span for span in list(self.spans) if span.trace_id == trace_id), key=lambda s: s.start_ns)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": config.TRACING_ENABLED,
+            "sample_ratio": config.TRACE_SAMPLE_RATIO,
+            "buffered_spans": len(self.spans),
+            "buffer_size": self.spans.maxlen,
+            "exported_spans": self.exported,
+            "file_path": self.file_path,
+            "file_errors": self.file_errors,
+        }
+
+
+def otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    """把span包装为OTLP ExportTraceServiceRequest（OTLP/JSON）"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": config.TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "utils.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+# 全局span导出器实例
+span_exporter = SpanExporter(config.TRACE_BUFFER_SIZE, config.TRACE_FILE_PATH)
+
+
+class TracingMiddleware:
+    """
+    链路追踪中间件（纯ASGI实现，不影响流式响应）
+
+    为每个HTTP请求创建服务端根span并设为当前span，请求头带有效 traceparent 时继续调用方的链路；
+    响应头 X-Trace-ID 返回trace ID；span在响应体发送完毕时结束，记录路由模板和状态码
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+        method = scope["method"]
+        root = start_span(method, KIND_SERVER, parent=incoming or _current.get(),
+                          attributes={"http.method": method, "http.target": scope["path"]})
+        token = _current.set(root)
+        status = 500
+
+        def finish():
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path:
+                root.name = f"{method} {path}"
+                root.set_attribute("http.route", path)
+            root.set_attribute("http.status_code", status)
+            if status >= 500:
+                root.status_code = STATUS_ERROR
+            root.end()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-trace-id", root.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # 响应后执行的后台任务不计入请求span，由任务自己的span记录
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.record_error(e)
+            raise
+        finally:
+            finish()
+            _current.reset(token)
@@ -0,0 +1,291 @@
+"""
+流量采集
+按比例采集 /api/ 下的请求（方法、路由、查询参数、请求体、状态码、耗时、首字节时间），
+写入按大小轮转的JSONL文件，供 benchmarks/replay_traffic.py 按原始到达间隔回放。
+请求体中的文本逐字符替换为同类占位符（汉字 -> 中，字母 -> x/X，数字 -> 0，其他字符按UTF-8字节数替换），
+保留空白、标点和JSON结构，使回放请求的长度、断句和估算token数与原请求一致而不含原文；
+客户端标识只保存带密钥的哈希（HMAC）。采集默认关闭，写文件在后台线程中完成
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from config.settings import config
+from utils.logger import logger
+from utils.request_context import client_id_from_scope
+
+# 不采集的路径前缀（健康检查、管理和统计接口）
+EXCLUDED_PREFIXES = ("/api/health", "/api/admin", "/api/stats")
+
+# 原样保存的请求头
+KEPT_HEADERS = (b"content-type", b"accept", b"x-request-timeout", b"last-event-id")
+
+# 按UTF-8字节数替换的占位符
+_PLACEHOLDERS = {2: "é", 3: "中", 4: "𠀀"}
+
+# 从JSON响应中记录的标识（回放时把后续请求路径中的原标识替换为新标识）
+_RESPONSE_ID_FIELDS = ("task_id",)
+_MAX_SNIFF_BYTES = 4096
+
+
+def _scrub_char(ch: str) -> str:
+    if ch.isspace() or not ch.isalnum():
+        return ch
+    if ch.isascii():
+        if ch.isdigit():
+            return "0"
+        return "X" if ch.isupper() else "x"
+    return _PLACEHOLDERS.get(len(ch.encode("utf-8")), ch)
+
+
+def scrub_text(text: str) -> str:
+    """
+    逐字符替换文本，保留长度、空白和标点
+
+    Args:
+        text: 原文本
+
+    Returns:
+        字符数、UTF-8字节数和断句位置与原文本相同的占位文本
+    """
+    return "".join(_scrub_char(ch) for ch in text)
+
+
+def scrub_value(value: Any, keep_fields: frozenset, key: Optional[str] = None) -> Any:
+    """递归替换JSON中的字符串值，键名、数字、布尔值和 keep_fields 中的字段原样保留"""
+    if isinstance(value, str):
+        return value if key in keep_fields else scrub_text(value)
+    if isinstance(value, dict):
+        return {k: scrub_value(v, keep_fields, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub_value(item, keep_fields, key) for item in value]
+    return value
+
+
+# 客户端标识哈希的密钥：未配置 CAPTURE_HASH_KEY 时每个进程随机生成，哈希只在本进程的采集中一致
+_HASH_KEY = config.CAPTURE_HASH_KEY.encode("utf-8") if config.CAPTURE_HASH_KEY else secrets.token_bytes(32)
+
+
+def hash_client_id(client_id: str) -> str:
+    """
+    客户端标识的HMAC-SHA256（同一客户端的请求在回放时仍属于同一客户端）
+
+    客户端标识（IP、租户名）的取值空间很小，不加密钥的哈希可以被穷举还原
+    """
+    return hmac.new(_HASH_KEY, client_id.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+class CaptureWriter:
+    """
+    后台线程把采集记录追加到JSONL文件，单个文件超过大小上限时新建文件，只保留最近的若干个文件
+
+    Args:
+        directory: 输出目录
+        max_file_bytes: 单个文件的大小上限
+        max_files: 保留的文件数
+        queue_size: 等待写入的记录上限，满时丢弃新记录
+    """
+
+    def __init__(self, directory: str, max_file_bytes: int, max_files: int, queue_size: int):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max(max_files, 1)
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.current_file: Optional[str] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, record: Dict[str, Any]):
+        """请求路径上调用：只入队，文本替换、序列化和文件IO都在写入线程中完成"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                self.written += len(batch)
+            except OSError as e:
+                self.write_errors += 1
+                logger.warning(f"写入流量采集文件失败: {e}")
+            time.sleep(0.2)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        os.makedirs(self.directory, exist_ok=True)
+        if (self.current_file is None or not os.path.exists(self.current_file)
+                or os.path.getsize(self.current_file) >= self.max_file_bytes):
+            self._rotate()
+        with open(self.current_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(anonymize(record), ensure_ascii=False) + "\n" for record in batch))
+
+    def _rotate(self):
+        """新建文件并删除超出数量的旧文件"""
+        name = f"capture-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+        self.current_file = os.path.join(self.directory, name)
+        files = sorted(f for f in os.listdir(self.directory) if f.startswith("capture-") and f.endswith(".jsonl"))
+        for old in files[:max(len(files) - self.max_files + 1, 0)]:
+            os.remove(os.path.join(self.directory, old))
+        logger.info(f"流量采集写入新文件: {self.current_file}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "current_file": self.current_file,
+            "written": self.written,
+            "pending": self._queue.qsize(),
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+
+# 全局采集写入实例
+capture_writer = CaptureWriter(
+    config.CAPTURE_DIR, int(config.CAPTURE_MAX_FILE_MB * 1024 * 1024), config.CAPTURE_MAX_FILES,
+    config.CAPTURE_QUEUE_SIZE
+)
+
+
+def _sampled(client_hash: str) -> bool:
+    """按客户端采样时同一客户端的请求全部采集或全部不采集，保留提交-轮询、续传等请求序列"""
+    rate = config.CAPTURE_SAMPLE_RATE
+    if rate >= 1:
+        return True
+    if config.CAPTURE_SAMPLE_BY == "client":
+        return int(client_hash[:8], 16) / 0x100000000 < rate
+    return random.random() < rate
+
+
+def anonymize(record: Dict[str, Any]) -> Dict[str, Any]:
+    """替换记录中查询参数和请求体的文本（在写入线程中执行，不占用请求路径的时间）"""
+    keep_fields = config.CAPTURE_KEEP_FIELDS
+    query = record["query"]
+    if query:
+        record["query"] = urlencode([(k, v if k in keep_fields else scrub_text(v)) for k, v in parse_qsl(query, True)])
+    text = record["body"].decode("utf-8", errors="replace")
+    try:
+        record["body"] = json.dumps(scrub_value(json.loads(text), keep_fields), ensure_ascii=False) if text else ""
+    except ValueError:
+        record["body"] = scrub_text(text)
+    return record
+
+
+class TrafficCaptureMiddleware:
+    """
+    流量采集中间件（纯ASGI实现，在准入控制外层，负载卸载的503也会被采集）
+
+    请求体在读取时复制（最多 CAPTURE_MAX_BODY_BYTES 字节），响应结束后记录状态码、耗时、
+    首字节时间和响应大小，然后交给后台线程写入
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or not config.CAPTURE_ENABLED or not path.startswith("/api/")
+                or path.startswith(EXCLUDED_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+        client_hash = hash_client_id(client_id_from_scope(scope))
+        if not _sampled(client_hash):
+            await self.app(scope, receive, send)
+            return
+
+        wall_start = time.time()
+        started = time.perf_counter()
+        body = bytearray()
+        body_bytes = 0
+        limit = config.CAPTURE_MAX_BODY_BYTES
+        response: Dict[str, Any] = {"status": None, "bytes": 0, "ttfb": None, "stream": False, "sniff": bytearray()}
+
+        async def capture_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_bytes += len(chunk)
+                if len(body) < limit:
+                    body.extend(chunk[:limit - len(body)])
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name == b"content-type":
+                        response["stream"] = value.startswith(b"text/event-stream")
+                    elif name == b"x-stream-id":
+                        response["stream_id"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk and response["ttfb"] is None:
+                    response["ttfb"] = time.perf_counter() - started
+                response["bytes"] += len(chunk)
+                if not response["stream"] and len(response["sniff"]) < _MAX_SNIFF_BYTES:
+                    response["sniff"].extend(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            ttfb = response["ttfb"]
+            capture_writer.submit({
+                "ts": round(wall_start, 6),
+                "method": scope["method"],
+                "path": path,
+                "route": getattr(scope.get("route"), "path", None),
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "headers": {name.decode("latin-1"): value.decode("latin-1")
+                            for name, value in scope.get("headers", []) if name in KEPT_HEADERS},
+                "client": client_hash,
+                "body": bytes(body),
+                "body_bytes": body_bytes,
+                "body_truncated": body_bytes > len(body),
+                "status": response["status"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "ttfb_ms": round(ttfb * 1000, 2) if ttfb is not None else None,
+                "response_bytes": response["bytes"],
+                "stream": response["stream"],
+                "ids": self._response_ids(response),
+            })
+
+    @staticmethod
+    def _response_ids(response: Dict[str, Any]) -> Dict[str, str]:
+        """响应中的任务ID和流ID，回放时用于替换后续轮询、续传请求路径中的标识"""
+        ids = {}
+        if response.get("stream_id"):
+            ids["stream_id"] = response["stream_id"]
+        if response["sniff"] and len(response["sniff"]) < _MAX_SNIFF_BYTES:
+            try:
+                data = json.loads(response["sniff"])
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                ids.update({field: data[field] for field in _RESPONSE_ID_FIELDS if isinstance(data.get(field), str)})
+        return ids
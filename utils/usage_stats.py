@@ -0,0 +1,228 @@
+"""
+使用量统计
+按天、接口、服务商、调用类型和客户端统计请求数、输入/输出字符数、估算token数和缓存命中数。
+请求路径上只在进程内累加计数，后台任务每隔 STATS_FLUSH_SECONDS 秒把累加的增量通过一次Redis管道写入
+（HINCRBY / INCRBY / PFADD），每天的独立客户端数用HyperLogLog统计；Redis不可用时写入内存存储
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, DefaultDict, Dict, Optional, Set
+
+from config.settings import config
+from data.redis_keys import RedisKeys
+from utils.logger import logger
+from utils.redis_client import redis_client
+from utils.request_context import get_client_id
+from utils.text_processor import estimate_tokens
+
+# 上游调用的统计项
+USAGE_FIELDS = ("calls", "input_chars", "output_chars", "input_tokens", "output_tokens")
+
+
+def _today() -> str:
+    return date.today().isoformat()
+
+
+class UsageStats:
+    """进程内累加、定期批量写入Redis的使用量计数"""
+
+    def __init__(self):
+        # 日期 -> 字段 -> 增量，字段形如 requests:endpoint:/api/translate、output_chars:provider:openai
+        self._counts: DefaultDict[str, DefaultDict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._clients: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_at: Optional[str] = None
+
+    def record_request(self, endpoint: str, client_id: str):
+        """记录一次接口请求"""
+        day = _today()
+        counts = self._counts[day]
+        counts["requests"] += 1
+        counts[f"requests:endpoint:{endpoint}"] += 1
+        counts[f"requests:client:{client_id}"] += 1
+        self._clients[day].add(client_id)
+
+    def record_upstream(self, provider: str, operation: str, input_text: str, output_text: str):
+        """
+        记录一次上游调用的输入输出（重试和对冲的每次尝试分别计入，与上游实际消耗一致）
+
+        Args:
+            provider: 服务商名称
+            operation: 调用方法（translate、summarize_stream等）
+            input_text: 发送的文本
+            output_text: 返回的文本（流式调用为已收到的片段，中途失败或取消时同样计入）
+        """
+        counts = self._counts[_today()]
+        operation = operation.removesuffix("_stream")
+        values = (1, len(input_text), len(output_text), estimate_tokens(input_text), estimate_tokens(output_text))
+        for dimension in (f"provider:{provider}", f"operation:{operation}", f"client:{get_client_id()}"):
+            for name, value in zip(USAGE_FIELDS, values):
+                counts[f"{name}:{dimension}"] += value
+
+    def record_cache_hit(self, endpoint: str):
+        """记录一次缓存命中（不调用上游、直接使用已生成的结果）"""
+        counts = self._counts[_today()]
+        counts["cache_hits"] += 1
+        counts[f"cache_hits:endpoint:{endpoint}"] += 1
+
+    async def flush(self) -> bool:
+        """把累加的增量通过一次管道写入Redis，失败时增量合并回进程内等待下次写入"""
+        async with self._flush_lock:
+            if not self._counts and not self._clients:
+                return True
+            counts, clients = self._counts, self._clients
+            self._counts = defaultdict(lambda: defaultdict(int))
+            self._clients = defaultdict(set)
+
+            ttl = config.STATS_RETENTION_DAYS * 86400
+            hash_increments: Dict[str, Dict[str, int]] = {}
+            daily_requests: Dict[str, int] = {}
+            expire: Dict[str, int] = {}
+            total = 0
+            for day, fields in counts.items():
+                hash_increments[RedisKeys.stats_key(day)] = dict(fields)
+                expire[RedisKeys.stats_key(day)] = ttl
+                if fields.get("requests"):
+                    daily_requests[day] = fields["requests"]
+                    total += fields["requests"]
+            if daily_requests:
+                hash_increments[RedisKeys.daily_requests_key()] = daily_requests
+            hll_members = {}
+            for day, members in clients.items():
+                hll_members[RedisKeys.stats_clients_key(day)] = members
+                expire[RedisKeys.stats_clients_key(day)] = ttl
+
+            # Redis模式下管道在线程中执行，不阻塞事件循环；内存模式下在事件循环线程中修改内存存储
+            ok = await redis_client.run(
+                redis_client.increment_batch, hash_increments,
+                {RedisKeys.total_requests_key(): total} if total else {}, hll_members, expire
+            )
+            if not ok:
+                self.flush_errors += 1
+                for day, fields in counts.items():
+                    for field, value in fields.items():
+                        self._counts[day][field] += value
+                for day, members in clients.items():
+                    self._clients[day].update(members)
+                return False
+            self.flushes += 1
+            self.last_flush_at = datetime.now().isoformat()
+            return True
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(config.STATS_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"写入使用量统计失败: {e}")
+
+    def start(self):
+        """启动定期写入任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """停止定期写入并写入剩余的增量"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def query(self, start: date, end: date, top_clients: int = 20) -> Dict[str, Any]:
+        """
+        汇总日期范围内（含首尾）的统计，查询前先写入进程内尚未写入的增量
+
+        Args:
+            start: 开始日期
+            end: 结束日期
+            top_clients: 按请求数返回的客户端数
+
+        Returns:
+            按天、接口、服务商、调用类型和客户端汇总的统计
+        """
+        await self.flush()
+        days = [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+        hashes, counters, unique, unique_total = await redis_client.run(
+            redis_client.read_batch,
+            [RedisKeys.stats_key(day) for day in days],
+            [RedisKeys.total_requests_key()],
+            [RedisKeys.stats_clients_key(day) for day in days],
+        )
+
+        merged: DefaultDict[str, int] = defaultdict(int)
+        daily = []
+        for day, fields, clients in zip(days, hashes, unique):
+            for field, value in fields.items():
+                merged[field] += value
+            daily.append({
+                "date": day,
+                "requests": fields.get("requests", 0),
+                "cache_hits": fields.get("cache_hits", 0),
+                "unique_clients": clients,
+            })
+
+        grouped: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for field, value in merged.items():
+            parts = field.split(":", 2)
+            if len(parts) == 3:
+                name, dimension, key = parts
+                grouped.setdefault(dimension, {}).setdefault(key, {})[name] = value
+
+        clients = sorted(grouped.get("client", {}).items(), key=lambda item: item[1].get("requests", 0),
+                         reverse=True)
+        return {
+            "start": days[0],
+            "end": days[-1],
+            "total_requests_all_time": counters[0],
+            "requests": merged.get("requests", 0),
+            "cache_hits": merged.get("cache_hits", 0),
+            "unique_clients": unique_total,
+            "daily": daily,
+            "by_endpoint": grouped.get("endpoint", {}),
+            "by_provider": grouped.get("provider", {}),
+            "by_operation": grouped.get("operation", {}),
+            "top_clients": dict(clients[:top_clients]),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pending_fields": sum(len(fields) for fields in self._counts.values()),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_at": self.last_flush_at,
+            "flush_interval_seconds": config.STATS_FLUSH_SECONDS,
+        }
+
+
+# 全局使用量统计实例
+usage_stats = UsageStats()
+
+
+class UsageStatsMiddleware:
+    """
+    接口请求统计中间件（纯ASGI实现）
+
+    按路由模板统计 /api/ 下的请求（健康检查和管理接口除外）和客户端
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.STATS_ENABLED or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path and not path.startswith(("/api/health", "/api/admin", "/api/stats")):
+                usage_stats.record_request(path, get_client_id())